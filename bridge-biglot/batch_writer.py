@@ -0,0 +1,128 @@
+"""
+Batch Writer - cycle-wide bulk upserts
+
+Features:
+- Collects rows from all participants during a sync cycle
+- Flushes each table in size-capped bulk upserts (same on_conflict keys)
+- A failing chunk is retried row by row, so one bad row only costs that chunk
+- Rows with the same conflict key are de-duplicated (last one wins), as
+  Postgres rejects a bulk upsert that touches a row twice
+- With a WriteCache, rows identical to the last successful write are dropped
+  before they are queued
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core import load_env
+from write_cache import row_hash
+
+# Load environment variables
+load_env()
+
+# Configuration
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))  # Max rows per upsert request
+FLUSH_WORKERS = int(os.getenv("FLUSH_WORKERS", "4"))  # Parallel upsert requests during a flush
+
+
+class BatchWriter:
+    """Buffers upsert rows per (table, on_conflict) until flush()"""
+
+    def __init__(self, supabase, chunk_size: int = UPSERT_BATCH_SIZE, cache=None):
+        self.supabase = supabase
+        self.chunk_size = chunk_size
+        self.cache = cache  # Optional WriteCache for change detection
+        self.skipped = 0  # Unchanged rows not sent
+        self._rows = {}  # (table, on_conflict) -> {conflict key: row}
+        self._hashes = {}  # (table, conflict key) -> content hash, committed after the flush
+        self._lock = threading.Lock()
+
+    def add(self, table: str, rows, on_conflict: str):
+        """Queue one row (dict) or a list of rows for upsert"""
+        if isinstance(rows, dict):
+            rows = [rows]
+        keys = on_conflict.split(',')
+        tracked = self.cache is not None and self.cache.is_tracked(table)
+        with self._lock:
+            bucket = self._rows.setdefault((table, on_conflict), {})
+            for row in rows:
+                key = tuple(row[k] for k in keys)
+                if tracked:
+                    digest = row_hash(row)
+                    if self.cache.is_unchanged(table, key, digest):
+                        bucket.pop(key, None)
+                        self._hashes.pop((table, key), None)
+                        self.skipped += 1
+                        continue
+                    self._hashes[(table, key)] = digest
+                bucket[key] = row
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(bucket) for bucket in self._rows.values())
+
+    def _upsert(self, table: str, rows: list, on_conflict: str):
+        self.supabase.table(table).upsert(rows, on_conflict=on_conflict).execute()
+
+    def _write_chunk(self, table: str, chunk: list, on_conflict: str):
+        """Upsert a chunk; on failure fall back to one row at a time. Returns failed rows."""
+        try:
+            self._upsert(table, chunk, on_conflict)
+            return [], False
+        except Exception as e:
+            print(f"⚠️ Bulk upsert of {len(chunk)} {table} rows failed, retrying row by row: {e}")
+
+        failed = []
+        for row in chunk:
+            try:
+                self._upsert(table, [row], on_conflict)
+            except Exception as e:
+                print(f"❌ Error upserting {table} row {row.get('participant_id')}: {e}")
+                failed.append(row)
+        return failed, True
+
+    def flush(self) -> dict:
+        """
+        Write everything queued so far.
+        Returns {table: {"written": rows written, "failed": [rows that failed]}}.
+        """
+        with self._lock:
+            batches = self._rows
+            hashes = self._hashes
+            self._rows = {}
+            self._hashes = {}
+
+        if self.skipped:
+            print(f"⏭️ Skipped {self.skipped} unchanged rows")
+            self.skipped = 0
+
+        report = {}
+        with ThreadPoolExecutor(max_workers=FLUSH_WORKERS, thread_name_prefix="supabase-flush") as executor:
+            for (table, on_conflict), bucket in batches.items():
+                rows = list(bucket.values())
+                if not rows:
+                    continue
+                start = time.perf_counter()
+                chunks = [rows[i:i + self.chunk_size] for i in range(0, len(rows), self.chunk_size)]
+                outcomes = list(executor.map(lambda chunk: self._write_chunk(table, chunk, on_conflict), chunks))
+
+                failed = [row for chunk_failed, _ in outcomes for row in chunk_failed]
+                fallbacks = sum(1 for _, fell_back in outcomes if fell_back)
+                entry = report.setdefault(table, {"written": 0, "failed": []})
+                entry["written"] += len(rows) - len(failed)
+                entry["failed"].extend(failed)
+
+                if self.cache is not None and self.cache.is_tracked(table):
+                    keys = on_conflict.split(',')
+                    failed_keys = {tuple(row[k] for k in keys) for row in failed}
+                    for key in bucket:
+                        if key not in failed_keys and (table, key) in hashes:
+                            self.cache.commit(table, key, hashes[(table, key)])
+
+                note = f", {fallbacks} chunk(s) retried row by row, {len(failed)} failed" if fallbacks else ""
+                print(f"📦 Upserted {len(rows) - len(failed)}/{len(rows)} {table} rows in {len(chunks)} request(s) ({time.perf_counter() - start:.2f}s{note})")
+
+        if self.cache is not None:
+            self.cache.save()
+        return report
@@ -0,0 +1,187 @@
+"""
+Bridge Benchmarks - offline, reproducible measurements of the sync paths
+
+Runs the real bridge code against the fake terminal (fake_mt5) and an
+in-process PostgREST stand-in (fake_supabase), so no Windows terminal or
+network is needed.
+
+Benchmarks (each in a fresh process, with empty sync state):
+- sync_participant: one account, cold (empty state) then warm
+- cycle: main.run_cycle() over every participant, cold then warm
+- market_data: market_data_service.sync_market_data(), cold then warm
+
+Reported per phase: wall time, MT5 calls (and time spent inside the fake
+terminal), HTTP requests and payload bytes (and time spent inside the
+stand-in), and peak Python memory (tracemalloc; --no-memory skips tracing
+for undisturbed wall times).
+
+Usage:
+    python benchmark.py
+    python benchmark.py --participants 50 --positions 2000 --symbols 8
+    python benchmark.py --only cycle --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+
+BENCHMARKS = ('sync_participant', 'cycle', 'market_data')
+_RESULT_MARKER = "BENCHMARK_RESULT "
+
+
+def _participants(count: int) -> list:
+    return [
+        {
+            "nickname": f"Bench{i:04d}",
+            "account_id": str(100000 + i),
+            "investor_password": "bench",
+            "server": "Fake-Server",
+        }
+        for i in range(count)
+    ]
+
+
+def _measure(phase: str, fn, mt5, stats, trace_memory: bool, verbose: bool) -> dict:
+    mt5.reset_counters()
+    stats.reset()
+    if trace_memory:
+        tracemalloc.start()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    start = time.perf_counter()
+    with output:
+        fn()
+    wall = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    http = stats.snapshot()
+    return {
+        "phase": phase,
+        "wall": round(wall, 4),
+        "mt5_calls": sum(mt5.CALLS.values()),
+        "mt5_seconds": round(sum(mt5.CALL_SECONDS.values()), 4),
+        "mt5_by_function": dict(sorted(mt5.CALLS.items())),
+        "http_requests": http["requests"],
+        "http_by_table": http["by_table"],
+        "http_bytes_out": http["bytes_in"],  # Sent by the bridge
+        "http_bytes_in": http["bytes_out"],  # Received by the bridge
+        "http_errors": http["errors"],
+        "http_seconds": http["seconds"],  # Spent inside the stand-in
+        "peak_memory": peak,
+    }
+
+
+def run_benchmark(name: str, participants: int, trace_memory: bool, verbose: bool) -> list:
+    """Run one benchmark in this process (env prepared by the parent)"""
+    from fake_supabase import FakeSupabase
+    server = FakeSupabase().start()
+    os.environ["SUPABASE_URL"] = server.url
+    server.db.seed('participants', _participants(participants if name != 'sync_participant' else 1))
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        from core import mt5
+        if name == 'market_data':
+            import market_data_service as target
+        else:
+            import main as target
+    mt5.initialize()
+
+    if name == 'sync_participant':
+        participant = server.db.tables['participants'][0]
+        fn = lambda: target.sync_participant(participant)
+    elif name == 'cycle':
+        fn = target.run_cycle
+    else:
+        fn = target.sync_market_data
+
+    results = [_measure(phase, fn, mt5, server.stats, trace_memory, verbose) for phase in ('cold', 'warm')]
+    server.stop()
+    return results
+
+
+def _child_env(args, state_dir: str) -> dict:
+    env = dict(os.environ)
+    symbols = ['XAUUSD', 'EURUSD', 'GBPUSD', 'USDJPY'] + [f"SYN{i:03d}" for i in range(5, args.symbols + 1)]
+    env.update({
+        "MT5_MODULE": "fake_mt5",
+        "FAKE_MT5_POSITIONS": str(args.positions),
+        "FAKE_MT5_SYMBOLS": str(args.symbols),
+        "MARKET_SYMBOLS": ",".join(symbols[:args.symbols]),
+        "MARKET_SYMBOLS_AUTO": "0",
+        "STATE_DIR": state_dir,
+        "SUPABASE_URL": "http://127.0.0.1:1",  # Replaced by the stand-in's address in the child
+        "SUPABASE_KEY": "benchmark",
+        "TELEGRAM_BOT_TOKEN": "",
+        "PYTHONHASHSEED": "0",
+    })
+    return env
+
+
+def _format_bytes(size) -> str:
+    return "-" if size is None else f"{size / 1024 / 1024:.1f}MB" if size >= 1024 * 1024 else f"{size / 1024:.0f}KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline bridge benchmarks (fake MT5 terminal + local PostgREST stand-in)")
+    parser.add_argument("--participants", type=int, default=20, help="Accounts in the participants table")
+    parser.add_argument("--positions", type=int, default=500, help="Closed positions per account before today")
+    parser.add_argument("--symbols", type=int, default=4, help="Symbols traded and synced as market data")
+    parser.add_argument("--only", choices=BENCHMARKS, action="append", help="Run only these benchmarks")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (faster, no peak memory)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the bridge's own output")
+    parser.add_argument("--run", choices=BENCHMARKS, help=argparse.SUPPRESS)  # Child process mode
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    if args.run:
+        sys.path.insert(0, here)
+        results = run_benchmark(args.run, args.participants, not args.no_memory, args.verbose)
+        print(_RESULT_MARKER + json.dumps(results))
+        return
+
+    print(f"Benchmarks: {args.participants} participants x {args.positions} positions, {args.symbols} symbols")
+    print(f"{'benchmark':<18}{'phase':<6}{'wall':>9}{'mt5 calls':>11}{'in mt5':>9}{'http req':>10}{'in http':>9}"
+          f"{'sent':>9}{'received':>10}{'peak mem':>10}")
+    report = []
+    for name in args.only or BENCHMARKS:
+        with tempfile.TemporaryDirectory(prefix="bridge-bench-") as work_dir:
+            child_args = [sys.executable, os.path.abspath(__file__), "--run", name,
+                          "--participants", str(args.participants)]
+            if args.no_memory:
+                child_args.append("--no-memory")
+            if args.verbose:
+                child_args.append("--verbose")
+            proc = subprocess.run(child_args, cwd=work_dir, env=_child_env(args, os.path.join(work_dir, "state")),
+                                  capture_output=True, text=True)
+            lines = proc.stdout.splitlines()
+            result_line = next((l for l in reversed(lines) if l.startswith(_RESULT_MARKER)), None)
+            if args.verbose:
+                print("\n".join(l for l in lines if not l.startswith(_RESULT_MARKER)))
+            if proc.returncode != 0 or result_line is None:
+                print(f"{name:<18}failed (exit code {proc.returncode})")
+                print(proc.stderr[-2000:])
+                continue
+            for phase in json.loads(result_line[len(_RESULT_MARKER):]):
+                report.append({"benchmark": name, **phase})
+                print(f"{name:<18}{phase['phase']:<6}{phase['wall']:>8.2f}s{phase['mt5_calls']:>11}"
+                      f"{phase['mt5_seconds']:>8.2f}s{phase['http_requests']:>10}{phase['http_seconds']:>8.2f}s"
+                      f"{_format_bytes(phase['http_bytes_out']):>9}{_format_bytes(phase['http_bytes_in']):>10}"
+                      f"{_format_bytes(phase['peak_memory']):>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"scale": {"participants": args.participants, "positions": args.positions,
+                                 "symbols": args.symbols}, "results": report}, f, indent=1)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 import os
-import MetaTrader5 as mt5
+import importlib
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import requests
+import metrics
 
 # Load environment variables
 load_dotenv()
 
+# MT5 calls timed per call (per participant in the bridge's metrics)
+MT5_TIMED_FUNCTIONS = (
+    'login', 'account_info', 'positions_get', 'history_deals_get', 'history_orders_get',
+    'symbol_info', 'symbol_info_tick', 'copy_rates_from_pos', 'copy_rates_range', 'copy_ticks_range',
+)
+
+# MetaTrader5 by default; MT5_MODULE=fake_mt5 swaps in the fake terminal (Linux/testing)
+mt5 = metrics.instrument_module(importlib.import_module(os.getenv("MT5_MODULE", "MetaTrader5")), MT5_TIMED_FUNCTIONS)
+
 def load_env():
     """Ensure env vars are loaded (idempotent)"""
     load_dotenv()
@@ -20,11 +30,32 @@ def get_supabase_client() -> Client:
         print("Error: SUPABASE_URL or SUPABASE_KEY not found in .env")
         exit(1)
         
-    return create_client(url, key)
+    client = create_client(url, key)
+    # Every PostgREST request is timed per table
+    metrics.instrument_http(client.postgrest.session)
+    return client
+
+def select_all(build_query, page_size: int = 1000) -> list:
+    """
+    Run a select page by page until every row is read
+    (PostgREST caps a single response at max-rows).
+    
+    Args:
+        build_query: callable returning a fresh, ordered select query
+    """
+    rows = []
+    offset = 0
+    while True:
+        response = build_query().range(offset, offset + page_size - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
 
-def init_mt5() -> bool:
-    """Initialize MetaTrader 5 connection"""
-    mt5_path = os.getenv("MT5_PATH")
+def init_mt5(mt5_path: str = None) -> bool:
+    """Initialize MetaTrader 5 connection (MT5_PATH unless a terminal path is given)"""
+    mt5_path = mt5_path or os.getenv("MT5_PATH")
     
     if mt5_path:
         print(f"Initializing MT5 from: {mt5_path}")
@@ -51,6 +82,7 @@ def send_telegram_message(message: str):
     data = {"chat_id": chat_id, "text": message}
     
     try:
-        requests.post(url, data=data, timeout=10)
+        with metrics.timer("telegram_send"):
+            requests.post(url, data=data, timeout=10)
     except Exception as e:
         print(f"Failed to send Telegram message: {e}")
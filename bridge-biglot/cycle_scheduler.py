@@ -0,0 +1,104 @@
+"""
+Cycle Scheduler - fixed-cadence sync cycles with fair carry-over
+
+Features:
+- Cycles start on a fixed SYNC_INTERVAL grid: the sleep after a cycle is
+  the time left until the next slot, not a fixed pause
+- A cycle that overruns makes the next one start right away; slots that
+  were missed completely are skipped (and reported) instead of queued
+- Fetching stops at a per-cycle deadline (CYCLE_FETCH_BUDGET of the
+  interval); participants not reached go first in the next cycle instead
+  of the list always restarting from the top
+- Every cycle reports its start lag, synced/carried-over participants and
+  skipped slots
+"""
+
+import os
+import time
+from core import load_env
+
+# Load environment variables
+load_env()
+
+# Configuration
+CYCLE_FETCH_BUDGET = float(os.getenv("CYCLE_FETCH_BUDGET", "0.8"))  # Share of SYNC_INTERVAL spent fetching, the rest waits for the next cycle
+
+
+class CycleScheduler:
+    """Start times, deadlines and carried-over participants of the sync cycles"""
+
+    def __init__(self, interval: float, budget: float = CYCLE_FETCH_BUDGET):
+        self.interval = interval
+        self.budget = budget
+        self.next_start = None  # Planned start of the next cycle (monotonic clock)
+        self.cycle_start = None
+        self.deadline = None
+        self.lag = 0.0
+        self.skipped_slots = 0
+        self.carry = []  # Ids of participants not reached last cycle, in order
+        self.synced = 0
+        self.total = 0
+
+    def start_cycle(self):
+        now = time.monotonic()
+        if self.next_start is None:
+            self.next_start = now
+        self.lag = max(0.0, now - self.next_start)
+        self.cycle_start = now
+        self.deadline = now + self.interval * self.budget
+        self.next_start += self.interval
+        self.synced = 0
+        self.total = 0
+
+    def order(self, participants: list) -> list:
+        """Participants carried over from the last cycle first, then the rest in list order"""
+        by_id = {p['id']: p for p in participants}
+        first = [by_id[pid] for pid in self.carry if pid in by_id]
+        carried = {p['id'] for p in first}
+        return first + [p for p in participants if p['id'] not in carried]
+
+    def take(self, participants: list):
+        """
+        Yield participants (fair order) until the fetch deadline passes.
+        The ones not reached are carried over to the next cycle.
+        """
+        ordered = self.order(participants)
+        self.total = len(ordered)
+        self.carry = []
+        for i, participant in enumerate(ordered):
+            if i > 0 and self.deadline is not None and time.monotonic() >= self.deadline:
+                self.carry = [p['id'] for p in ordered[i:]]
+                break
+            self.synced += 1
+            yield participant
+
+    def end_cycle(self) -> dict:
+        """Skip slots the cycle overran and report the cycle"""
+        now = time.monotonic()
+        self.skipped_slots = 0
+        if now >= self.next_start:
+            # Overran: start again right away, but stay on the interval grid
+            self.skipped_slots = int((now - self.next_start) // self.interval)
+            self.next_start += self.skipped_slots * self.interval
+
+        report = {
+            "elapsed": now - self.cycle_start,
+            "lag": self.lag,
+            "synced": self.synced,
+            "total": self.total,
+            "carried_over": len(self.carry),
+            "skipped_slots": self.skipped_slots,
+        }
+        line = f"🕒 Cycle schedule: started {self.lag:.2f}s late, synced {self.synced}/{self.total} participants"
+        if self.carry:
+            line += f", {len(self.carry)} carried over to the next cycle"
+        if self.skipped_slots:
+            line += f", {self.skipped_slots} slot(s) skipped"
+        print(line)
+        return report
+
+    def wait(self):
+        """Sleep until the next cycle slot"""
+        delay = max(0.0, self.next_start - time.monotonic())
+        print(f"Sleeping for {delay:.1f} seconds...")
+        time.sleep(delay)
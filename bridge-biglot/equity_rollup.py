@@ -0,0 +1,188 @@
+"""
+Equity Rollups - hourly and daily OHLC bars of equity snapshots
+
+Features:
+- Compacts 5-minute equity_snapshots into hourly bars, and hourly bars into
+  daily bars, in the equity_rollups table (open/high/low/close equity,
+  closing balance, min margin level, sample count)
+- Incremental: each run continues after the newest bar already stored,
+  re-aggregating a trailing window (the newest bar plus ROLLUP_LATE_MINUTES)
+  so snapshots written late still land in their bar
+- Raw snapshots are only deleted once their hour is rolled up, so long-range
+  curves keep their shape after the 30-day retention
+"""
+
+import os
+from datetime import datetime, timezone, timedelta
+import pandas as pd
+from core import load_env, select_all
+from batch_writer import BatchWriter
+
+# Load environment variables
+load_env()
+
+# Configuration
+HOURLY_RETENTION_DAYS = int(os.getenv("HOURLY_RETENTION_DAYS", "365"))  # Hourly bars are kept this long, daily bars forever
+ROLLUP_BATCH_HOURS = 6  # Snapshot hours read per request batch
+ROLLUP_DELAY_MINUTES = 10  # An hour is rolled up once it ended this long ago
+ROLLUP_LATE_MINUTES = int(os.getenv("ROLLUP_LATE_MINUTES", "60"))  # Snapshots written up to this late after their hour are still rolled up
+
+TIERS = {'1h': timedelta(hours=1), '1d': timedelta(days=1)}
+ROLLUP_CONFLICT = 'participant_id,tier,bucket'
+
+
+def _parse(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _floor(ts: datetime, period: timedelta) -> datetime:
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return epoch + (ts - epoch) // period * period
+
+
+def aggregate(rows: list, tier: str, source_is_snapshots: bool) -> list:
+    """
+    Roll snapshot rows (or finer rollup rows) up into `tier` bars.
+    Rows must belong to complete buckets; the result is a list of equity_rollups rows.
+    """
+    if not rows:
+        return []
+    df = pd.DataFrame(rows)
+    time_column = 'timestamp' if source_is_snapshots else 'bucket'
+    df['ts'] = pd.to_datetime(df[time_column], utc=True, format='ISO8601')
+    if source_is_snapshots:
+        equity = df['equity'].astype(float)
+        df['equity_open'] = df['equity_high'] = df['equity_low'] = df['equity_close'] = equity
+        df['min_margin_level'] = df['margin_level']
+        df['samples'] = 1
+    for column in ('equity_open', 'equity_high', 'equity_low', 'equity_close', 'balance', 'min_margin_level'):
+        df[column] = pd.to_numeric(df[column])
+    df['bucket'] = df['ts'].dt.floor(pd.Timedelta(TIERS[tier]))
+    df = df.sort_values(['participant_id', 'ts'], kind='stable')
+
+    bars = df.groupby(['participant_id', 'bucket'], sort=True).agg(
+        equity_open=('equity_open', 'first'),
+        equity_high=('equity_high', 'max'),
+        equity_low=('equity_low', 'min'),
+        equity_close=('equity_close', 'last'),
+        balance=('balance', 'last'),
+        min_margin_level=('min_margin_level', 'min'),
+        samples=('samples', 'sum'),
+    ).reset_index()
+
+    return [
+        {
+            "participant_id": row.participant_id,
+            "tier": tier,
+            "bucket": row.bucket.isoformat(),
+            "equity_open": float(row.equity_open),
+            "equity_high": float(row.equity_high),
+            "equity_low": float(row.equity_low),
+            "equity_close": float(row.equity_close),
+            "balance": float(row.balance),
+            "min_margin_level": None if pd.isna(row.min_margin_level) else float(row.min_margin_level),
+            "samples": int(row.samples),
+        }
+        for row in bars.itertuples(index=False)
+    ]
+
+
+class EquityRollup:
+    """Keeps equity_rollups up to date with equity_snapshots"""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self.hourly_until = None  # Snapshots before this time are rolled up (known after run())
+
+    def _newest_bucket(self, tier: str):
+        response = self.supabase.table('equity_rollups') \
+            .select('bucket') \
+            .eq('tier', tier) \
+            .order('bucket', desc=True) \
+            .limit(1) \
+            .execute()
+        return _parse(response.data[0]['bucket']) if response.data else None
+
+    def _oldest(self, table: str, column: str, tier: str = None):
+        query = self.supabase.table(table).select(column)
+        if tier:
+            query = query.eq('tier', tier)
+        response = query.order(column).limit(1).execute()
+        return _parse(response.data[0][column]) if response.data else None
+
+    def _start(self, tier: str, source_table: str, source_column: str, source_tier: str = None):
+        """
+        First bucket to roll up: the newest stored bar and the ones that may
+        still get late rows (upserts make this idempotent), else the oldest
+        source row. The newest bar is global, so a participant whose snapshot
+        arrived after the others' is re-aggregated here too.
+        """
+        newest = self._newest_bucket(tier)
+        if newest is not None:
+            return _floor(newest - timedelta(minutes=ROLLUP_LATE_MINUTES), TIERS[tier])
+        oldest = self._oldest(source_table, source_column, source_tier)
+        return _floor(oldest, TIERS[tier]) if oldest is not None else None
+
+    def _write(self, rows: list) -> bool:
+        writer = BatchWriter(self.supabase)
+        writer.add('equity_rollups', rows, on_conflict=ROLLUP_CONFLICT)
+        report = writer.flush()
+        return not report.get('equity_rollups', {}).get('failed')
+
+    def roll_up_hours(self, end: datetime) -> int:
+        """Hourly bars for every complete hour before `end`"""
+        start = self._start('1h', 'equity_snapshots', 'timestamp')
+        written = 0
+        while start is not None and start < end:
+            batch_end = min(start + timedelta(hours=ROLLUP_BATCH_HOURS), end)
+            snapshots = select_all(lambda: self.supabase.table('equity_snapshots')
+                                   .select('participant_id, timestamp, balance, equity, margin_level')
+                                   .gte('timestamp', start.isoformat())
+                                   .lt('timestamp', batch_end.isoformat())
+                                   .order('participant_id')
+                                   .order('timestamp'))
+            bars = aggregate(snapshots, '1h', source_is_snapshots=True)
+            if bars and not self._write(bars):
+                break  # Retried from the trailing window of the newest stored bar next run
+            written += len(bars)
+            start = batch_end
+        self.hourly_until = start
+        return written
+
+    def roll_up_days(self) -> int:
+        """Daily bars for every day whose hourly bars are complete"""
+        if self.hourly_until is None:
+            return 0
+        end = _floor(self.hourly_until, TIERS['1d'])
+        start = self._start('1d', 'equity_rollups', 'bucket', source_tier='1h')
+        written = 0
+        while start is not None and start < end:
+            batch_end = min(start + timedelta(days=7), end)
+            hourly = select_all(lambda: self.supabase.table('equity_rollups')
+                                .select('*')
+                                .eq('tier', '1h')
+                                .gte('bucket', start.isoformat())
+                                .lt('bucket', batch_end.isoformat())
+                                .order('participant_id')
+                                .order('bucket'))
+            bars = aggregate(hourly, '1d', source_is_snapshots=False)
+            if bars and not self._write(bars):
+                break
+            written += len(bars)
+            start = batch_end
+        return written
+
+    def run(self):
+        """Roll up everything that is complete; returns (hourly bars, daily bars) written"""
+        try:
+            end = _floor(datetime.now(timezone.utc) - timedelta(minutes=ROLLUP_DELAY_MINUTES), TIERS['1h'])
+            if self.hourly_until is not None and self.hourly_until >= end:
+                return 0, 0  # No new complete hour since the last run
+            hourly = self.roll_up_hours(end)
+            daily = self.roll_up_days()
+            if hourly or daily:
+                print(f"📈 Equity rollups: {hourly} hourly and {daily} daily bars written")
+            return hourly, daily
+        except Exception as e:
+            print(f"❌ Error rolling up equity snapshots: {e}")
+            return 0, 0
@@ -3,13 +3,22 @@ Equity Snapshot Service - MyFxBook-style equity data recording
 
 Features:
 - Records equity snapshots every 5 minutes
+- SnapshotScheduler tracks the last snapshot per participant in memory
+  (seeded by one query at startup), so all participants share the same
+  5-minute buckets and are written in one bulk upsert
+- PreviousEquityCache loads yesterday's closing equity for all participants
+  in bulk once per UTC day, so equity growth is computed from memory
 - Calculates floating P/L and margin level
-- Implements 30-day retention policy for detailed snapshots
+- Implements 30-day retention policy for detailed snapshots (retention.py);
+  older history lives on as hourly/daily rollups (equity_rollup.py)
 """
 
 import os
+import math
 from datetime import datetime, timezone, timedelta
-from core import get_supabase_client, load_env
+from core import get_supabase_client, load_env, select_all
+from retention import RetentionScheduler, RetentionJob
+from equity_rollup import EquityRollup, HOURLY_RETENTION_DAYS
 
 # Load environment variables
 load_env()
@@ -17,15 +26,98 @@ load_env()
 # Configuration
 SNAPSHOT_INTERVAL_MINUTES = 5  # Record snapshot every 5 minutes
 RETENTION_DAYS = 30  # Keep detailed snapshots for 30 days
+IN_FILTER_CHUNK = 100  # Participant ids per in_() filter (keeps the URL short)
 
 # Initialize Supabase client
 supabase = get_supabase_client()
 
+# Hourly/daily OHLC bars of the snapshots
+equity_rollup = EquityRollup(supabase)
+
+# Throttled, chunked deletion of expired snapshots (only once their hour is rolled up)
+snapshot_retention = RetentionScheduler(supabase, "equity", [
+    RetentionJob("equity_snapshots", "equity_snapshots", "timestamp", RETENTION_DAYS,
+                 not_after=lambda: equity_rollup.hourly_until),
+    RetentionJob("equity_rollups 1h", "equity_rollups", "bucket", HOURLY_RETENTION_DAYS,
+                 filters={"tier": "1h"}, chunk_hours=24),
+])
+
+
+def snapshot_bucket(now: datetime = None) -> datetime:
+    """Start of the 5-minute bucket a snapshot taken at `now` belongs to"""
+    now = now or datetime.now(timezone.utc)
+    rounded_minute = (now.minute // SNAPSHOT_INTERVAL_MINUTES) * SNAPSHOT_INTERVAL_MINUTES
+    return now.replace(minute=rounded_minute, second=0, microsecond=0)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class SnapshotScheduler:
+    """
+    Decides which participants get an equity snapshot this cycle.
+    
+    The last snapshot bucket of every participant is kept in memory. It is
+    seeded once with a single query for snapshots in the current bucket,
+    instead of one query per participant per cycle.
+    """
+    
+    def __init__(self):
+        self.last_bucket = {}  # participant_id -> bucket of the last recorded snapshot
+        self.bucket = None  # Bucket of the running cycle
+        self.pending = set()  # Participants whose snapshot is queued but not yet written
+        self.seeded = False
+    
+    def seed(self):
+        """Load the participants that already have a snapshot in the current bucket"""
+        bucket = snapshot_bucket()
+        try:
+            rows = select_all(lambda: supabase.table('equity_snapshots')
+                              .select('participant_id, timestamp')
+                              .gte('timestamp', bucket.isoformat())
+                              .order('participant_id'))
+            for row in rows:
+                row_bucket = snapshot_bucket(_parse_timestamp(row['timestamp']))
+                last = self.last_bucket.get(row['participant_id'])
+                if last is None or row_bucket > last:
+                    self.last_bucket[row['participant_id']] = row_bucket
+            self.seeded = True
+            print(f"📊 Snapshot scheduler seeded: {len(self.last_bucket)} participants already have the {bucket.strftime('%H:%M')} snapshot")
+        except Exception as e:
+            print(f"Error seeding snapshot scheduler: {e}")  # Everyone is due; retried next cycle
+    
+    def start_cycle(self):
+        """Fix the bucket for this cycle, so all snapshots of the cycle line up"""
+        if not self.seeded:
+            self.seed()
+        self.bucket = snapshot_bucket()
+        self.pending = set()
+    
+    def is_due(self, participant_id: str) -> bool:
+        last = self.last_bucket.get(participant_id)
+        return last is None or last < self.bucket
+    
+    def queue(self, participant_id: str, account_info, writer) -> bool:
+        """Queue the participant's snapshot for this cycle's bulk upsert"""
+        if not record_equity_snapshot(participant_id, account_info, writer=writer, bucket=self.bucket):
+            return False
+        self.pending.add(participant_id)
+        return True
+    
+    def commit(self, failed_rows: list = ()):
+        """After the flush: remember the bucket for every snapshot that was written"""
+        failed = {row['participant_id'] for row in failed_rows}
+        for participant_id in self.pending - failed:
+            self.last_bucket[participant_id] = self.bucket
+        self.pending = set()
+
 
 def should_record_snapshot(participant_id: str) -> bool:
     """
     Check if enough time has passed since last snapshot (5 minutes).
     Returns True if we should record a new snapshot.
+    One query per call; the sync loop uses SnapshotScheduler instead.
     """
     try:
         # Get latest snapshot for this participant
@@ -39,7 +131,7 @@ def should_record_snapshot(participant_id: str) -> bool:
         if not response.data:
             return True  # No previous snapshot, record one
         
-        last_timestamp = datetime.fromisoformat(response.data[0]['timestamp'].replace('Z', '+00:00'))
+        last_timestamp = _parse_timestamp(response.data[0]['timestamp'])
         now = datetime.now(timezone.utc)
         
         # Check if 5 minutes have passed
@@ -50,34 +142,51 @@ def should_record_snapshot(participant_id: str) -> bool:
         return True  # On error, allow recording
 
 
-def record_equity_snapshot(participant_id: str, account_info) -> bool:
+def build_equity_snapshot(participant_id: str, account_info, bucket: datetime = None) -> dict:
+    """
+    Build the equity_snapshots row for a 5-minute bucket.
+    
+    Args:
+        participant_id: UUID of the participant
+        account_info: MT5 account_info object
+        bucket: snapshot bucket (default: the current one)
+    """
+    # Calculate floating P/L
+    floating_pl = account_info.equity - account_info.balance
+    
+    # Round timestamp to nearest 5 minutes for cleaner data
+    rounded_time = bucket or snapshot_bucket()
+    
+    return {
+        "participant_id": participant_id,
+        "timestamp": rounded_time.isoformat(),
+        "balance": float(account_info.balance),
+        "equity": float(account_info.equity),
+        "floating_pl": float(floating_pl),
+        "margin_level": float(account_info.margin_level) if account_info.margin_level else None
+    }
+
+
+def record_equity_snapshot(participant_id: str, account_info, writer=None, bucket: datetime = None) -> bool:
     """
     Record an equity snapshot to the database.
     
     Args:
         participant_id: UUID of the participant
         account_info: MT5 account_info object
+        writer: optional BatchWriter; the row is queued for the cycle flush
+                instead of being upserted right away
+        bucket: snapshot bucket (default: the current one)
     
     Returns:
         True if successful, False otherwise
     """
     try:
-        # Calculate floating P/L
-        floating_pl = account_info.equity - account_info.balance
+        snapshot_data = build_equity_snapshot(participant_id, account_info, bucket)
         
-        # Round timestamp to nearest 5 minutes for cleaner data
-        now = datetime.now(timezone.utc)
-        rounded_minute = (now.minute // SNAPSHOT_INTERVAL_MINUTES) * SNAPSHOT_INTERVAL_MINUTES
-        rounded_time = now.replace(minute=rounded_minute, second=0, microsecond=0)
-        
-        snapshot_data = {
-            "participant_id": participant_id,
-            "timestamp": rounded_time.isoformat(),
-            "balance": float(account_info.balance),
-            "equity": float(account_info.equity),
-            "floating_pl": float(floating_pl),
-            "margin_level": float(account_info.margin_level) if account_info.margin_level else None
-        }
+        if writer is not None:
+            writer.add('equity_snapshots', snapshot_data, on_conflict='participant_id,timestamp')
+            return True
         
         # Upsert to handle potential duplicates
         supabase.table('equity_snapshots').upsert(
@@ -132,11 +241,106 @@ def get_previous_day_equity(participant_id: str) -> float:
         return 0
 
 
+def _chunks(items: list, size: int = IN_FILTER_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class PreviousEquityCache:
+    """
+    Yesterday's closing equity per participant, valid for one UTC day.
+    
+    Loaded in bulk: the last hour of yesterday's snapshots, then the rest of
+    the day for participants without a late snapshot, then daily_stats for
+    whoever is still missing. Invalidated when the UTC date changes.
+    """
+    
+    def __init__(self):
+        self.day = None  # UTC date the values are valid for
+        self.values = {}  # participant_id -> previous day equity
+        self.loaded = set()  # participant ids already looked up today
+    
+    def prepare(self, participant_ids: list):
+        """Make sure every participant has its previous-day equity in memory"""
+        today = datetime.now(timezone.utc).date()
+        if self.day != today:
+            self.day = today
+            self.values = {}
+            self.loaded = set()
+        
+        missing = [pid for pid in participant_ids if pid not in self.loaded]
+        if missing:
+            self._load(missing)
+    
+    def get(self, participant_id: str) -> float:
+        return self.values.get(participant_id, 0)
+    
+    def _latest_snapshots(self, start: datetime, end: datetime, participant_ids) -> dict:
+        """Latest equity per participant in [start, end); participant_ids=None means everyone"""
+        latest = {}
+        
+        def query(ids):
+            q = supabase.table('equity_snapshots') \
+                .select('participant_id, equity, timestamp') \
+                .gte('timestamp', start.isoformat()) \
+                .lt('timestamp', end.isoformat())
+            if ids is not None:
+                q = q.in_('participant_id', ids)
+            return q.order('participant_id').order('timestamp', desc=True)
+        
+        groups = [None] if participant_ids is None else _chunks(participant_ids)
+        for ids in groups:
+            for row in select_all(lambda: query(ids)):
+                latest.setdefault(row['participant_id'], float(row['equity']))
+        return latest
+    
+    def _load(self, participant_ids: list):
+        day_end = datetime.combine(self.day, datetime.min.time(), tzinfo=timezone.utc)
+        day_start = day_end - timedelta(days=1)
+        last_hour = day_end - timedelta(hours=1)
+        wanted = set(participant_ids)
+        
+        try:
+            # 1. Last hour of yesterday (one unfiltered query when loading many participants)
+            few = len(participant_ids) <= IN_FILTER_CHUNK
+            found = self._latest_snapshots(last_hour, day_end, participant_ids if few else None)
+            found = {pid: eq for pid, eq in found.items() if pid in wanted}
+            
+            # 2. Rest of yesterday for participants without a late snapshot
+            missing = [pid for pid in participant_ids if pid not in found]
+            if missing:
+                found.update(self._latest_snapshots(day_start, last_hour, missing))
+            
+            # 3. Fallback: yesterday's daily_stats row
+            missing = [pid for pid in participant_ids if pid not in found]
+            for ids in _chunks(missing):
+                response = supabase.table('daily_stats') \
+                    .select('participant_id, equity') \
+                    .eq('date', day_start.date().isoformat()) \
+                    .in_('participant_id', ids) \
+                    .execute()
+                for row in response.data or []:
+                    if row.get('equity') is not None:
+                        found.setdefault(row['participant_id'], float(row['equity']))
+            
+            self.values.update(found)
+            self.loaded.update(participant_ids)
+            print(f"📅 Previous-day equity loaded for {len(found)}/{len(participant_ids)} participants ({day_start.date()})")
+        
+        except Exception as e:
+            print(f"Error loading previous-day equity: {e}")  # Retried next cycle
+
+
+previous_equity_cache = PreviousEquityCache()
+
+
 def calculate_equity_growth(participant_id: str, current_equity: float) -> float:
     """
     Calculate the equity growth percentage compared to previous day.
+    Served from previous_equity_cache; call previous_equity_cache.prepare()
+    for the cycle's participants first.
     """
-    previous_equity = get_previous_day_equity(participant_id)
+    previous_equity = previous_equity_cache.get(participant_id)
     
     if previous_equity <= 0:
         return 0
@@ -147,52 +351,12 @@ def calculate_equity_growth(participant_id: str, current_equity: float) -> float
 
 def cleanup_old_snapshots():
     """
-    Delete snapshots older than RETENTION_DAYS.
-    Called periodically to manage database size.
+    Roll up completed hours, then delete snapshots older than RETENTION_DAYS.
+    Called every cycle; the rollup only works when a new hour is complete and
+    the retention scheduler decides when to actually delete.
     """
-    try:
-        cutoff = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)
-        
-        result = supabase.table('equity_snapshots') \
-            .delete() \
-            .lt('timestamp', cutoff.isoformat()) \
-            .execute()
-        
-        if result.data:
-            count = len(result.data)
-            if count > 0:
-                print(f"🗑️ Cleaned up {count} old equity snapshots (>{RETENTION_DAYS} days)")
-        
-    except Exception as e:
-        print(f"❌ Error cleaning up old snapshots: {e}")
-
-
-def get_equity_curve(participant_id: str, days: int = 30) -> list:
-    """
-    Get equity curve data for charting.
-    
-    Args:
-        participant_id: UUID of the participant
-        days: Number of days to fetch (default 30)
-    
-    Returns:
-        List of {timestamp, equity, balance} objects
-    """
-    try:
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-        
-        response = supabase.table('equity_snapshots') \
-            .select('timestamp, balance, equity, floating_pl') \
-            .eq('participant_id', participant_id) \
-            .gte('timestamp', since.isoformat()) \
-            .order('timestamp', desc=False) \
-            .execute()
-        
-        return response.data or []
-        
-    except Exception as e:
-        print(f"Error fetching equity curve: {e}")
-        return []
+    equity_rollup.run()
+    snapshot_retention.run()
 
 
 def calculate_total_lots(positions: dict) -> float:
@@ -200,13 +364,10 @@ def calculate_total_lots(positions: dict) -> float:
     Calculate total lots traded from positions dictionary.
     
     Args:
-        positions: Dictionary of position data from sync_participant
+        positions: position_id -> Position (stats_engine.aggregate_positions)
     
     Returns:
         Total lots as float
     """
-    total = 0
-    for pid, pos in positions.items():
-        if pos.get('lot', 0) > 0:
-            total += pos['lot']
-    return round(total, 2)
+    # fsum: the same total whatever order the positions were loaded in
+    return round(math.fsum(pos.lot for pos in positions.values() if pos.lot > 0), 2)
@@ -0,0 +1,396 @@
+"""
+Fake MetaTrader5 module - synthetic terminal for running the bridge on Linux
+
+Use with MT5_MODULE=fake_mt5. Every account gets a deterministic trade
+history generated from its login number: positions open on a fixed time
+grid, so new deals keep appearing as the clock moves; positions whose
+last exit is still in the future are reported as open. Rates come from a
+deterministic price curve: M1 bars are sampled from it, higher timeframes
+are aggregated from M1 in server time, and there are no bars at weekends.
+Ticks are the curve's samples (seconds 0, 15, 30, 45 and 59 of each minute),
+so bars built from ticks match the M1 bars.
+
+Environment:
+- FAKE_MT5_POSITIONS: positions per account before today (default 500)
+- FAKE_MT5_SPACING: seconds between two positions (default 600)
+- FAKE_MT5_SYMBOLS: number of tradable symbols (default 4, extra ones are
+  named SYN005, SYN006...)
+- FAKE_MT5_CRASH_LOGIN: login that kills the process (worker pool testing)
+
+Every API call is counted in CALLS (and its time in CALL_SECONDS), for the
+benchmark harness; reset_counters() clears both.
+"""
+
+import os
+import math
+import time
+import random
+import functools
+from collections import Counter, namedtuple
+import numpy as np
+
+# Constants used by the bridge
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_TYPE_BALANCE = 2
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+COPY_TICKS_ALL = -1
+
+SERVER_TIME_OFFSET = 10800  # Server clock is GMT+3, like the real broker
+SYMBOLS = {'XAUUSD': 0.01, 'EURUSD': 0.00001, 'GBPUSD': 0.00001, 'USDJPY': 0.001}
+SYMBOLS.update({f"SYN{i:03d}": 0.001 for i in range(len(SYMBOLS) + 1, int(os.getenv("FAKE_MT5_SYMBOLS", "4")) + 1)})
+
+POSITIONS = int(os.getenv("FAKE_MT5_POSITIONS", "500"))
+SPACING = int(os.getenv("FAKE_MT5_SPACING", "600"))
+CRASH_LOGIN = os.getenv("FAKE_MT5_CRASH_LOGIN")
+
+TradeDeal = namedtuple('TradeDeal', [
+    'ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic', 'position_id', 'reason',
+    'volume', 'price', 'commission', 'swap', 'profit', 'fee', 'symbol', 'comment', 'external_id'
+])
+TradeOrder = namedtuple('TradeOrder', [
+    'ticket', 'time_setup', 'time_setup_msc', 'time_done', 'type', 'position_id',
+    'volume_initial', 'price_open', 'sl', 'tp', 'symbol'
+])
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'type', 'volume', 'price_open', 'sl', 'tp', 'price_current', 'profit', 'symbol'
+])
+AccountInfo = namedtuple('AccountInfo', ['login', 'server', 'balance', 'equity', 'margin', 'margin_free', 'margin_level'])
+SymbolInfo = namedtuple('SymbolInfo', ['name', 'point', 'digits'])
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc', 'flags', 'volume_real'])
+RATE_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')
+])
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+    ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')
+])
+_TICK_SECONDS = np.array([0, 15, 30, 45, 59])
+_TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60, TIMEFRAME_M5: 300, TIMEFRAME_M15: 900,
+    TIMEFRAME_H1: 3600, TIMEFRAME_H4: 14400, TIMEFRAME_D1: 86400,
+}
+# Newer builds also report SL/TP on the deal itself
+_DealWithStops = namedtuple('TradeDeal', TradeDeal._fields + ('sl', 'tp'))
+
+_initialized = False
+_login = None
+_last_error = (1, 'Success')
+_cache = {}  # (login, grid index) -> (deals, order, position)
+
+CALLS = Counter()  # API function -> calls
+CALL_SECONDS = Counter()  # API function -> seconds spent in it
+
+
+def reset_counters():
+    CALLS.clear()
+    CALL_SECONDS.clear()
+
+
+def _counted(fn):
+    """Count calls and time of an API function"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            CALLS[fn.__name__] += 1
+            CALL_SECONDS[fn.__name__] += time.perf_counter() - start
+    return wrapper
+
+
+def _now() -> int:
+    """Current server time"""
+    return int(time.time()) + SERVER_TIME_OFFSET
+
+
+def _generate(login: int, g: int):
+    """Deals, entry order and position of the position opened at grid slot g"""
+    key = (login, g)
+    if key in _cache:
+        return _cache[key]
+
+    rng = random.Random(login * 1000003 + g)
+    symbol = rng.choice(list(SYMBOLS))
+    point = SYMBOLS[symbol]
+    buy = rng.random() < 0.5
+    open_time = g * SPACING + rng.randint(0, SPACING // 2)
+    open_price = round(rng.uniform(1000, 2000) * point * 100, 5)
+    volume = round(rng.choice([0.01, 0.05, 0.1, 0.5, 1.0]), 2)
+    ticket = g * 4
+    sl_on_deal = rng.random() < 0.3
+
+    deals = [TradeDeal(
+        ticket, ticket, open_time, open_time * 1000, DEAL_TYPE_BUY if buy else DEAL_TYPE_SELL, DEAL_ENTRY_IN,
+        0, ticket, 0, volume, open_price, 0.0, 0.0, 0.0, 0.0, symbol, '', ''
+    )]
+    sl = open_price - 500 * point if buy else open_price + 500 * point
+    tp = open_price + 800 * point if buy else open_price - 800 * point
+    order = TradeOrder(ticket, open_time, open_time * 1000, open_time, 0 if buy else 1, ticket, volume, open_price, sl, tp, symbol)
+
+    # One full close, or a partial close followed by the rest
+    exits = 1 if rng.random() < 0.8 else 2
+    close_time = open_time
+    remaining = volume
+    for j in range(exits):
+        close_time += rng.randint(30, 6 * 3600)
+        part = remaining if j == exits - 1 else round(max(remaining / 2, 0.01), 2)
+        remaining = round(remaining - part, 2)
+        move = rng.randint(-600, 600) * point
+        close_price = open_price + move
+        profit = round((move if buy else -move) / point * part * 0.1, 2)
+        deals.append(TradeDeal(
+            ticket + 1 + j, ticket + 1 + j, close_time, close_time * 1000, DEAL_TYPE_SELL if buy else DEAL_TYPE_BUY,
+            DEAL_ENTRY_OUT, 0, ticket, 0, part, close_price, 0.0, 0.0, profit, 0.0, symbol, '', ''
+        ))
+
+    position = TradePosition(ticket, open_time, 0 if buy else 1, volume, open_price, sl, tp, open_price, 0.0, symbol)
+    entry_deal = deals[0]
+    if sl_on_deal:
+        # Some brokers report SL/TP on the deal itself (the bridge reads them via getattr)
+        entry_deal = _DealWithStops(*entry_deal, sl, tp)
+        deals[0] = entry_deal
+
+    _cache[key] = (deals, order, position)
+    return _cache[key]
+
+
+def _first_slot() -> int:
+    """History starts POSITIONS slots before today's server midnight"""
+    return (_now() // 86400 * 86400) // SPACING - POSITIONS
+
+
+def _history(login: int):
+    """Deals, orders and open positions visible at the current server time"""
+    now = _now()
+    first, last = _first_slot(), now // SPACING
+    start = first * SPACING - 60
+    balance_deal = TradeDeal(1, 0, start, start * 1000, DEAL_TYPE_BALANCE, DEAL_ENTRY_IN,
+                             0, 0, 0, 0.0, 0.0, 0.0, 0.0, 10000.0, 0.0, '', 'Deposit', '')
+    deals, orders, open_positions = [balance_deal], [], []
+    for g in range(first, last + 1):
+        pos_deals, order, position = _generate(login, g)
+        if pos_deals[0].time > now:
+            continue
+        orders.append(order)
+        deals.extend(d for d in pos_deals if d.time <= now)
+        if pos_deals[-1].time > now:
+            open_positions.append(position)
+    return deals, orders, open_positions
+
+
+def _ts(value) -> float:
+    return value.timestamp() if hasattr(value, 'timestamp') else float(value)
+
+
+def _price(symbol: str, t):
+    """Deterministic price curve of a symbol at server time(s) t"""
+    base = 1000 * SYMBOLS[symbol] * 200 * (1 + list(SYMBOLS).index(symbol) * 0.1)
+    t = np.asarray(t, dtype=np.float64)
+    return np.round(base * (1 + 0.02 * np.sin(t / 86400) + 0.004 * np.sin(t / 3600) + 0.001 * np.sin(t / 97)), 5)
+
+
+def _m1_bars(symbol: str, start: int, end: int):
+    """M1 bars with open time in [start, end], the last one forming at the current time"""
+    now = _now()
+    end = min(end, now)
+    minutes = np.arange(-(-start // 60), end // 60 + 1, dtype=np.int64) * 60
+    weekday = (minutes // 86400 + 3) % 7  # 1970-01-01 was a Thursday
+    minutes = minutes[weekday < 5]
+    bars = np.zeros(len(minutes), dtype=RATE_DTYPE)
+    if not len(minutes):
+        return bars
+    # The forming bar only holds the ticks seen so far (later samples repeat the last one)
+    samples = minutes[:, None] + _TICK_SECONDS
+    samples = np.maximum.accumulate(np.where(samples <= now, samples, 0), axis=1)
+    prices = _price(symbol, samples)
+    bars['time'] = minutes
+    bars['open'] = prices[:, 0]
+    bars['high'] = prices.max(axis=1)
+    bars['low'] = prices.min(axis=1)
+    bars['close'] = prices[:, -1]
+    bars['tick_volume'] = 10 + (minutes // 60 * 2654435761) % 50
+    bars['spread'] = 20
+    return bars
+
+
+def _rates(symbol: str, timeframe: int, start: int, end: int):
+    """Bars of any timeframe with open time in [start, end]"""
+    seconds = _TIMEFRAME_SECONDS[timeframe]
+    start = start // seconds * seconds
+    m1 = _m1_bars(symbol, start, end // seconds * seconds + seconds - 1)
+    if seconds == 60 or not len(m1):
+        return m1
+    buckets = m1['time'] // seconds * seconds
+    first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    last = np.r_[first[1:], len(m1)] - 1
+    bars = np.zeros(len(first), dtype=RATE_DTYPE)
+    bars['time'] = buckets[first]
+    bars['open'] = m1['open'][first]
+    bars['close'] = m1['close'][last]
+    bars['high'] = np.maximum.reduceat(m1['high'], first)
+    bars['low'] = np.minimum.reduceat(m1['low'], first)
+    bars['tick_volume'] = np.add.reduceat(m1['tick_volume'], first)
+    bars['spread'] = 20
+    return bars
+
+
+def _ticks(symbol: str, start: int, end: int):
+    """Ticks with time in [start, end]"""
+    minutes = _m1_bars(symbol, start - 60, end)['time']
+    times = (minutes[:, None] + _TICK_SECONDS).ravel()
+    times = times[(times >= start) & (times <= min(end, _now()))]
+    ticks = np.zeros(len(times), dtype=TICK_DTYPE)
+    ticks['time'] = times
+    ticks['time_msc'] = times * 1000
+    ticks['bid'] = _price(symbol, times)
+    ticks['ask'] = ticks['bid'] + 20 * SYMBOLS[symbol]
+    ticks['flags'] = 6  # TICK_FLAG_BID | TICK_FLAG_ASK
+    return ticks
+
+
+def _span(timeframe: int, count: int) -> int:
+    """Calendar seconds that surely hold `count` bars (weekends included)"""
+    return (count * _TIMEFRAME_SECONDS[timeframe]) * 7 // 5 + 4 * 86400
+
+
+@_counted
+def initialize(path=None, **kwargs) -> bool:
+    global _initialized
+    _initialized = True
+    return True
+
+
+@_counted
+def shutdown():
+    global _initialized
+    _initialized = False
+
+
+@_counted
+def last_error():
+    return _last_error
+
+
+@_counted
+def terminal_info():
+    return {'name': 'Fake MetaTrader 5', 'connected': _initialized}
+
+
+@_counted
+def login(login, password=None, server=None, timeout=None) -> bool:
+    global _login
+    if CRASH_LOGIN and str(login) == CRASH_LOGIN:
+        os._exit(3)
+    _login = int(login)
+    return True
+
+
+@_counted
+def account_info():
+    if _login is None:
+        return None
+    deals, _, open_positions = _history(_login)
+    balance = round(sum(d.profit for d in deals), 2)
+    floating = round(sum((p.volume * 10) * (1 if p.ticket % 8 else -1) for p in open_positions), 2)
+    margin = round(sum(p.volume * 100 for p in open_positions), 2)
+    equity = round(balance + floating, 2)
+    margin_level = round(equity / margin * 100, 2) if margin > 0 else 0.0
+    return AccountInfo(_login, 'Fake-Server', balance, equity, margin, round(equity - margin, 2), margin_level)
+
+
+@_counted
+def positions_get(**kwargs):
+    if _login is None:
+        return None
+    return tuple(_history(_login)[2])
+
+
+@_counted
+def history_deals_get(date_from, date_to, **kwargs):
+    if _login is None:
+        return None
+    start, end = _ts(date_from), _ts(date_to)
+    return tuple(d for d in _history(_login)[0] if start <= d.time <= end)
+
+
+@_counted
+def history_orders_get(date_from=None, date_to=None, ticket=None, **kwargs):
+    if _login is None:
+        return None
+    orders = _history(_login)[1]
+    if ticket is not None:
+        return tuple(o for o in orders if o.ticket == ticket)
+    start, end = _ts(date_from), _ts(date_to)
+    return tuple(o for o in orders if start <= o.time_setup <= end)
+
+
+@_counted
+def symbol_select(symbol, enable=True) -> bool:
+    return symbol in SYMBOLS
+
+
+@_counted
+def symbol_info(symbol):
+    if symbol not in SYMBOLS:
+        return None
+    point = SYMBOLS[symbol]
+    return SymbolInfo(symbol, point, int(round(-math.log10(point))))
+
+
+@_counted
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    if symbol not in SYMBOLS or timeframe not in _TIMEFRAME_SECONDS:
+        return None
+    now = _now()
+    bars = _rates(symbol, timeframe, now - _span(timeframe, start_pos + count), now)
+    end = len(bars) - start_pos
+    return bars[max(end - count, 0):max(end, 0)]
+
+
+@_counted
+def copy_rates_from(symbol, timeframe, date_from, count):
+    if symbol not in SYMBOLS or timeframe not in _TIMEFRAME_SECONDS:
+        return None
+    end = int(_ts(date_from))
+    return _rates(symbol, timeframe, end - _span(timeframe, count), end)[-count:]
+
+
+@_counted
+def copy_rates_range(symbol, timeframe, date_from, date_to):
+    if symbol not in SYMBOLS or timeframe not in _TIMEFRAME_SECONDS:
+        return None
+    start, end = int(_ts(date_from)), int(_ts(date_to))
+    bars = _rates(symbol, timeframe, start, end)
+    return bars[bars['time'] >= start]
+
+
+@_counted
+def symbol_info_tick(symbol):
+    if symbol not in SYMBOLS:
+        return None
+    now = _now()
+    ticks = _ticks(symbol, now - 4 * 86400, now)
+    return Tick(*ticks[-1].tolist()) if len(ticks) else None
+
+
+@_counted
+def copy_ticks_from(symbol, date_from, count, flags=COPY_TICKS_ALL):
+    if symbol not in SYMBOLS:
+        return None
+    start = int(_ts(date_from))
+    end = start + 86400
+    ticks = _ticks(symbol, start, end)
+    while len(ticks) < count and end < _now():
+        end += 7 * 86400
+        ticks = _ticks(symbol, start, end)
+    return ticks[:count]
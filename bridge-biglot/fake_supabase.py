@@ -0,0 +1,347 @@
+"""
+Fake Supabase - in-process PostgREST stand-in for offline runs and benchmarks
+
+Serves the subset of the PostgREST API the bridge uses on /rest/v1/<table>
+from in-memory tables, so the real supabase client (SUPABASE_URL pointed at
+it) works unchanged:
+- GET with select=, eq/neq/gt/gte/lt/lte/in filters, order=, limit/offset
+- POST insert and upsert (Prefer: resolution=merge-duplicates, on_conflict=)
+- PATCH and DELETE with filters, Prefer: count=exact (Content-Range)
+Every request is counted per method and table, with request and response
+payload bytes and the time spent serving it (the stand-in runs in the
+benchmark's process). Rows missing an id get a uuid (like the table defaults).
+
+Usage:
+    server = FakeSupabase().start()
+    os.environ["SUPABASE_URL"] = server.url
+"""
+
+import json
+import time
+import uuid
+import threading
+import functools
+from datetime import datetime, timezone
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+_OPERATORS = ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in', 'is')
+_RESERVED_PARAMS = ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns')
+
+
+def _sort_key(value):
+    """Comparable form of a column or filter value (numbers, timestamps, text)"""
+    try:
+        return _cached_sort_key(value)
+    except TypeError:  # Unhashable (json arrays / objects)
+        return (2, json.dumps(value, sort_keys=True))
+
+
+@functools.lru_cache(maxsize=1 << 20)
+def _cached_sort_key(value):
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (1, float(value))
+    text = str(value)
+    try:
+        return (1, float(text))
+    except ValueError:
+        pass
+    try:
+        ts = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return (1, ts.timestamp())
+    except ValueError:
+        return (2, text)
+
+
+def _parse_filter(expression: str):
+    operator, _, value = expression.partition('.')
+    if operator not in _OPERATORS:
+        raise ValueError(f"unsupported filter {expression!r}")
+    if operator == 'in':
+        values = [v.strip().strip('"') for v in value.strip('()').split(',') if v.strip()]
+        return operator, {_sort_key(v) for v in values}
+    if operator == 'is':
+        return operator, None
+    return operator, _sort_key(value)
+
+
+def _matches(row: dict, filters: list) -> bool:
+    for column, operator, value in filters:
+        actual = row.get(column)
+        if operator == 'is':
+            if actual is not None:
+                return False
+            continue
+        key = _sort_key(actual)
+        if operator == 'in':
+            ok = key in value
+        elif actual is None:
+            ok = False
+        elif operator == 'eq':
+            ok = key == value
+        elif operator == 'neq':
+            ok = key != value
+        elif operator == 'gt':
+            ok = key > value
+        elif operator == 'gte':
+            ok = key >= value
+        elif operator == 'lt':
+            ok = key < value
+        else:
+            ok = key <= value
+        if not ok:
+            return False
+    return True
+
+
+class FakeDatabase:
+    """In-memory tables with PostgREST-like query semantics (thread-safe)"""
+
+    def __init__(self):
+        self.tables = {}  # table -> list of row dicts
+        self._indexes = {}  # (table, conflict columns) -> {key: row}
+        self.lock = threading.Lock()
+
+    def seed(self, table: str, rows: list):
+        with self.lock:
+            self.tables.setdefault(table, []).extend(self._with_defaults(dict(r)) for r in rows)
+            self._drop_indexes(table)
+
+    def clear(self):
+        """Drop every table"""
+        with self.lock:
+            self.tables.clear()
+            self._indexes.clear()
+
+    def _drop_indexes(self, table: str):
+        for key in [k for k in self._indexes if k[0] == table]:
+            del self._indexes[key]
+
+    @staticmethod
+    def _with_defaults(row: dict) -> dict:
+        row.setdefault('id', str(uuid.uuid4()))
+        row.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+        return row
+
+    def _index(self, table: str, columns: tuple) -> dict:
+        key = (table, columns)
+        if key not in self._indexes:
+            self._indexes[key] = {tuple(_sort_key(r.get(c)) for c in columns): r for r in self.tables.get(table, [])}
+        return self._indexes[key]
+
+    def select(self, table: str, filters: list, order: list, offset: int, limit) -> list:
+        with self.lock:
+            rows = [r for r in self.tables.get(table, []) if _matches(r, filters)]
+        for column, desc in reversed(order):
+            rows.sort(key=lambda r: _sort_key(r.get(column)), reverse=desc)
+        end = None if limit is None else offset + limit
+        return rows[offset:end]
+
+    def write(self, table: str, rows: list, on_conflict: tuple = None) -> list:
+        with self.lock:
+            stored = self.tables.setdefault(table, [])
+            if not on_conflict:
+                written = [self._with_defaults(dict(r)) for r in rows]
+                stored.extend(written)
+                self._drop_indexes(table)
+                return written
+            index = self._index(table, on_conflict)
+            written = []
+            for row in rows:
+                key = tuple(_sort_key(row.get(c)) for c in on_conflict)
+                existing = index.get(key)
+                if existing is not None:
+                    existing.update(row)
+                    written.append(existing)
+                else:
+                    new = self._with_defaults(dict(row))
+                    stored.append(new)
+                    for (t, columns), other in self._indexes.items():
+                        if t == table:
+                            other[tuple(_sort_key(new.get(c)) for c in columns)] = new
+                    written.append(new)
+            return written
+
+    def update(self, table: str, filters: list, values: dict) -> list:
+        with self.lock:
+            rows = [r for r in self.tables.get(table, []) if _matches(r, filters)]
+            for row in rows:
+                row.update(values)
+            self._drop_indexes(table)
+            return rows
+
+    def delete(self, table: str, filters: list) -> list:
+        with self.lock:
+            stored = self.tables.get(table, [])
+            keep, removed = [], []
+            for row in stored:
+                (removed if _matches(row, filters) else keep).append(row)
+            self.tables[table] = keep
+            self._drop_indexes(table)
+            return removed
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakePostgREST/1.0"
+
+    def log_message(self, format, *args):
+        pass  # Quiet: requests are counted instead
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        table = parts.path.rstrip('/').rsplit('/', 1)[-1]
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        filters, order, select = [], [], None
+        offset, limit, on_conflict = 0, None, None
+        for name, value in params:
+            if name == 'select':
+                select = [c.strip() for c in value.split(',') if c.strip()]
+            elif name == 'order':
+                for term in value.split(','):
+                    bits = term.split('.')
+                    order.append((bits[0], len(bits) > 1 and bits[1] == 'desc'))
+            elif name == 'limit':
+                limit = int(value)
+            elif name == 'offset':
+                offset = int(value)
+            elif name == 'on_conflict':
+                on_conflict = tuple(c.strip() for c in value.split(','))
+            elif name not in _RESERVED_PARAMS:
+                filters.append((name, *_parse_filter(value)))
+        return table, filters, order, select, offset, limit, on_conflict
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        self.server.stats.record_in(len(raw))
+        return json.loads(raw) if raw else None
+
+    def _send(self, status: int, rows: list = None, count: int = None, minimal: bool = False):
+        payload = b'' if minimal or rows is None else json.dumps(rows, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if count is not None:
+            self.send_header('Content-Range', f"0-{max(count - 1, 0)}/{count}" if count else "*/0")
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+        self.server.stats.record_out(len(payload))
+
+    def _respond(self, method: str, handler):
+        start = time.perf_counter()
+        try:
+            table, filters, order, select, offset, limit, on_conflict = self._parse()
+            self.server.stats.record(method, table)
+            prefer = self.headers.get('Prefer', '')
+            rows = handler(table, filters, order, offset, limit, on_conflict)
+            if select and select != ['*']:
+                rows = [{c: r.get(c) for c in select} for r in rows]
+            count = len(rows) if 'count=exact' in prefer or 'count=planned' in prefer else None
+            minimal = method != 'GET' and 'return=representation' not in prefer
+            self._send(200 if method in ('GET', 'PATCH', 'DELETE') else 201, rows, count, minimal)
+        except Exception as e:
+            self.server.stats.errors += 1
+            self._send(400, {"message": str(e), "code": "FAKE", "hint": None, "details": None})
+        self.server.stats.record_time(time.perf_counter() - start)
+
+    def do_GET(self):
+        self._respond('GET', lambda t, f, o, off, lim, _: self.server.db.select(t, f, o, off, lim))
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        body = self._body()
+        rows = body if isinstance(body, list) else [body]
+        upsert = 'resolution=' in self.headers.get('Prefer', '')
+        self._respond('POST', lambda t, f, o, off, lim, conflict: self.server.db.write(
+            t, rows, (conflict or ('id',)) if upsert else None))
+
+    def do_PATCH(self):
+        values = self._body() or {}
+        self._respond('PATCH', lambda t, f, *_: self.server.db.update(t, f, values))
+
+    def do_DELETE(self):
+        self._body()
+        self._respond('DELETE', lambda t, f, *_: self.server.db.delete(t, f))
+
+
+class RequestStats:
+    """Request counts per (method, table) and payload bytes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def record(self, method: str, table: str):
+        with self.lock:
+            self.requests[(method, table)] += 1
+
+    def record_in(self, size: int):
+        with self.lock:
+            self.bytes_in += size
+
+    def record_out(self, size: int):
+        with self.lock:
+            self.bytes_out += size
+
+    def record_time(self, seconds: float):
+        with self.lock:
+            self.seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "by_table": {f"{m} {t}": n for (m, t), n in sorted(self.requests.items())},
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "errors": self.errors,
+                "seconds": round(self.seconds, 4),
+            }
+
+
+class FakeSupabase:
+    """PostgREST stand-in served from a background thread"""
+
+    def __init__(self, db: FakeDatabase = None, host: str = '127.0.0.1', port: int = 0):
+        self.db = db or FakeDatabase()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.db = self.db
+        self.httpd.stats = RequestStats()
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> RequestStats:
+        return self.httpd.stats
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-supabase", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
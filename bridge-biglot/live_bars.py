@@ -0,0 +1,84 @@
+"""
+Live Bars - forming candles built from ticks
+
+Features:
+- Keeps the forming bar of every timeframe for one symbol in memory
+- Seeded from the terminal's last bar, then updated tick by tick (bid price)
+- Buckets on server time, like the terminal's own bars
+- Collects changed bars keyed by (timeframe, open time), so a burst of ticks
+  becomes one update per bar; a bar that closes is reported one last time
+"""
+
+import numpy as np
+
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('tick_volume', '<u8')
+])
+
+
+class LiveBars:
+    """Forming bars of one symbol"""
+
+    def __init__(self, timeframes: dict):
+        """timeframes: name -> bar length in seconds"""
+        self.timeframes = timeframes
+        self.forming = {}  # timeframe -> [time, open, high, low, close, tick_volume]
+        self.updates = {}  # (timeframe, time) -> bar values, drained by take_updates()
+        self.last_msc = 0  # Newest tick processed
+        self._seen_at_last = 0  # Ticks already processed with time_msc == last_msc
+
+    def seed(self, tf_name: str, rate):
+        """Start from the terminal's current bar (a copy_rates_* record)"""
+        self.forming[tf_name] = [int(rate['time']), float(rate['open']), float(rate['high']),
+                                 float(rate['low']), float(rate['close']), int(rate['tick_volume'])]
+
+    def seed_ticks_from(self, time_msc: int):
+        """Ticks up to and including time_msc are already part of the seeded bars"""
+        self.last_msc = time_msc
+        self._seen_at_last = -1  # Skip every tick at exactly time_msc
+
+    def add_ticks(self, ticks) -> int:
+        """Apply new ticks (a copy_ticks_* array, oldest first). Returns the number applied."""
+        if ticks is None or len(ticks) == 0:
+            return 0
+
+        # Drop ticks already processed (copy_ticks_from repeats the boundary millisecond)
+        msc = ticks['time_msc']
+        at_last = np.flatnonzero(msc == self.last_msc)
+        skip = len(at_last) if self._seen_at_last < 0 else min(self._seen_at_last, len(at_last))
+        keep = msc > self.last_msc
+        keep[at_last[skip:]] = True
+        ticks = ticks[keep & (ticks['bid'] > 0)]
+        if len(ticks) == 0:
+            return 0
+
+        for tf_name, seconds in self.timeframes.items():
+            bar = self.forming.get(tf_name)
+            for t, price in zip((ticks['time'] // seconds * seconds).tolist(), ticks['bid'].tolist()):
+                if bar is None or t > bar[0]:
+                    bar = [t, price, price, price, price, 1]
+                    self.forming[tf_name] = bar
+                elif t == bar[0]:
+                    if price > bar[2]: bar[2] = price
+                    if price < bar[3]: bar[3] = price
+                    bar[4] = price
+                    bar[5] += 1
+                else:
+                    continue  # Tick older than the seeded bar
+                self.updates[(tf_name, t)] = tuple(bar)
+
+        newest = int(ticks['time_msc'][-1])
+        if newest == self.last_msc and self._seen_at_last >= 0:
+            self._seen_at_last += int(np.count_nonzero(ticks['time_msc'] == newest))
+        else:
+            self._seen_at_last = int(np.count_nonzero(ticks['time_msc'] == newest))
+        self.last_msc = newest
+        return len(ticks)
+
+    def take_updates(self) -> dict:
+        """Changed bars since the last call: {timeframe: bar array}"""
+        by_tf = {}
+        for (tf_name, _), bar in sorted(self.updates.items(), key=lambda item: item[0][1]):
+            by_tf.setdefault(tf_name, []).append(bar)
+        self.updates = {}
+        return {tf_name: np.array(bars, dtype=BAR_DTYPE) for tf_name, bars in by_tf.items()}
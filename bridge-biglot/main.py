@@ -1,27 +1,133 @@
 import os
+import sys
 import time
-import MetaTrader5 as mt5
 from datetime import datetime, timezone, timedelta
-from collections import Counter
-import csv
-from core import init_mt5, get_supabase_client, load_env, send_telegram_message
+from types import SimpleNamespace
+import metrics
+from core import mt5, init_mt5, get_supabase_client, load_env, send_telegram_message
 from equity_service import (
-    should_record_snapshot, 
-    record_equity_snapshot, 
+    SnapshotScheduler,
+    previous_equity_cache,
     calculate_equity_growth,
     calculate_total_lots,
     cleanup_old_snapshots
 )
+from stats_engine import (
+    STATS_ENGINE,
+    STATS_VERIFY,
+    StatsAccumulator,
+    aggregate_positions,
+    closed_positions,
+    compute_stats,
+    update_accumulator,
+    diff_stats
+)
+from vector_stats import (
+    get_deal_arrays,
+    get_position_arrays,
+    closed_position_index,
+    compute_stats_vectorized,
+    positions_from_arrays,
+    total_lots_vectorized
+)
+from worker_pool import MT5_PATHS, WorkerPool
+from pipeline import run_pipeline
+from batch_writer import BatchWriter
+from write_cache import WriteCache
+from participant_sync import ParticipantCsvSync
+from cycle_scheduler import CycleScheduler
+from sync_priority import SyncPriority
+from sync_state import (
+    load_account_state,
+    save_account_state,
+    get_fetch_start,
+    HISTORY_START,
+    merge_deals,
+    get_deals,
+    record_account,
+    stage_positions,
+    get_position_deals
+)
 
 # Load environment variables
 load_env()
 
 SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", "60")) # Default 60 seconds
+ORDER_LOOKBACK_DAYS = (7, 90)  # Spans searched before the sync window for orders placed earlier (then all history)
 
 # Initialize Supabase client
 supabase = get_supabase_client()
 
-def sync_participant(participant):
+# Last equity snapshot bucket per participant
+snapshot_scheduler = SnapshotScheduler()
+
+# Fixed-cadence cycles; participants not reached in time go first next cycle
+cycle_scheduler = CycleScheduler(SYNC_INTERVAL)
+
+# Active accounts every cycle, idle ones with exponential backoff
+sync_priority = SyncPriority(SYNC_INTERVAL)
+
+# participants.csv watcher with a cached snapshot of the participants table
+participant_sync = ParticipantCsvSync(supabase)
+
+# Row hashes of the last successful writes (loaded on first use, MT5 workers never need it)
+_write_cache = None
+
+# Trades rows are only emitted when they change: failed ones are queued again next cycle
+failed_trades = []
+
+# Participants owed a full resync (--full-resync) or a re-send of every row (reconcile).
+# An entry is only cleared once that participant's rows were written, so
+# participants carried over past the fetch deadline keep it
+pending_resync = set()
+pending_resend = set()
+written_participants = set()  # Participants whose rows were queued since the last flush
+
+
+def get_write_cache() -> WriteCache:
+    global _write_cache
+    if _write_cache is None:
+        _write_cache = WriteCache()
+    return _write_cache
+
+def get_orders_by_ticket(from_date, to_date) -> dict:
+    """Fetch all history orders in the window, indexed by order ticket"""
+    try:
+        orders = mt5.history_orders_get(from_date, to_date)
+    except Exception as e:
+        print(f"Error fetching history orders: {e}")
+        return {}
+    if orders is None:
+        print(f"No history orders found, error code: {mt5.last_error()}")
+        return {}
+    return {order.ticket: order for order in orders}
+
+def get_orders_before(tickets: set, from_date) -> dict:
+    """
+    Orders placed before the sync window, indexed by ticket: one ranged query
+    ending at from_date, reaching further back (ORDER_LOOKBACK_DAYS, then the
+    whole history) only while some of the tickets are still missing.
+    """
+    found = {}
+    starts = [from_date - timedelta(days=days) for days in ORDER_LOOKBACK_DAYS] + [HISTORY_START]
+    for start in starts:
+        start = max(start, HISTORY_START)
+        if start >= from_date:
+            break
+        orders = get_orders_by_ticket(start, from_date)
+        found.update((ticket, orders[ticket]) for ticket in tickets if ticket in orders)
+        if len(found) == len(tickets) or start == HISTORY_START:
+            break
+    return found
+
+@metrics.by_participant(lambda participant, *args, **kwargs: participant['nickname'])
+def fetch_participant(participant, full_resync=False, resend_rows=False):
+    """
+    MT5 side of a participant sync: login, account info, deal history,
+    SL/TP orders and symbol points. Makes no Supabase calls.
+    Returns the input for compute_participant(), or None on failure.
+    resend_rows: emit a trades row for every closed position, not only the changed ones
+    """
     print(f"Syncing participant: {participant['nickname']} ({participant['account_id']})")
     
     # 1. Login to MT5
@@ -45,421 +151,457 @@ def sync_participant(participant):
         print(f"Failed to get account info, error code: {mt5.last_error()}")
         return
 
-    # 2.5. Record Equity Snapshot (every 5 minutes)
-    if should_record_snapshot(participant['id']):
-        record_equity_snapshot(participant['id'], account_info)
+    account = SimpleNamespace(
+        balance=account_info.balance,
+        equity=account_info.equity,
+        margin_level=account_info.margin_level
+    )
 
-    # 3. Get Trade History (Last 30 days for safety, or all time)
-    from_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # 3. Get Trade History (incremental from the account's watermark)
+    state = load_account_state(participant['account_id'])
+    from_date = get_fetch_start(state, full=full_resync)
     # Add 1 day to current time to avoid timezone mismatches (server time vs local time)
     to_date = datetime.now(timezone.utc) + timedelta(days=1)
     
-    print(f"Fetching history from {from_date} to {to_date}...")
+    print(f"Fetching history from {from_date} to {to_date}{' (full resync)' if full_resync else ''}...")
     
     # Get Current Open Positions (to filter out)
     current_positions = mt5.positions_get()
     open_pids = {p.ticket for p in current_positions} if current_positions else set()
+    activity = {"open_positions": len(open_pids), "new_deals": 0, "last_deal_time": state["watermark_time"]}
+    # Kept in the local store so stats can be recomputed without the terminal
+    open_changed = record_account(state, account, open_pids)
     if current_positions:
         print(f"DEBUG: Found {len(current_positions)} open positions on account.")
     else:
         print("DEBUG: No open positions found.")
 
-    history_deals = mt5.history_deals_get(from_date, to_date)
+    fetched_deals = mt5.history_deals_get(from_date, to_date)
     
-    if history_deals is None:
+    if fetched_deals is None:
         print(f"No history found, error code: {mt5.last_error()}")
-    else:
-        print(f"Found {len(history_deals)} deals")
-        
-        # Advanced stats calculation
-        gross_profit = 0
-        gross_loss = 0
-        total_holding_time = 0
-        holding_counts = 0
-        symbols = []
-        
-        # Initializing missing variables
-        total_profit = 0
-        wins = 0
-        losses = 0
-        total_trades = 0
-        total_points = 0
-        best_trade = -float('inf')
-        worst_trade = float('inf')
-        
-        # Long/Short Stats
-        buy_trades = 0
-        buy_wins = 0
-        sell_trades = 0
-        sell_wins = 0
-        
-        symbol_cache = {}
-        
-        # For Max DD calculation (Balance based)
-        peak_profit = -float('inf')
-        current_profit_curve = 0
-        max_drawdown_val = 0
-        
-        positions = {} # position_id -> {details}
-        
-        # 1. First Pass: Aggregate all deals by position_id
-        for deal in history_deals:
-            if deal.symbol:
-                symbols.append(deal.symbol)
-                
-            pid = deal.position_id
-            if pid not in positions:
-                positions[pid] = {
-                    'open_time': 0, 
-                    'close_time': 0, 
-                    'profit': 0,
-                    'symbol': deal.symbol,
-                    'type': 'UNKNOWN',
-                    'lot': 0,
-                    'volume_out': 0,
-                    'open_price': 0,
-                    'close_price': 0,
-                    'sl': 0,
-                    'tp': 0,
-                    'deals_out': []
-                }
-            
-            if deal.entry == mt5.DEAL_ENTRY_IN:
-                positions[pid]['open_time'] = deal.time
-                positions[pid]['open_price'] = deal.price
-                positions[pid]['lot'] += deal.volume
-                
-                # Try to get SL/TP
-                sl = getattr(deal, 'sl', 0.0)
-                tp = getattr(deal, 'tp', 0.0)
-                if (sl == 0.0 or tp == 0.0) and deal.order > 0:
-                    try:
-                        orders = mt5.history_orders_get(ticket=deal.order)
-                        if orders and len(orders) > 0:
-                            order = orders[0]
-                            if sl == 0.0: sl = getattr(order, 'sl', 0.0)
-                            if tp == 0.0: tp = getattr(order, 'tp', 0.0)
-                    except: pass
-                positions[pid]['sl'] = sl
-                positions[pid]['tp'] = tp
-                positions[pid]['type'] = 'BUY' if (deal.type == mt5.DEAL_TYPE_BUY or deal.type == 0) else 'SELL'
-                
-            elif deal.entry == mt5.DEAL_ENTRY_OUT:
-                positions[pid]['close_time'] = deal.time
-                positions[pid]['close_price'] = deal.price
-                positions[pid]['profit'] += deal.profit
-                positions[pid]['volume_out'] += deal.volume
-                positions[pid]['deals_out'].append(deal)
-
-        # 2. Second Pass: Filter and calculate stats only for FULLY CLOSED trades
-        # A trade is fully closed if it's NOT in open_pids AND it has some volume_out
-        closed_pids = sorted(
-            [pid for pid, pos in positions.items() if pid not in open_pids and pos['volume_out'] > 0],
-            key=lambda x: positions[x]['close_time']
-        )
-        
-        session_stats = {
-            'asian': {'profit': 0, 'wins': 0, 'total': 0},
-            'london': {'profit': 0, 'wins': 0, 'total': 0},
-            'newyork': {'profit': 0, 'wins': 0, 'total': 0}
-        }
-        
-        total_duration = 0
-        duration_count = 0
-        win_duration = 0
-        win_duration_count = 0
-        loss_duration = 0
-        loss_duration_count = 0
-        
-        trades_data = []
-        
-        for pid in closed_pids:
-            pos = positions[pid]
-            
-            # Stats calculation
-            total_trades += 1
-            total_profit += pos['profit']
-            
-            if pos['profit'] > 0:
-                wins += 1
-                gross_profit += pos['profit']
-            elif pos['profit'] < 0:
-                losses += 1
-                gross_loss += abs(pos['profit'])
-            
-            if pos['profit'] > best_trade: best_trade = pos['profit']
-            if pos['profit'] < worst_trade: worst_trade = pos['profit']
-            
-            if pos['type'] == 'BUY':
-                buy_trades += 1
-                if pos['profit'] > 0: buy_wins += 1
-            elif pos['type'] == 'SELL':
-                sell_trades += 1
-                if pos['profit'] > 0: sell_wins += 1
-            
-            # Points (Weighted by volume)
-            if pos['open_price'] > 0:
-                sym = pos['symbol']
-                if sym:
-                    if sym not in symbol_cache:
-                        info = mt5.symbol_info(sym)
-                        if info is None:
-                            mt5.symbol_select(sym, True)
-                            info = mt5.symbol_info(sym)
-                        symbol_cache[sym] = info
-                    
-                    sym_info = symbol_cache.get(sym)
-                    if sym_info and sym_info.point > 0:
-                        pos_points = 0
-                        for d_out in pos['deals_out']:
-                            p_diff = (d_out.price - pos['open_price']) if pos['type'] == 'BUY' else (pos['open_price'] - d_out.price)
-                            pos_points += (p_diff / sym_info.point) * (d_out.volume / pos['lot'])
-                        total_points += pos_points
-
-            # DD Calculation
-            current_profit_curve += pos['profit']
-            if current_profit_curve > peak_profit: peak_profit = current_profit_curve
-            dd = peak_profit - current_profit_curve
-            if dd > max_drawdown_val: max_drawdown_val = dd
-            
-            # Session Stats
-            # Adjust server time (GMT+3) to UTC
-            open_hour = datetime.utcfromtimestamp(pos['open_time'] - 10800).hour
-            is_win = pos['profit'] > 0
-            if 0 <= open_hour < 8:
-                session_stats['asian']['profit'] += pos['profit']
-                session_stats['asian']['total'] += 1
-                if is_win: session_stats['asian']['wins'] += 1
-            if 7 <= open_hour < 16:
-                session_stats['london']['profit'] += pos['profit']
-                session_stats['london']['total'] += 1
-                if is_win: session_stats['london']['wins'] += 1
-            if 12 <= open_hour < 21:
-                session_stats['newyork']['profit'] += pos['profit']
-                session_stats['newyork']['total'] += 1
-                if is_win: session_stats['newyork']['wins'] += 1
-
-            # Duration Stats
-            duration = pos['close_time'] - pos['open_time']
-            if duration >= 0:
-                total_duration += duration
-                duration_count += 1
-                if pos['profit'] > 0:
-                    win_duration += duration
-                    win_duration_count += 1
-                elif pos['profit'] < 0:
-                    loss_duration += duration
-                    loss_duration_count += 1
-            
-            # Collect data for 'trades' table
-            trades_data.append({
-                "participant_id": participant['id'],
-                "symbol": pos['symbol'],
-                "type": pos['type'],
-                "lot_size": float(pos['lot']),
-                "open_price": float(pos['open_price']),
-                "close_price": float(pos['close_price']),
-                "sl": float(pos.get('sl', 0)),
-                "tp": float(pos.get('tp', 0)),
-                "open_time": datetime.fromtimestamp(pos['open_time'] - 10800, tz=timezone.utc).isoformat(),
-                "close_time": datetime.fromtimestamp(pos['close_time'] - 10800, tz=timezone.utc).isoformat(),
-                "profit": float(pos['profit']),
-                "position_id": pid
-            })
-
-        # Calculate Consecutive Stats
-        max_consecutive_wins = 0
-        max_consecutive_losses = 0
-        current_consecutive_wins = 0
-        current_consecutive_losses = 0
-        for pid in closed_pids:
-            if positions[pid]['profit'] > 0:
-                current_consecutive_wins += 1
-                current_consecutive_losses = 0
-                if current_consecutive_wins > max_consecutive_wins: max_consecutive_wins = current_consecutive_wins
-            elif positions[pid]['profit'] < 0:
-                current_consecutive_losses += 1
-                current_consecutive_wins = 0
-                if current_consecutive_losses > max_consecutive_losses: max_consecutive_losses = current_consecutive_losses
-
-        # Calculate aggregates
-        win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-        win_rate_buy = (buy_wins / buy_trades * 100) if buy_trades > 0 else 0
-        win_rate_sell = (sell_wins / sell_trades * 100) if sell_trades > 0 else 0
-        
-        profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else (gross_profit if gross_profit > 0 else 0)
-        
-        # Max DD %
-        current_balance = account_info.balance
-        start_balance = current_balance - total_profit
-        peak_balance = start_balance + peak_profit
-        max_dd_percent = (max_drawdown_val / peak_balance * 100) if peak_balance > 0 else 0
-
-        # Avg Win / Loss
-        avg_win = (gross_profit / wins) if wins > 0 else 0
-        avg_loss = -(gross_loss / losses) if losses > 0 else 0
-        rr_ratio = abs(avg_win / avg_loss) if avg_loss != 0 else 0
-
-        # Holding Time Strings
-        def format_duration(seconds):
-            m, s = divmod(seconds, 60)
-            h, m = divmod(m, 60)
-            d, h = divmod(h, 24)
-            if d > 0: return f"{int(d)}d {int(h)}h"
-            if h > 0: return f"{int(h)}h {int(m)}m"
-            return f"{int(m)}m {int(s)}s"
-            
-        avg_holding_time_str = format_duration(total_duration / duration_count) if duration_count > 0 else "0m"
-        avg_holding_time_win_str = format_duration(win_duration / win_duration_count) if win_duration_count > 0 else "0m"
-        avg_holding_time_loss_str = format_duration(loss_duration / loss_duration_count) if loss_duration_count > 0 else "0m"
-        
-        # Trading Style
-        avg_holding_minutes = (total_duration / duration_count / 60) if duration_count > 0 else 0
-        if duration_count == 0: trading_style = "Unknown"
-        elif avg_holding_minutes < 30: trading_style = "Scalping"
-        elif avg_holding_minutes < 1440: trading_style = "Intraday"
-        else: trading_style = "Swing"
-
-        # Favorite Pair
-        favorite_pair = Counter(symbols).most_common(1)[0][0] if symbols else "-"
-
-        # 4. Update Daily Stats in Supabase
-        today = datetime.now(timezone.utc).date().isoformat()
-        
-        stats_data = {
-            "participant_id": participant['id'],
-            "date": today,
-            "balance": account_info.balance,
-            "equity": account_info.equity,
-            "profit": total_profit, 
-            "points": int(total_points), 
-            "win_rate": win_rate,
-            "total_trades": total_trades,
-            "profit_factor": round(profit_factor, 2),
-            "rr_ratio": round(rr_ratio, 2),
-            "max_drawdown": round(max_dd_percent, 2),
-            "avg_win": round(avg_win, 2),
-            "avg_loss": round(avg_loss, 2),
-            "trading_style": trading_style,
-            "favorite_pair": favorite_pair,
-            "avg_holding_time": avg_holding_time_str,
-            "best_trade": float(best_trade) if best_trade != -float('inf') else 0,
-            "worst_trade": float(worst_trade) if worst_trade != float('inf') else 0,
-            "win_rate_buy": round(win_rate_buy, 2),
-            "win_rate_sell": round(win_rate_sell, 2),
-            "avg_holding_time_win": avg_holding_time_win_str,
-            "avg_holding_time_loss": avg_holding_time_loss_str,
-            "max_consecutive_wins": max_consecutive_wins,
-            "max_consecutive_losses": max_consecutive_losses,
-            "session_asian_profit": round(session_stats['asian']['profit'], 2),
-            "session_london_profit": round(session_stats['london']['profit'], 2),
-            "session_newyork_profit": round(session_stats['newyork']['profit'], 2),
-            "session_asian_win_rate": round((session_stats['asian']['wins'] / session_stats['asian']['total'] * 100), 2) if session_stats['asian']['total'] > 0 else 0,
-            "session_london_win_rate": round((session_stats['london']['wins'] / session_stats['london']['total'] * 100), 2) if session_stats['london']['total'] > 0 else 0,
-            "session_newyork_win_rate": round((session_stats['newyork']['wins'] / session_stats['newyork']['total'] * 100), 2) if session_stats['newyork']['total'] > 0 else 0,
-            "floating_pl": round(account_info.equity - account_info.balance, 2),
-            "total_lots": calculate_total_lots(positions),
-            "equity_growth_percent": calculate_equity_growth(participant['id'], account_info.equity)
-        }
-        
-        print(f"Calculated Stats for {participant['nickname']}: WinRate={win_rate:.1f}%, HoldingTime={avg_holding_time_str}, Trades={total_trades}")
-        
-        # 5. Update Trades History in Supabase
-        if trades_data:
-            try:
-                data, count = supabase.table('trades').upsert(trades_data, on_conflict='participant_id,position_id').execute()
-                print(f"Synced {len(trades_data)} trades for {participant['nickname']}")
-            except Exception as e:
-                print(f"Error syncing trades: {e}")
-
-        # Upsert to Supabase
-        try:
-            data, count = supabase.table('daily_stats').upsert(stats_data, on_conflict='participant_id,date').execute()
-            print(f"Updated stats for {participant['nickname']}")
-        except Exception as e:
-            print(f"Error updating stats: {e}")
+        return {"participant": participant, "account": account, "trade_stats": None, "activity": activity}
 
-def sync_participants_from_csv():
-    csv_file = 'participants.csv'
-    if not os.path.exists(csv_file):
-        print(f"Warning: {csv_file} not found. Skipping CSV sync.")
+    new_deals = merge_deals(state, fetched_deals, full=full_resync)
+    activity["new_deals"] = len(new_deals)
+    activity["last_deal_time"] = state["watermark_time"]
+    print(f"Found {len(fetched_deals)} deals ({len(new_deals)} new, {len(state['deals'])} total)")
+    
+    # Missing SL/TP comes from the orders: one ranged query per sync window
+    # (only if a deal needs it), cached per position for later cycles.
+    # Older deals were resolved in the cycle they arrived.
+    sltp_cache = state['sltp']
+    state_changed = bool(new_deals) or full_resync or bool(open_changed)
+    points = state['points']
+    missing_symbols = {deal.symbol for deal in new_deals if deal.symbol and deal.symbol not in points}
+    needs_order = [deal for deal in new_deals
+                   if deal.entry == mt5.DEAL_ENTRY_IN and deal.order > 0 and (deal.sl == 0.0 or deal.tp == 0.0)]
+    if needs_order:
+        orders_by_ticket = get_orders_by_ticket(from_date, to_date)
+        # Orders placed before the sync window (e.g. pending orders): batched, not one query each
+        before_window = {deal.order for deal in needs_order} - orders_by_ticket.keys()
+        if before_window:
+            orders_by_ticket.update(get_orders_before(before_window, from_date))
+    for deal in needs_order:
+        sl, tp = deal.sl, deal.tp
+        order = orders_by_ticket.get(deal.order)
+        if order is not None:
+            if sl == 0.0: sl = getattr(order, 'sl', 0.0)
+            if tp == 0.0: tp = getattr(order, 'tp', 0.0)
+        sltp_cache[deal.position_id] = (sl, tp)
+        state_changed = True
+    
+    # Point size of every traded symbol (looked up once per account)
+    for sym in missing_symbols:
+        info = mt5.symbol_info(sym)
+        if info is None:
+            mt5.symbol_select(sym, True)
+            info = mt5.symbol_info(sym)
+        points[sym] = info.point if info else 0
+        state_changed = True
+    
+    return {
+        "participant": participant,
+        "account": account,
+        "open_pids": open_pids,
+        "state": state,
+        "new_deals": new_deals,
+        "open_changed": open_changed,
+        "full_resync": full_resync,
+        "resend_rows": resend_rows,
+        "state_changed": state_changed,
+        "activity": activity
+    }
+
+@metrics.by_participant(lambda fetched: fetched['participant']['nickname'])
+def compute_participant(fetched):
+    """
+    CPU side of a participant sync: positions, stats and trade rows.
+    Uses only what fetch_participant collected (no MT5 or Supabase calls).
+    Only positions touched since the last cycle are emitted as trades rows
+    (all of them on a rebuild or when resend_rows).
+    """
+    participant = fetched['participant']
+    account_info = fetched['account']
+    if fetched.get('state') is None:
+        return {"participant": participant, "account": account_info, "trade_stats": None, "activity": fetched.get('activity')}
+    
+    state = fetched['state']
+    open_pids = fetched['open_pids']
+    # Positions that may have changed: new deals or SL/TP resolved this cycle, opened or closed since the last one
+    refold = {deal.position_id for deal in fetched['new_deals']} | state['sltp'].dirty
+    touched = refold | fetched['open_changed']
+    resend = fetched.get('resend_rows') or fetched['full_resync'] or state['rewrite']
+    
+    def get_point(sym):
+        return state['points'].get(sym, 0)
+    
+    if STATS_ENGINE == 'vectorized':
+        trade_stats, row_positions, total_lots, changed = compute_from_arrays(fetched, touched, resend, get_point)
+    else:
+        trade_stats, row_positions, total_lots, changed = compute_from_positions(fetched, refold, touched, resend, get_point)
+    state_changed = fetched['state_changed'] or changed
+    
+    if STATS_VERIFY and STATS_ENGINE != 'loop':
+        # Reference: every position aggregated again from the whole history
+        deals = get_deals(state)
+        positions = aggregate_positions(deals, state['sltp'])
+        symbols = [deal.symbol for deal in deals]
+        expected = compute_stats(positions, closed_positions(positions, open_pids), symbols, account_info.balance, get_point)
+        mismatched = diff_stats(expected, trade_stats)
+        if mismatched:
+            print(f"⚠️ Stats mismatch ({STATS_ENGINE}) for {participant['nickname']}: " + ", ".join(f"{k}={trade_stats[k]!r} (expected {expected[k]!r})" for k in mismatched))
+    
+    if state_changed:
+        save_account_state(participant['account_id'], state)
+    
+    trades_data = [trade_row(participant, pid, pos) for pid, pos in row_positions.items()]
+
+    print(f"Calculated Stats for {participant['nickname']}: WinRate={trade_stats['win_rate']:.1f}%, HoldingTime={trade_stats['avg_holding_time']}, Trades={trade_stats['total_trades']}")
+
+    return {
+        "participant": participant,
+        "account": account_info,
+        "trade_stats": trade_stats,
+        "trades_data": trades_data,
+        "total_lots": total_lots,
+        "resend_rows": resend,
+        "activity": fetched.get('activity')
+    }
+
+def compute_from_positions(fetched, refold, touched, resend, get_point):
+    """
+    Incremental and loop engines: Position records kept in the local store,
+    only the ones with new deals or new SL/TP are aggregated again.
+    Returns (stats, {position_id: Position} to emit as trades rows, total lots, state changed).
+    """
+    state = fetched['state']
+    open_pids = fetched['open_pids']
+    balance = fetched['account'].balance
+    all_deals = lambda: get_deals(state)  # Whole history: rebuilds and the loop engine only
+    
+    positions = state['positions']
+    rebuild = positions is None or fetched['full_resync'] or state['rewrite']
+    if rebuild:
+        positions = state['positions'] = aggregate_positions(all_deals(), state['sltp'])
+        changed = stage_positions(state)
+        touched = set(positions)
+    else:
+        aggregate_positions(get_position_deals(fetched['participant']['account_id'], state, refold), state['sltp'], positions)
+        changed = stage_positions(state, refold)
+    
+    # Fully closed among the touched positions (not open any more, some volume out)
+    closed_pids = closed_positions(positions, open_pids, touched)
+    
+    with metrics.timer("stats_compute"):
+        if STATS_ENGINE == 'loop':
+            # The accumulator is not kept up to date: rebuilt if the engine is switched back
+            if state['stats'] is not None:
+                state['stats'] = None
+                changed = True
+            symbols = [deal.symbol for deal in all_deals()]
+            trade_stats = compute_stats(positions, closed_positions(positions, open_pids), symbols, balance, get_point)
+        else:
+            # Only positions closed since the last cycle are absorbed
+            accumulator = state['stats']
+            rebuild_stats = rebuild or accumulator is None
+            if accumulator is None:
+                accumulator = state['stats'] = StatsAccumulator()
+            if update_accumulator(accumulator, positions, open_pids, touched, fetched['new_deals'], all_deals, get_point, rebuild=rebuild_stats):
+                changed = True
+            trade_stats = accumulator.stats(balance)
+    
+    # Trades rows of the changed positions (or all of them when asked to re-send)
+    row_pids = closed_positions(positions, open_pids) if resend else closed_pids
+    return trade_stats, {pid: positions[pid] for pid in row_pids}, calculate_total_lots(positions), changed
+
+def compute_from_arrays(fetched, touched, resend, get_point):
+    """
+    Vectorized engine: stats, trades rows and lots straight from the deal
+    arrays kept in memory (no Position records are built or stored).
+    Returns (stats, {position_id: Position} to emit as trades rows, total lots, state changed).
+    """
+    state = fetched['state']
+    open_pids = fetched['open_pids']
+    changed = False
+    
+    # Stored positions and accumulator are not kept up to date: rebuilt if the engine is switched back
+    if state['positions'] is not None or state['stats'] is not None:
+        state['positions'] = state['stats'] = None
+        changed = stage_positions(state)
+    
+    if fetched['full_resync'] or state['rewrite']:
+        state['columns'].clear()  # History replaced: the cached arrays cannot be appended to
+    
+    with metrics.timer("stats_compute"):
+        d = get_deal_arrays(fetched['new_deals'], lambda: get_deals(state), cache=state['columns'], total=len(state['deals']))
+        p = get_position_arrays(d, cache=state['columns'])
+        trade_stats = compute_stats_vectorized(d, p, closed_position_index(p, open_pids), fetched['account'].balance, get_point)
+    
+    # Trades rows of the changed positions (or all of them when asked to re-send)
+    rows = closed_position_index(p, open_pids, None if resend else touched)
+    return trade_stats, positions_from_arrays(d, p, rows, state['sltp']), total_lots_vectorized(p), changed
+
+def trade_row(participant, pid, pos) -> dict:
+    """Row of the 'trades' table for a closed position"""
+    return {
+        "participant_id": participant['id'],
+        "symbol": pos.symbol,
+        "type": pos.type,
+        "lot_size": float(pos.lot),
+        "open_price": float(pos.open_price),
+        "close_price": float(pos.close_price),
+        "sl": float(pos.sl),
+        "tp": float(pos.tp),
+        "open_time": datetime.fromtimestamp(pos.open_time - 10800, tz=timezone.utc).isoformat(),
+        "close_time": datetime.fromtimestamp(pos.close_time - 10800, tz=timezone.utc).isoformat(),
+        "profit": float(pos.profit),
+        "position_id": pid
+    }
+
+def write_participant_result(result, writer, snapshot=True):
+    """Supabase side of a participant sync: queue equity snapshot, trades and daily stats rows"""
+    participant = result['participant']
+    account_info = result['account']
+    trade_stats = result['trade_stats']
+    trades_data = result.get('trades_data', [])
+
+    # Next sync of this account depends on how active it is
+    sync_priority.record(participant['id'], result.get('activity'), account_info)
+
+    # Record Equity Snapshot (every 5 minutes)
+    if snapshot and snapshot_scheduler.is_due(participant['id']):
+        snapshot_scheduler.queue(participant['id'], account_info, writer)
+
+    if trade_stats is None:
         return
 
-    print(f"Syncing participants from {csv_file} to Supabase...")
+    # 4. Update Daily Stats in Supabase
+    today = datetime.now(timezone.utc).date().isoformat()
     
-    try:
-        with open(csv_file, mode='r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            participants = list(reader)
-            
-            if not participants:
-                print("No participants found in CSV.")
-                return
-
-            for p in participants:
-                account_id = p['account_id']
-                nickname = p['nickname']
-                
-                # Check if exists
-                res = supabase.table('participants').select("id").eq('account_id', account_id).execute()
-                
-                data = {
-                    "nickname": nickname,
-                    "account_id": account_id,
-                    "investor_password": p['investor_password'],
-                    "server": p['server']
-                }
-                
-                if res.data and len(res.data) > 0:
-                    # Update existing (Use the first one found)
-                    pid = res.data[0]['id']
-                    supabase.table('participants').update(data).eq('id', pid).execute()
-                    
-                    # If duplicates exist, delete them (Cleanup)
-                    if len(res.data) > 1:
-                        print(f"Warning: Found duplicate entries for account {account_id}. Cleaning up...")
-                        for dup in res.data[1:]:
-                            supabase.table('participants').delete().eq('id', dup['id']).execute()
-                else:
-                    # Insert new
-                    supabase.table('participants').insert(data).execute()
-                    print(f"Registered new participant: {nickname}")
-                    
-            print(f"Successfully synced {len(participants)} participants from CSV.")
+    stats_data = {
+        "participant_id": participant['id'],
+        "date": today,
+        "balance": account_info.balance,
+        "equity": account_info.equity,
+        **trade_stats,
+        "floating_pl": round(account_info.equity - account_info.balance, 2),
+        "total_lots": result['total_lots'],
+        "equity_growth_percent": calculate_equity_growth(participant['id'], account_info.equity)
+    }
+    
+    # 5. Update Trades History in Supabase (written in bulk when the cycle flushes)
+    if result.get('resend_rows') and writer.cache is not None:
+        writer.cache.forget(participant['id'])  # Every row goes out, none skipped as unchanged
+    if trades_data:
+        writer.add('trades', trades_data, on_conflict='participant_id,position_id')
+    writer.add('daily_stats', stats_data, on_conflict='participant_id,date')
+    written_participants.add(participant['id'])
+    print(f"Queued {len(trades_data)} trades and stats for {participant['nickname']}")
+
+def queue_backed_off_snapshots(participants, writer):
+    """
+    Equity snapshots of idle accounts not synced this cycle: they are flat
+    (equity = balance), so the account info of their last sync still holds.
+    """
+    for participant in participants:
+        account_info = sync_priority.last_account(participant['id'])
+        if account_info is not None and snapshot_scheduler.is_due(participant['id']):
+            snapshot_scheduler.queue(participant['id'], account_info, writer)
+
+def flush_writes(writer):
+    """
+    Flush the cycle's queued rows, confirm the snapshots that were written and
+    settle the pending resyncs / re-sends of the participants fully written
+    """
+    report = writer.flush()
+    snapshot_scheduler.commit(report.get('equity_snapshots', {}).get('failed', []))
+    failed_trades.extend(report.get('trades', {}).get('failed', []))
+
+    failed = {row['participant_id'] for table in ('trades', 'daily_stats')
+              for row in report.get(table, {}).get('failed', [])}
+    done = written_participants - failed
+    reconciled = done & (pending_resync | pending_resend)
+    if reconciled and writer.cache is not None:
+        writer.cache.mark_reconciled(reconciled)
+    pending_resync.difference_update(done)
+    pending_resend.difference_update(done)
+    written_participants.clear()
+    return report
+
+def sync_options(participant) -> tuple:
+    """(full_resync, resend_rows) owed to a participant"""
+    full_resync = participant['id'] in pending_resync
+    return full_resync, full_resync or participant['id'] in pending_resend
+
+def retry_failed_trades(writer):
+    """Queue the trades rows that failed in an earlier flush (newer rows of the same position win)"""
+    if failed_trades:
+        writer.add('trades', failed_trades, on_conflict='participant_id,position_id')
+        failed_trades.clear()
+
+def sync_participant(participant, full_resync=False):
+    fetched = fetch_participant(participant, full_resync=full_resync)
+    if fetched:
+        writer = BatchWriter(supabase, cache=get_write_cache())
+        retry_failed_trades(writer)
+        snapshot_scheduler.start_cycle()
+        previous_equity_cache.prepare([participant['id']])
+        write_participant_result(compute_participant(fetched), writer)
+        flush_writes(writer)
+
+
+def recompute_participant(participant, writer) -> bool:
+    """
+    Recompute and queue a participant's trades and stats from the local
+    store only (no MT5 calls). Balance/equity are the ones of the last
+    sync; no equity snapshot is written.
+    """
+    state = load_account_state(participant['account_id'])
+    if not state['deals'] or state['account'] is None:
+        print(f"Skipping {participant['nickname']} - No stored history")
+        return False
+    fetched = {
+        "participant": participant,
+        "account": SimpleNamespace(**state['account']),
+        "open_pids": set(state['open_pids']),
+        "state": state,
+        "new_deals": [],
+        "open_changed": set(),
+        "full_resync": True,  # Rebuild positions and the stats accumulator from every stored deal
+        "resend_rows": True,
+        "state_changed": False,
+        "activity": None
+    }
+    write_participant_result(compute_participant(fetched), writer, snapshot=False)
+    return True
+
+
+def recompute_all():
+    """--recompute: rebuild every participant's trades and stats from the local store"""
+    participants = supabase.table('participants').select("*").execute().data
+    writer = BatchWriter(supabase)
+    previous_equity_cache.prepare([p['id'] for p in participants])
+    done = sum(recompute_participant(p, writer) for p in participants if p.get('account_id'))
+    flush_writes(writer)
+    print(f"Recomputed {done}/{len(participants)} participants from the local store")
 
+
+def sync_participants_from_csv():
+    """Apply participants.csv changes (no requests while file and table agree)"""
+    try:
+        participant_sync.sync()
     except Exception as e:
         print(f"Error syncing participants from CSV: {e}")
 
 
-def main():
+def run_cycle(pool=None, full_resync=False):
+    """
+    One sync cycle: load participants, fetch/compute/write the due ones and
+    flush the cycle's rows in bulk. Raises on errors (main() reports them).
+    """
+    response = supabase.table('participants').select("*").execute()
+    participants = response.data
+    participant_sync.observe(participants)
+
+    ready = []
+    for p in participants:
+        if p.get('account_id') and p.get('investor_password') and p.get('server'):
+            ready.append(p)
+        else:
+            print(f"Skipping {p['nickname']} - Missing credentials")
+
+    # A full resync is owed to everyone until each participant was written (across carry-overs)
+    if full_resync:
+        pending_resync.update(p['id'] for p in ready)
+
+    # Periodic reconcile per participant: re-send every row to repair drift
+    write_cache = get_write_cache()
+    reconcile = write_cache.reconcile_due([p['id'] for p in ready]) - pending_resend
+    if reconcile:
+        print(f"🔄 Reconcile: re-sending all trades and daily stats of {len(reconcile)} participants")
+        pending_resend.update(reconcile)
+
+    # Idle accounts are skipped until their backoff runs out (a resync or re-send owed makes them due)
+    due_ids = {p['id'] for p in sync_priority.due(ready)} | pending_resync | pending_resend
+    backed_off = [p for p in ready if p['id'] not in due_ids]
+    ready = [p for p in ready if p['id'] in due_ids]
+
+    # Rows from every participant are collected and upserted in bulk at the end of the cycle
+    writer = BatchWriter(supabase, cache=write_cache)
+    retry_failed_trades(writer)
+    snapshot_scheduler.start_cycle()
+    queue_backed_off_snapshots(backed_off, writer)
+    previous_equity_cache.prepare([p['id'] for p in ready])
+    write = lambda result: write_participant_result(result, writer)
+
+    if pool:
+        # Workers fetch and compute, writes stay in this process
+        results = (result for p, result in pool.run_cycle(cycle_scheduler.take(ready), options=sync_options))
+        run_pipeline(results, None, write, label="Pipeline (workers)")
+    else:
+        # MT5 fetch in this thread, compute and Supabase writes overlap with it
+        fetched = (fetch_participant(p, *sync_options(p)) for p in cycle_scheduler.take(ready))
+        run_pipeline(fetched, compute_participant, write)
+
+    flush_writes(writer)
+
+
+def main(full_resync=False):
     # 0. Sync Participants from CSV first
     sync_participants_from_csv()
 
-    if not init_mt5():
+    # Supervisor mode: one worker process per MT5 terminal
+    pool = None
+    if len(MT5_PATHS) > 1:
+        pool = WorkerPool(MT5_PATHS)
+        pool.start()
+        print(f"Supervisor mode: {len(MT5_PATHS)} MT5 worker terminals")
+    elif not init_mt5(MT5_PATHS[0] if MT5_PATHS else None):
         return
 
+    metrics.serve()
     print(f"Starting Bridge Service... (Sync Interval: {SYNC_INTERVAL}s)")
+    if full_resync:
+        print("Full resync requested: first cycle will re-fetch the entire deal history")
     send_telegram_message(f"🚀 BigLot Bridge Started!\nSync Interval: {SYNC_INTERVAL}s")
 
     while True:
         start_time = time.time()
+        cycle_scheduler.start_cycle()
         print(f"\n--- Sync Cycle Start: {datetime.now().strftime('%H:%M:%S')} ---")
 
         try:
-            response = supabase.table('participants').select("*").execute()
-            participants = response.data
-            
-            for p in participants:
-                if p.get('account_id') and p.get('investor_password') and p.get('server'):
-                    sync_participant(p)
-                else:
-                    print(f"Skipping {p['nickname']} - Missing credentials")
+            run_cycle(pool, full_resync=full_resync)
                     
         except Exception as e:
             error_msg = f"Error in sync cycle: {e}"
             print(error_msg)
             send_telegram_message(f"⚠️ Bridge Error:\n{error_msg}")
 
+        # Full resync is requested once; participants not reached keep it in pending_resync
+        full_resync = False
+
         elapsed = time.time() - start_time
         print(f"--- Sync Cycle Complete in {elapsed:.2f}s ---")
         
@@ -469,14 +611,18 @@ def main():
         # Sync participants
         sync_participants_from_csv()
         
-        print("Sleeping for 60 seconds...")
-        time.sleep(60)
+        # One JSON metrics line per cycle (per-phase, per-table, slowest participants)
+        metrics.end_cycle(cycle_scheduler.end_cycle())
+        cycle_scheduler.wait()
 
     mt5.shutdown()
 
 if __name__ == "__main__":
+    if "--recompute" in sys.argv:
+        recompute_all()
+        sys.exit(0)
     try:
-        main()
+        main(full_resync="--full-resync" in sys.argv)
     except KeyboardInterrupt:
         print("\nStopping Bridge Service...")
         send_telegram_message("🛑 BigLot Bridge Stopped (Manual)")
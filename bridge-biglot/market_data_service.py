@@ -1,13 +1,44 @@
 import time
-import MetaTrader5 as mt5
 from datetime import datetime, timezone, timedelta
-from core import init_mt5, get_supabase_client, load_env, send_telegram_message
+from core import mt5, init_mt5, get_supabase_client, load_env, send_telegram_message
 import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from resample import TIMEFRAME_SECONDS, resample_rates, diff_bars
+from live_bars import LiveBars
+from retention import RetentionScheduler, RetentionJob
 
 # Load environment variables
 load_env()
 
 SYNC_INTERVAL = int(os.getenv("MARKET_DATA_SYNC_INTERVAL", "60"))  # Default 60 seconds
+SERVER_TIME_OFFSET = 10800  # MT5 server time is GMT+3
+MARKET_DATA_MODE = os.getenv("MARKET_DATA_MODE", "native")  # 'native' (one copy per timeframe) or 'resample' (derive from M1)
+MARKET_DATA_VERIFY = os.getenv("MARKET_DATA_VERIFY", "0") == "1"  # Diff resampled bars against native MT5 bars
+MARKET_SYMBOLS = [s.strip() for s in os.getenv("MARKET_SYMBOLS", "XAUUSD").split(",") if s.strip()]  # Always synced
+MARKET_SYMBOLS_AUTO = os.getenv("MARKET_SYMBOLS_AUTO", "1") == "1"  # Add symbols participants trade
+SYMBOL_LOOKBACK_DAYS = int(os.getenv("SYMBOL_LOOKBACK_DAYS", "7"))  # Trades considered for auto symbols
+SYMBOL_REFRESH_MINUTES = int(os.getenv("SYMBOL_REFRESH_MINUTES", "60"))  # How often the symbol list is rebuilt
+MARKET_DATA_WORKERS = int(os.getenv("MARKET_DATA_WORKERS", "4"))  # Threads converting and uploading candles
+MARKET_DATA_STREAM = os.getenv("MARKET_DATA_STREAM", "0") == "1"  # Stream ticks into the forming bars
+STREAM_POLL_MS = int(os.getenv("STREAM_POLL_MS", "250"))  # Tick polling cadence
+STREAM_PUSH_SECONDS = float(os.getenv("STREAM_PUSH_SECONDS", "2"))  # At most one forming-bar upsert per this many seconds
+STREAM_RECONCILE_SECONDS = int(os.getenv("STREAM_RECONCILE_SECONDS", "600"))  # Bar sync that overwrites streamed bars
+STREAM_TICK_BATCH = 5000  # Max ticks copied per symbol per poll
+
+def parse_aliases(value: str) -> dict:
+    """'XAUUSD=XAUUSD.s|GOLD;US30=DJ30' -> {'XAUUSD': ['XAUUSD.s', 'GOLD'], 'US30': ['DJ30']}"""
+    aliases = {}
+    for entry in value.split(";"):
+        if "=" not in entry:
+            continue
+        symbol, names = entry.split("=", 1)
+        aliases[symbol.strip()] = [n.strip() for n in names.split("|") if n.strip()]
+    return aliases
+
+# Normalized symbol -> broker-specific names to try
+SYMBOL_ALIASES = parse_aliases(os.getenv("SYMBOL_ALIASES", "XAUUSD=XAUUSD.s|GOLD"))
+_BROKER_TO_SYMBOL = {name: symbol for symbol, names in SYMBOL_ALIASES.items() for name in names}
 
 # Initialize Supabase client
 supabase = get_supabase_client()
@@ -22,37 +53,126 @@ TIMEFRAMES = {
     'D1': (mt5.TIMEFRAME_D1, None, 365),    # Forever, 1 year of data
 }
 
-def get_symbol():
-    """Try multiple symbol variants and return the first available one"""
-    symbols_to_try = ["XAUUSD", "XAUUSD.s", "GOLD"]
-    for s in symbols_to_try:
+def normalize_symbol(broker_symbol: str) -> str:
+    """Broker symbol -> name stored in market_data (same '.s' cleanup as the dashboard)"""
+    return _BROKER_TO_SYMBOL.get(broker_symbol) or broker_symbol.replace('.s', '')
+
+def get_symbol(symbol: str = "XAUUSD"):
+    """Try the symbol and its broker variants, return the first available one"""
+    symbols_to_try = [symbol, *SYMBOL_ALIASES.get(symbol, []), f"{symbol}.s"]
+    for s in dict.fromkeys(symbols_to_try):
         if mt5.symbol_select(s, True):
             return s
     return None
 
-def sync_timeframe(symbol: str, tf_name: str, mt5_tf: int, count: int):
-    """Sync a specific timeframe to Supabase"""
-    rates = mt5.copy_rates_from_pos(symbol, mt5_tf, 0, count)
-    if rates is None:
-        print(f"  ❌ Failed to copy {tf_name} rates: {mt5.last_error()}")
-        return 0
-    
-    market_data = []
-    for rate in rates:
-        # Convert MT5 server time (UTC+3) to UTC
-        # Convert MT5 server time (UTC+3) to UTC - offset is -10800 seconds
-        dt = datetime.fromtimestamp(rate['time'] - 10800, tz=timezone.utc)
+# Symbol list and broker names, rebuilt every SYMBOL_REFRESH_MINUTES
+_symbols = {"list": list(MARKET_SYMBOLS), "refreshed": 0.0}
+_broker_symbols = {}  # normalized symbol -> broker symbol (None if the broker has none)
+
+def get_market_symbols() -> list:
+    """Configured symbols plus the ones participants trade (favorite_pair / recent trades)"""
+    if not MARKET_SYMBOLS_AUTO or time.time() - _symbols["refreshed"] < SYMBOL_REFRESH_MINUTES * 60:
+        return _symbols["list"]
+    
+    try:
+        # Distinct symbols computed in the database (schema.sql traded_symbols), not paged out of trades
+        since = datetime.now(timezone.utc) - timedelta(days=SYMBOL_LOOKBACK_DAYS)
+        since_day = (datetime.now(timezone.utc) - timedelta(days=1)).date().isoformat()
+        rows = supabase.rpc('traded_symbols', {"since": since.isoformat(), "since_day": since_day}).execute().data or []
+        traded = [row['symbol'] for row in rows]
         
-        market_data.append({
-            "symbol": "XAUUSD",  # Normalized symbol
+        auto = [normalize_symbol(s) for s in traded if s and s != '-']
+        symbols = list(dict.fromkeys(MARKET_SYMBOLS + sorted(set(auto))))
+        if symbols != _symbols["list"]:
+            print(f"  🔎 Market symbols: {', '.join(symbols)}")
+        _symbols["list"] = symbols
+        _broker_symbols.clear()  # Retry symbols the broker did not have
+    except Exception as e:
+        print(f"  ❌ Error refreshing market symbols: {e}")
+    
+    _symbols["refreshed"] = time.time()
+    return _symbols["list"]
+
+def resolve_symbol(symbol: str):
+    """Broker name of a normalized symbol (cached)"""
+    if symbol not in _broker_symbols:
+        _broker_symbols[symbol] = get_symbol(symbol)
+        if _broker_symbols[symbol] is None:
+            print(f"  ⚠️ {symbol}: not available on this broker")
+    return _broker_symbols[symbol]
+
+# (symbol, timeframe) -> open time (server time) of the newest bar already stored.
+# That bar may still have been forming, so it is re-copied on the next cycle.
+_watermarks = {}
+
+def _server_datetime(server_ts: int) -> datetime:
+    """Server timestamp as the datetime the MT5 copy_rates_* functions expect"""
+    return datetime.fromtimestamp(server_ts, tz=timezone.utc)
+
+def rates_to_rows(rates, tf_name: str, symbol: str = "XAUUSD") -> list:
+    """MT5 rates array -> market_data rows (columns converted in bulk, not bar by bar)"""
+    # Convert MT5 server time (UTC+3) to UTC - offset is -10800 seconds
+    times = np.datetime_as_string((rates['time'] - SERVER_TIME_OFFSET).astype('datetime64[s]'), unit='s')
+    
+    return [
+        {
+            "symbol": symbol,  # Normalized symbol
             "timeframe": tf_name,
-            "time": dt.isoformat(),
-            "open": float(rate['open']),
-            "high": float(rate['high']),
-            "low": float(rate['low']),
-            "close": float(rate['close']),
-            "volume": int(rate['tick_volume'])
-        })
+            "time": t + "+00:00",
+            "open": o,
+            "high": h,
+            "low": l,
+            "close": c,
+            "volume": v
+        }
+        for t, o, h, l, c, v in zip(
+            times.tolist(), rates['open'].tolist(), rates['high'].tolist(),
+            rates['low'].tolist(), rates['close'].tolist(), rates['tick_volume'].tolist()
+        )
+    ]
+
+def copy_rates_since(broker_symbol: str, tf_name: str, mt5_tf: int, start: int, count: int):
+    """
+    Bars from server time `start` up to now, copied backwards in windows of
+    `count` bars (the most a single copy is sized for), oldest first.
+    Stops early at an empty window (the terminal history has a hole there).
+    Returns None if a copy fails.
+    """
+    window = TIMEFRAME_SECONDS[tf_name] * count
+    end = int(time.time()) + SERVER_TIME_OFFSET + 86400
+    pages = []
+    while end >= start:
+        page_start = max(start, end - window + 1)
+        page = mt5.copy_rates_range(broker_symbol, mt5_tf, _server_datetime(page_start), _server_datetime(end))
+        if page is None:
+            return None
+        if len(page) == 0:
+            break
+        pages.append(page[page['time'] <= end])
+        end = page_start - 1
+    return np.concatenate(pages[::-1]) if pages else page
+
+def copy_new_rates(symbol: str, broker_symbol: str, tf_name: str, mt5_tf: int, count: int):
+    """
+    Bars since the last stored one (the watermark bar included), however long
+    ago that was: a gap longer than `count` bars (bridge outage) is paged in
+    whole, so the watermark never moves past missing bars.
+    Falls back to the full window of `count` bars on a cold start, or when the
+    terminal history does not continue from the watermark (gap).
+    """
+    watermark = _watermarks.get((symbol, tf_name))
+    if watermark is not None:
+        rates = copy_rates_since(broker_symbol, tf_name, mt5_tf, watermark, count)
+        if rates is not None and len(rates) > 0 and rates[0]['time'] == watermark:
+            return rates
+        stored = datetime.fromtimestamp(watermark - SERVER_TIME_OFFSET, tz=timezone.utc)
+        print(f"  ⚠️ {symbol} {tf_name}: gap after last stored bar {stored.strftime('%Y-%m-%d %H:%M')} UTC, backfilling {count} candles")
+    
+    return mt5.copy_rates_from_pos(broker_symbol, mt5_tf, 0, count)
+
+def upsert_candles(symbol: str, tf_name: str, rates) -> int:
+    """Upsert bars and move the timeframe's watermark to the newest one (thread-safe, no MT5 calls)"""
+    market_data = rates_to_rows(rates, tf_name, symbol)
     
     if market_data:
         try:
@@ -60,53 +180,210 @@ def sync_timeframe(symbol: str, tf_name: str, mt5_tf: int, count: int):
                 market_data, 
                 on_conflict='symbol,time,timeframe'
             ).execute()
+            # Only move the watermark once the bars are stored
+            _watermarks[(symbol, tf_name)] = int(rates[-1]['time'])
             return len(market_data)
         except Exception as e:
-            print(f"  ❌ Error syncing {tf_name}: {e}")
+            print(f"  ❌ Error syncing {symbol} {tf_name}: {e}")
             return 0
     return 0
 
-def cleanup_old_data():
-    """Delete old data based on retention policy"""
-    now = datetime.now(timezone.utc)
+def verify_resampled(symbol: str, broker_symbol: str, tf_name: str, mt5_tf: int, bars):
+    """Compare derived bars with the terminal's own bars for the same range"""
+    native = mt5.copy_rates_range(broker_symbol, mt5_tf, _server_datetime(int(bars[0]['time'])), _server_datetime(int(bars[-1]['time'])))
+    if native is None:
+        print(f"  ❌ Verify {symbol} {tf_name}: failed to copy native rates: {mt5.last_error()}")
+        return
+    diff = diff_bars(bars, native)
+    if diff:
+        print(f"  ⚠️ Verify {symbol} {tf_name}: resampled bars differ from native MT5 bars: {diff}")
+
+def resample_new_rates(symbol: str, broker_symbol: str) -> dict:
+    """
+    New bars of every timeframe from a single M1 copy.
     
-    for tf_name, (_, retention_days, _) in TIMEFRAMES.items():
-        if retention_days is None:
-            continue  # No retention limit
-        
-        cutoff = now - timedelta(days=retention_days)
-        try:
-            result = supabase.table('market_data').delete().eq(
-                'timeframe', tf_name
-            ).lt('time', cutoff.isoformat()).execute()
-            
-            # Check if any rows were deleted
-            if result.data and len(result.data) > 0:
-                print(f"  🗑️ Cleaned up {len(result.data)} old {tf_name} candles")
-        except Exception as e:
-            print(f"  ❌ Error cleaning {tf_name}: {e}")
+    Only timeframes that already have a watermark are derived; the M1 copy
+    starts at the oldest watermark bar, so every forming bucket is complete.
+    Cold start and gaps stay on the native path (history beyond M1 retention).
+    
+    Returns {timeframe: bars} for the timeframes handled here.
+    """
+    derived = [tf_name for tf_name in TIMEFRAMES if (symbol, tf_name) in _watermarks]
+    if not derived:
+        return {}
+    
+    start = min(_watermarks[(symbol, tf_name)] for tf_name in derived)
+    now = int(time.time()) + SERVER_TIME_OFFSET
+    m1 = mt5.copy_rates_range(broker_symbol, mt5.TIMEFRAME_M1, _server_datetime(start), _server_datetime(now + 86400))
+    if m1 is None or len(m1) == 0:
+        return {}
+    
+    resampled = {}
+    for tf_name in derived:
+        watermark = _watermarks[(symbol, tf_name)]
+        bars = resample_rates(m1[m1['time'] >= watermark], TIMEFRAME_SECONDS[tf_name])
+        if len(bars) == 0 or bars[0]['time'] != watermark:
+            continue  # M1 does not cover the watermark bar: let the native path handle it
+        if MARKET_DATA_VERIFY:
+            verify_resampled(symbol, broker_symbol, tf_name, TIMEFRAMES[tf_name][0], bars)
+        resampled[tf_name] = bars
+    return resampled
+
+def copy_symbol_rates(symbol: str, broker_symbol: str) -> list:
+    """All MT5 calls for one symbol: [(timeframe, new bars)]"""
+    resampled = resample_new_rates(symbol, broker_symbol) if MARKET_DATA_MODE == 'resample' else {}
+    
+    batches = []
+    for tf_name, (mt5_tf, _, count) in TIMEFRAMES.items():
+        rates = resampled.get(tf_name)
+        if rates is None:
+            rates = copy_new_rates(symbol, broker_symbol, tf_name, mt5_tf, count)
+        if rates is None:
+            print(f"  ❌ Failed to copy {symbol} {tf_name} rates: {mt5.last_error()}")
+            continue
+        if len(rates) > 0:
+            batches.append((tf_name, rates))
+    return batches
+
+# Throttled, chunked deletion of expired candles (about 60 bars per symbol per chunk)
+market_data_retention = RetentionScheduler(supabase, "market_data", [
+    RetentionJob(f"market_data {tf_name}", "market_data", "time", retention_days,
+                 filters={"timeframe": tf_name}, chunk_hours=TIMEFRAME_SECONDS[tf_name] * 60 / 3600)
+    for tf_name, (_, retention_days, _) in TIMEFRAMES.items()
+    if retention_days is not None  # No retention limit
+])
+
+def cleanup_old_data():
+    """Delete old data based on retention policy (runs on the retention scheduler's cadence)"""
+    market_data_retention.run()
 
 def sync_market_data():
-    """Sync all timeframes for XAUUSD"""
-    symbol = get_symbol()
-    if not symbol:
-        print("❌ Failed to select any gold symbol")
-        return
+    """
+    Sync all timeframes for every market symbol.
+    MT5 calls stay on this thread (the terminal API is not thread-safe);
+    row conversion and uploads run on a thread pool while the next symbol is copied.
+    """
+    start = time.time()
+    symbols = get_market_symbols()
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Syncing {len(symbols)} symbols...")
+    
+    uploads = []  # (symbol, timeframe, future)
+    with ThreadPoolExecutor(max_workers=MARKET_DATA_WORKERS, thread_name_prefix="market-data") as executor:
+        for symbol in symbols:
+            broker_symbol = resolve_symbol(symbol)
+            if not broker_symbol:
+                continue
+            for tf_name, rates in copy_symbol_rates(symbol, broker_symbol):
+                uploads.append((symbol, tf_name, executor.submit(upsert_candles, symbol, tf_name, rates)))
     
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Syncing {symbol}...")
+    synced = {}  # symbol -> {timeframe: candles}
+    for symbol, tf_name, future in uploads:
+        synced.setdefault(symbol, {})[tf_name] = future.result()
     
     total_candles = 0
-    for tf_name, (mt5_tf, _, count) in TIMEFRAMES.items():
-        synced = sync_timeframe(symbol, tf_name, mt5_tf, count)
-        if synced > 0:
-            print(f"  ✅ {tf_name}: {synced} candles")
-            total_candles += synced
+    for symbol, counts in synced.items():
+        print(f"  ✅ {symbol}: " + ", ".join(f"{tf_name} {n}" for tf_name, n in counts.items()))
+        total_candles += sum(counts.values())
     
-    print(f"  📊 Total: {total_candles} candles synced")
+    elapsed = time.time() - start
+    print(f"  📊 Total: {total_candles} candles synced in {elapsed:.2f}s")
+    if elapsed > SYNC_INTERVAL:
+        print(f"  ⚠️ Sync took longer than the {SYNC_INTERVAL}s interval")
     
     # Cleanup old data every sync
     cleanup_old_data()
 
+class TickStreamer:
+    """
+    Streaming mode: forming bars of every symbol/timeframe built from ticks.
+    Changed bars are coalesced per (symbol, timeframe, time) and pushed in one
+    upsert at most every STREAM_PUSH_SECONDS; a closed bar is sent for the
+    last time when the next bar starts.
+    """
+    
+    def __init__(self):
+        self.bars = {}  # symbol -> (broker symbol, LiveBars)
+        self.pending = {}  # (symbol, timeframe, time) -> market_data row
+        self.last_push = 0.0
+    
+    def seed(self, symbols: list):
+        """
+        (Re)start every symbol from the terminal's current bars.
+        The bars are read first and the tick cursor after them, so a tick
+        arriving in between is never counted twice (the seeded bars may
+        already hold it); at worst it is left to the next reconcile.
+        """
+        self.bars = {}
+        for symbol in symbols:
+            broker_symbol = resolve_symbol(symbol)
+            if not broker_symbol:
+                continue
+            live = LiveBars({tf_name: TIMEFRAME_SECONDS[tf_name] for tf_name in TIMEFRAMES})
+            last_bar_time = 0
+            for tf_name, (mt5_tf, _, _) in TIMEFRAMES.items():
+                rates = mt5.copy_rates_from_pos(broker_symbol, mt5_tf, 0, 1)
+                if rates is not None and len(rates) > 0:
+                    live.seed(tf_name, rates[-1])
+                    last_bar_time = max(last_bar_time, int(rates[-1]['time']))
+            # Only ticks strictly after the seeded bars (and never before the newest bar opened)
+            tick = mt5.symbol_info_tick(broker_symbol)
+            live.seed_ticks_from(max(tick.time_msc if tick else 0, last_bar_time * 1000))
+            self.bars[symbol] = (broker_symbol, live)
+    
+    def poll(self) -> int:
+        """Apply new ticks of every symbol; returns the number of ticks applied"""
+        applied = 0
+        for symbol, (broker_symbol, live) in self.bars.items():
+            tick = mt5.symbol_info_tick(broker_symbol)
+            if tick is None or tick.time_msc <= live.last_msc:
+                continue  # Nothing new
+            ticks = mt5.copy_ticks_from(broker_symbol, _server_datetime(live.last_msc // 1000), STREAM_TICK_BATCH, mt5.COPY_TICKS_ALL)
+            applied += live.add_ticks(ticks)
+            for tf_name, bars in live.take_updates().items():
+                for row in rates_to_rows(bars, tf_name, symbol):
+                    self.pending[(symbol, tf_name, row['time'])] = row
+        return applied
+    
+    def push(self) -> int:
+        """Upsert the changed bars (kept for the next push if the request fails)"""
+        self.last_push = time.time()
+        if not self.pending:
+            return 0
+        rows = list(self.pending.values())
+        try:
+            supabase.table('market_data').upsert(rows, on_conflict='symbol,time,timeframe').execute()
+            self.pending = {}
+            return len(rows)
+        except Exception as e:
+            print(f"  ❌ Error pushing live bars: {e}")
+            return 0
+
+def stream_market_data():
+    """Streaming loop: tick polling plus a bar sync every STREAM_RECONCILE_SECONDS"""
+    streamer = TickStreamer()
+    next_reconcile = 0.0
+    pushed = 0
+    
+    while True:
+        try:
+            if time.time() >= next_reconcile:
+                streamer.push()  # Streamed bars must not overwrite the reconciled ones
+                print(f"  📡 Pushed {pushed} live bar updates since the last reconcile")
+                pushed = 0
+                sync_market_data()
+                streamer.seed(get_market_symbols())
+                next_reconcile = time.time() + STREAM_RECONCILE_SECONDS
+            
+            streamer.poll()
+            if time.time() - streamer.last_push >= STREAM_PUSH_SECONDS:
+                pushed += streamer.push()
+        except Exception as e:
+            print(f"❌ Critical Error: {e}")
+            send_telegram_message(f"⚠️ Market Data Service Error:\n{e}")
+            time.sleep(SYNC_INTERVAL)
+        
+        time.sleep(STREAM_POLL_MS / 1000)
+
 def main():
     if not init_mt5():
         return
@@ -114,12 +391,19 @@ def main():
     print(f"🚀 Market Data Service Started!")
     print(f"   Sync Interval: {SYNC_INTERVAL}s")
     print(f"   Timeframes: {', '.join(TIMEFRAMES.keys())}")
+    print(f"   Symbols: {', '.join(MARKET_SYMBOLS)}{' + traded symbols' if MARKET_SYMBOLS_AUTO else ''}")
+    print(f"   Mode: {MARKET_DATA_MODE}{' (verify)' if MARKET_DATA_VERIFY else ''}")
+    if MARKET_DATA_STREAM:
+        print(f"   Streaming: ticks every {STREAM_POLL_MS}ms, push every {STREAM_PUSH_SECONDS}s, reconcile every {STREAM_RECONCILE_SECONDS}s")
     send_telegram_message(
         f"🚀 Market Data Service Started!\n"
         f"Sync Interval: {SYNC_INTERVAL}s\n"
         f"Timeframes: {', '.join(TIMEFRAMES.keys())}"
     )
     
+    if MARKET_DATA_STREAM:
+        stream_market_data()
+    
     while True:
         try:
             sync_market_data()
@@ -0,0 +1,334 @@
+"""
+Bridge Metrics - hot-path timings per cycle, per participant and per table
+
+Features:
+- Timers around MT5 calls (login, history_deals_get, history_orders_get,
+  symbol_info...), stats compute, every Supabase request and Telegram sends
+- Cumulative histograms per phase (and per Supabase table/method) and per
+  participant and phase, served as Prometheus text on
+  http://127.0.0.1:METRICS_PORT/metrics (0 = no endpoint)
+- One JSON log line per cycle (METRICS_LOG=1): count, total, p50/p95/max per
+  phase and table, and the slowest participants of that cycle with their
+  time per phase
+- Thread-safe: the pipeline fetches, computes and writes on different
+  threads; the participant a thread works on labels its MT5 and compute time
+- WorkerPool workers capture their timings per task and send them back with
+  the result; the supervisor merges them into its registry
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Prometheus endpoint on 127.0.0.1, 0 = off
+METRICS_LOG = os.getenv("METRICS_LOG", "1") == "1"  # JSON metrics line per cycle
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+MAX_CYCLE_SAMPLES = 10000  # Per phase/table per cycle, bounds memory if end_cycle() is never called
+TOP_PARTICIPANTS = 10  # Slowest participants in the cycle log line
+
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative latency histogram (Prometheus buckets, sum and count)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+def _summary(samples: list) -> dict:
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        "count": n,
+        "total": round(sum(samples), 4),
+        "p50": round(samples[(n - 1) // 2], 4),
+        "p95": round(samples[min(n - 1, int(n * 0.95))], 4),
+        "max": round(samples[-1], 4),
+    }
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Registry:
+    """Cumulative metrics (for the endpoint) and the current cycle's samples (for the log line)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = {}  # phase -> Histogram
+        self.requests = {}  # (table, method) -> Histogram
+        self.request_errors = {}  # (table, method) -> count
+        self.participant_phases = {}  # (participant, phase) -> Histogram
+        self.cycles = Histogram()
+        self.last_cycle = {}
+        self.cycle_phases = {}  # phase -> [seconds]
+        self.cycle_tables = {}  # "method table" -> [seconds]
+        self.cycle_participants = {}  # participant -> {phase: seconds}
+        self.cycle_errors = 0
+
+    @staticmethod
+    def _sample(samples: dict, key, seconds: float):
+        bucket = samples.setdefault(key, [])
+        if len(bucket) < MAX_CYCLE_SAMPLES:
+            bucket.append(seconds)
+
+    def observe(self, phase: str, seconds: float, participant: str = None):
+        """Record one timed call of a phase (participant defaults to the thread's current one)"""
+        participant = participant or getattr(_local, 'participant', None)
+        captured = getattr(_local, 'captured', None)
+        if captured is not None:
+            captured.append((phase, seconds, participant))
+            return
+        with self.lock:
+            self.phases.setdefault(phase, Histogram()).observe(seconds)
+            self._sample(self.cycle_phases, phase, seconds)
+            if participant:
+                self.participant_phases.setdefault((participant, phase), Histogram()).observe(seconds)
+                cycle = self.cycle_participants.setdefault(participant, {})
+                cycle[phase] = cycle.get(phase, 0.0) + seconds
+
+    def merge(self, timings: list):
+        """Record the (phase, seconds, participant) timings captured in another process"""
+        for phase, seconds, participant in timings:
+            self.observe(phase, seconds, participant)
+
+    def observe_request(self, table: str, method: str, seconds: float, failed: bool = False):
+        """Record one Supabase (PostgREST) request"""
+        key = (table, method)
+        with self.lock:
+            self.requests.setdefault(key, Histogram()).observe(seconds)
+            self._sample(self.cycle_tables, f"{method} {table}", seconds)
+            if failed:
+                self.request_errors[key] = self.request_errors.get(key, 0) + 1
+                self.cycle_errors += 1
+
+    @contextlib.contextmanager
+    def timer(self, phase: str, participant: str = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start, participant)
+
+    def end_cycle(self, report: dict = None) -> dict:
+        """Close the cycle: summarize its samples (JSON log line) and start a new one"""
+        report = dict(report or {})
+        with self.lock:
+            phases, self.cycle_phases = self.cycle_phases, {}
+            tables, self.cycle_tables = self.cycle_tables, {}
+            participants, self.cycle_participants = self.cycle_participants, {}
+            errors, self.cycle_errors = self.cycle_errors, 0
+            if 'elapsed' in report:
+                self.cycles.observe(report['elapsed'])
+            self.last_cycle = report
+
+        totals = {p: sum(phases_of.values()) for p, phases_of in participants.items()}
+        slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:TOP_PARTICIPANTS]
+        line = {
+            "event": "cycle_metrics",
+            "time": round(time.time(), 3),
+            **{k: round(v, 4) if isinstance(v, float) else v for k, v in report.items()},
+            "phases": {name: _summary(samples) for name, samples in sorted(phases.items())},
+            "supabase": {name: _summary(samples) for name, samples in sorted(tables.items())},
+            "supabase_errors": errors,
+            "slowest_participants": [
+                {"participant": p, "seconds": round(s, 4),
+                 "phases": {phase: round(v, 4) for phase, v in sorted(participants[p].items())}}
+                for p, s in slowest
+            ],
+        }
+        if METRICS_LOG:
+            print(json.dumps(line, separators=(',', ':')))
+        return line
+
+    def render(self) -> str:
+        """Prometheus text exposition of the cumulative metrics"""
+        out = []
+
+        def histogram(name: str, help_text: str, series: list):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} histogram")
+            for labels, hist in series:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), hist.counts):
+                    cumulative += count
+                    out.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+                out.append(f"{name}_sum{_labels(labels)} {hist.sum:.6f}")
+                out.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+        def counter(name: str, help_text: str, series: list):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} counter")
+            for labels, value in series:
+                out.append(f"{name}{_labels(labels)} {value}")
+
+        with self.lock:
+            histogram("bridge_phase_seconds", "Time per call of a bridge phase (MT5 calls, stats compute, Telegram)",
+                      [({"phase": p}, h) for p, h in sorted(self.phases.items())])
+            histogram("bridge_supabase_request_seconds", "Supabase (PostgREST) request time per table and method",
+                      [({"table": t, "method": m}, h) for (t, m), h in sorted(self.requests.items())])
+            counter("bridge_supabase_request_errors_total", "Failed Supabase requests (transport errors and 4xx/5xx)",
+                    [({"table": t, "method": m}, n) for (t, m), n in sorted(self.request_errors.items())])
+            histogram("bridge_participant_phase_seconds", "Time per call of a phase, per participant",
+                      [({"participant": p, "phase": ph}, h) for (p, ph), h in sorted(self.participant_phases.items())])
+            histogram("bridge_cycle_seconds", "Sync cycle duration", [({}, self.cycles)] if self.cycles.count else [])
+            for key in ('lag', 'synced', 'total', 'carried_over', 'skipped_slots'):
+                if key in self.last_cycle:
+                    out.append(f"# TYPE bridge_last_cycle_{key} gauge")
+                    out.append(f"bridge_last_cycle_{key} {self.last_cycle[key]}")
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+observe = registry.observe
+timer = registry.timer
+end_cycle = registry.end_cycle
+merge = registry.merge
+
+
+@contextlib.contextmanager
+def capture():
+    """Collect this thread's timings in a list of (phase, seconds, participant) instead of the registry"""
+    previous = getattr(_local, 'captured', None)
+    _local.captured = []
+    try:
+        yield _local.captured
+    finally:
+        _local.captured = previous
+
+
+@contextlib.contextmanager
+def participant(name: str):
+    """Label this thread's timings with a participant until the block ends"""
+    previous = getattr(_local, 'participant', None)
+    _local.participant = name
+    try:
+        yield
+    finally:
+        _local.participant = previous
+
+
+def by_participant(name_of):
+    """Decorator: label the timings inside a call with name_of(*args, **kwargs)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with participant(name_of(*args, **kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _TimedModule:
+    """Proxy for the MT5 module that times the listed API functions (everything else passes through)"""
+
+    def __init__(self, module, functions):
+        self._module = module
+        self._timed = {}
+        for name in functions:
+            if callable(getattr(module, name, None)):
+                self._timed[name] = self._wrap(name, getattr(module, name))
+
+    @staticmethod
+    def _wrap(name: str, fn):
+        phase = f"mt5_{name}"
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(phase, time.perf_counter() - start)
+        return timed
+
+    def __getattr__(self, name: str):
+        timed = self._timed.get(name)
+        return timed if timed is not None else getattr(self._module, name)
+
+
+def instrument_module(module, functions):
+    """MT5 module whose hot-path functions are timed per call"""
+    return _TimedModule(module, functions)
+
+
+def instrument_http(session):
+    """
+    Time every request of an httpx client (the Supabase client's PostgREST
+    session), labelled with the table from the /rest/v1/<table> path.
+    Includes reading the response body.
+    """
+    send = session.send
+
+    def timed_send(request, *args, **kwargs):
+        table = urlsplit(str(request.url)).path.rstrip('/').rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = send(request, *args, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            registry.observe_request(table, request.method, time.perf_counter() - start, failed)
+
+    session.send = timed_send
+    return session
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Scraped every few seconds, not worth a log line
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        payload = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(port: int = METRICS_PORT, host: str = '127.0.0.1'):
+    """Start the Prometheus endpoint in a background thread (no-op when port is 0)"""
+    if not port:
+        return None
+    try:
+        httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Metrics: http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
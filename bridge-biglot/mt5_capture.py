@@ -0,0 +1,216 @@
+"""
+MT5 Capture - record real terminal sessions and replay them on Linux
+
+Use as MT5_MODULE=mt5_capture:
+- MT5_CAPTURE=record: every call goes to the real module (MT5_CAPTURE_TARGET,
+  default MetaTrader5) and its result is recorded
+- MT5_CAPTURE=replay: calls are answered from the recording, so
+  sync_participant / sync_market_data run the same code paths on
+  production-shaped data (partial closes, balance deals, SL/TP on orders)
+
+On-disk format (MT5_CAPTURE_DIR, default "capture"):
+- arrays.npz: one NumPy structured array per distinct result (deal, order
+  and position tuples become record arrays, rates and ticks are stored as
+  returned); identical results are stored once
+- index.json: module constants and the call log (function, key arguments,
+  account, result reference, seconds the call took)
+
+Replay matches calls on (account, function, key arguments); time-dependent
+arguments such as date ranges are not part of the key. Repeated calls get
+the recorded results in order, then the last one again.
+MT5_REPLAY_SPEED=1 sleeps for the recorded call times (0 = no delay).
+"""
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import importlib
+from collections import namedtuple
+import numpy as np
+
+MODE = os.getenv("MT5_CAPTURE", "replay")  # 'record' or 'replay'
+CAPTURE_DIR = os.getenv("MT5_CAPTURE_DIR", "capture")
+TARGET = os.getenv("MT5_CAPTURE_TARGET", "MetaTrader5")  # Module recorded in record mode
+REPLAY_SPEED = float(os.getenv("MT5_REPLAY_SPEED", "0"))  # 1 = recorded call latency, 0 = none
+
+# Arguments that identify a call (positional index or keyword); the rest
+# (date ranges, tick start times) changes from run to run
+KEY_ARGS = {
+    'login': (0, 'login'),
+    'symbol_info': (0, 'symbol'),
+    'symbol_select': (0, 'symbol'),
+    'symbol_info_tick': (0, 'symbol'),
+    'copy_rates_from_pos': (0, 'symbol', 1, 'timeframe', 2, 'start_pos', 3, 'count'),
+    'copy_rates_from': (0, 'symbol', 1, 'timeframe', 3, 'count'),
+    'copy_rates_range': (0, 'symbol', 1, 'timeframe'),
+    'copy_ticks_from': (0, 'symbol', 2, 'count'),
+    'copy_ticks_range': (0, 'symbol'),
+    'positions_get': ('symbol', 'ticket', 'group'),
+    'history_orders_get': ('ticket', 'position', 'group'),
+    'history_deals_get': ('ticket', 'position', 'group'),
+}
+# Calls whose results depend on the logged-in account
+ACCOUNT_FUNCTIONS = {
+    'account_info', 'positions_get', 'positions_total', 'orders_get', 'orders_total',
+    'history_deals_get', 'history_deals_total', 'history_orders_get', 'history_orders_total',
+}
+# Answers for calls missing from a recording
+REPLAY_DEFAULTS = {'initialize': True, 'shutdown': None, 'last_error': [1, 'Success']}
+
+_login = None  # Account of the current session (keys account-bound calls)
+
+
+def _call_key(name: str, args: tuple, kwargs: dict) -> str:
+    spec = KEY_ARGS.get(name, ())
+    key = []
+    for part in spec:
+        if isinstance(part, int):
+            if part < len(args):
+                key.append(args[part])
+        elif part in kwargs:
+            key.append([part, kwargs[part]])
+    account = _login if name in ACCOUNT_FUNCTIONS else None
+    return json.dumps([account, name, key], default=str)
+
+
+def _to_records(items: list):
+    """Tuple of MT5 records (namedtuple-likes) -> structured array"""
+    # Records of one call can differ in optional fields (e.g. sl/tp on deals); missing ones become 0
+    fields = list(dict.fromkeys(f for item in items for f in item._asdict()))
+    columns = [np.array([getattr(item, f, 0) for item in items]) for f in fields]
+    return np.rec.fromarrays(columns, names=fields).view(np.ndarray)
+
+
+class _Recorder:
+    def __init__(self):
+        self.target = importlib.import_module(TARGET)
+        self.calls = []
+        self.arrays = {}  # name -> array
+        self._hashes = {}  # content hash -> array name
+        self.dirty = False
+        atexit.register(self.save)
+
+    def _store(self, array) -> str:
+        digest = hashlib.md5(str(array.dtype.descr).encode() + array.tobytes()).hexdigest()
+        if digest not in self._hashes:
+            name = f"a{len(self.arrays)}"
+            self.arrays[name] = array
+            self._hashes[digest] = name
+        return self._hashes[digest]
+
+    def encode(self, value) -> dict:
+        if isinstance(value, np.ndarray):
+            return {"kind": "array", "ref": self._store(value)}
+        if hasattr(value, '_asdict'):
+            return {"kind": "record", "type": type(value).__name__, "ref": self._store(_to_records([value]))}
+        if isinstance(value, (tuple, list)) and value and all(hasattr(v, '_asdict') for v in value):
+            return {"kind": "records", "type": type(value[0]).__name__, "ref": self._store(_to_records(list(value)))}
+        if isinstance(value, tuple):
+            return {"kind": "tuple", "value": [v for v in value]}
+        return {"kind": "json", "value": value}
+
+    def call(self, name: str, fn, args, kwargs):
+        global _login
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        key = _call_key(name, args, kwargs)
+        if name == 'login' and result:
+            _login = str(args[0] if args else kwargs.get('login'))
+        try:
+            entry = self.encode(result)
+        except Exception as e:
+            print(f"⚠️ mt5_capture: could not record {name} ({e}), replay returns None")
+            entry = {"kind": "json", "value": None}
+        self.calls.append({"key": key, "seconds": round(seconds, 6), **entry})
+        self.dirty = True
+        return result
+
+    def constants(self) -> dict:
+        return {name: getattr(self.target, name) for name in dir(self.target)
+                if name.isupper() and isinstance(getattr(self.target, name), (int, float, str))}
+
+    def save(self):
+        """Write the recording (also runs at exit)"""
+        if not self.dirty:
+            return
+        os.makedirs(CAPTURE_DIR, exist_ok=True)
+        np.savez_compressed(os.path.join(CAPTURE_DIR, "arrays.npz"), **self.arrays)
+        with open(os.path.join(CAPTURE_DIR, "index.json"), 'w', encoding='utf-8') as f:
+            json.dump({"target": TARGET, "constants": self.constants(), "calls": self.calls}, f, separators=(',', ':'), default=str)
+        self.dirty = False
+        print(f"💾 mt5_capture: {len(self.calls)} calls, {len(self.arrays)} arrays saved to {CAPTURE_DIR}")
+
+
+class _Player:
+    def __init__(self):
+        with open(os.path.join(CAPTURE_DIR, "index.json"), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.arrays = np.load(os.path.join(CAPTURE_DIR, "arrays.npz"))
+        self.constants = index["constants"]
+        self.by_key = {}  # key -> recorded calls, in order
+        for entry in index["calls"]:
+            self.by_key.setdefault(entry["key"], []).append(entry)
+        self.position = {}  # key -> next entry index
+        self._types = {}
+        self.misses = 0
+
+    def _record_type(self, name: str, fields: tuple):
+        if (name, fields) not in self._types:
+            self._types[(name, fields)] = namedtuple(name, fields)
+        return self._types[(name, fields)]
+
+    def decode(self, entry: dict):
+        kind = entry["kind"]
+        if kind == "json":
+            return entry["value"]
+        if kind == "tuple":
+            return tuple(entry["value"])
+        array = self.arrays[entry["ref"]]
+        if kind == "array":
+            return array.copy()
+        record = self._record_type(entry["type"], array.dtype.names)
+        rows = [record(*row) for row in array.tolist()]
+        return rows[0] if kind == "record" else tuple(rows)
+
+    def call(self, name: str, args, kwargs):
+        global _login
+        key = _call_key(name, args, kwargs)
+        entries = self.by_key.get(key)
+        if not entries:
+            self.misses += 1
+            return REPLAY_DEFAULTS.get(name)
+        i = self.position.get(key, 0)
+        self.position[key] = min(i + 1, len(entries) - 1)
+        entry = entries[i]
+        if REPLAY_SPEED > 0:
+            time.sleep(entry["seconds"] * REPLAY_SPEED)
+        result = self.decode(entry)
+        if name == 'login' and result:
+            _login = str(args[0] if args else kwargs.get('login'))
+        return result
+
+
+_backend = _Recorder() if MODE == 'record' else _Player()
+
+
+def save():
+    """Write the recording now (record mode)"""
+    if isinstance(_backend, _Recorder):
+        _backend.save()
+
+
+def __getattr__(name: str):
+    """Module constants and API functions, recorded or replayed"""
+    if isinstance(_backend, _Recorder):
+        attr = getattr(_backend.target, name)
+        if not callable(attr):
+            return attr
+        return lambda *args, **kwargs: _backend.call(name, attr, args, kwargs)
+    if name in _backend.constants:
+        return _backend.constants[name]
+    if name.startswith('__'):
+        raise AttributeError(name)
+    return lambda *args, **kwargs: _backend.call(name, args, kwargs)
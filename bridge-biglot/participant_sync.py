@@ -0,0 +1,118 @@
+"""
+Participant CSV Sync - change-aware participants.csv -> participants table
+
+Features:
+- The CSV is only re-read when its mtime/size changes, and only re-parsed
+  when its content hash changes
+- Rows are diffed in memory against a cached snapshot of the participants
+  table (loaded once, kept current from the sync cycle's own select), so an
+  unchanged file costs no requests at all
+- Changed and new rows go out in one bulk upsert on account_id, like
+  import_participants.py
+- Duplicate entries of an account are removed with one batched delete
+"""
+
+import os
+import csv
+import hashlib
+from core import select_all
+
+CSV_FIELDS = ('nickname', 'account_id', 'investor_password', 'server')
+IN_FILTER_CHUNK = 100  # Ids per in_() filter (keeps the URL short)
+
+
+def read_participants_csv(path: str) -> dict:
+    """Valid CSV rows keyed by account_id (a later row for the same account wins)"""
+    rows = {}
+    with open(path, mode='r', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            # Basic validation
+            if not (row.get('nickname') or '').strip() or not (row.get('account_id') or '').strip():
+                print(f"Skipping invalid row: {row}")
+                continue
+            data = {field: (row.get(field) or '').strip() for field in CSV_FIELDS}
+            rows[data['account_id']] = data
+    return rows
+
+
+class ParticipantCsvSync:
+    """Keeps the participants table in line with participants.csv"""
+
+    def __init__(self, supabase, path: str = 'participants.csv'):
+        self.supabase = supabase
+        self.path = path
+        self.file_stat = None  # (mtime_ns, size) of the last read
+        self.file_hash = None
+        self.wanted = {}  # account_id -> CSV row
+        self.table = None  # account_id -> [participants rows], oldest first
+
+    def observe(self, participants: list):
+        """Refresh the table snapshot from a full participants select done elsewhere"""
+        table = {}
+        for row in sorted(participants, key=lambda r: r.get('created_at') or ''):
+            if row.get('account_id'):
+                table.setdefault(str(row['account_id']), []).append(row)
+        self.table = table
+
+    def _load_table(self):
+        self.observe(select_all(lambda: self.supabase.table('participants')
+                                .select('id, nickname, account_id, investor_password, server, created_at')
+                                .order('created_at')))
+
+    def _read_if_changed(self) -> bool:
+        """Re-read the CSV if it changed on disk. Returns False if it is missing."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        file_stat = (stat.st_mtime_ns, stat.st_size)
+        if file_stat == self.file_stat:
+            return True
+
+        with open(self.path, 'rb') as f:
+            file_hash = hashlib.md5(f.read()).hexdigest()
+        if file_hash != self.file_hash:
+            self.wanted = read_participants_csv(self.path)
+            self.file_hash = file_hash
+            print(f"📄 {self.path} changed: {len(self.wanted)} participants")
+        self.file_stat = file_stat
+        return True
+
+    def diff(self):
+        """(rows to upsert, duplicate ids to delete) between the CSV and the table snapshot"""
+        upserts, duplicates = [], []
+        for account_id, wanted in self.wanted.items():
+            existing = self.table.get(account_id, [])
+            if not existing or any(str(existing[0].get(field) or '') != wanted[field] for field in CSV_FIELDS):
+                upserts.append(wanted)
+            duplicates += [row['id'] for row in existing[1:]]
+        return upserts, duplicates
+
+    def sync(self) -> int:
+        """Apply CSV changes. Returns the number of participants written."""
+        if not self._read_if_changed():
+            print(f"Warning: {self.path} not found. Skipping CSV sync.")
+            return 0
+        if self.table is None:
+            self._load_table()
+
+        upserts, duplicates = self.diff()
+
+        if duplicates:
+            print(f"Warning: Found {len(duplicates)} duplicate participant entries. Cleaning up...")
+            for i in range(0, len(duplicates), IN_FILTER_CHUNK):
+                self.supabase.table('participants').delete().in_('id', duplicates[i:i + IN_FILTER_CHUNK]).execute()
+            gone = set(duplicates)
+            self.table = {account_id: [row for row in rows if row['id'] not in gone] for account_id, rows in self.table.items()}
+
+        if upserts:
+            new = [row['nickname'] for row in upserts if not self.table.get(row['account_id'])]
+            response = self.supabase.table('participants').upsert(upserts, on_conflict='account_id').execute()
+            returned = {str(row['account_id']): row for row in response.data or []}
+            for row in upserts:
+                rows = self.table.setdefault(row['account_id'], [])
+                rows[:1] = [{**(rows[0] if rows else {}), **row, **returned.get(row['account_id'], {})}]
+            for nickname in new:
+                print(f"Registered new participant: {nickname}")
+            print(f"Synced {len(upserts)} changed participants from CSV in one upsert")
+        return len(upserts)
@@ -0,0 +1,136 @@
+"""
+Sync Pipeline - overlap MT5 fetches with stats compute and Supabase writes
+
+Features:
+- Fetch stage runs in the calling thread (the MT5 session is not shared)
+- Compute stage runs in its own thread
+- Write stage runs on a bounded thread pool (network I/O)
+- Bounded queues between stages; time spent blocked on a full queue is
+  reported as backpressure, together with per-stage busy time
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core import load_env
+
+# Load environment variables
+load_env()
+
+# Configuration
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))  # Items buffered between two stages
+WRITE_WORKERS = int(os.getenv("WRITE_WORKERS", "4"))  # Threads doing Supabase writes
+
+_DONE = object()
+
+
+class StageStats:
+    """Busy and blocked time of one stage (thread-safe)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, busy: float = 0.0, blocked: float = 0.0, items: int = 0):
+        with self._lock:
+            self.busy += busy
+            self.blocked += blocked
+            self.items += items
+
+    def __str__(self):
+        return f"{self.name} {self.busy:.2f}s/{self.items}"
+
+
+def _timed_put(q, item, stats: StageStats):
+    start = time.perf_counter()
+    q.put(item)
+    stats.add(blocked=time.perf_counter() - start)
+
+
+def run_pipeline(items, compute, write, label: str = "Pipeline"):
+    """
+    Run items through compute and write.
+
+    Args:
+        items: iterable consumed in this thread (the fetch stage; may be a
+               generator doing MT5 calls). None items are skipped.
+        compute: callable item -> result, or None to pass items through
+        write: callable result -> None, run on the write thread pool
+    """
+    fetch_stats = StageStats("fetch")
+    compute_stats = StageStats("compute")
+    write_stats = StageStats("write")
+    compute_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    write_slots = threading.BoundedSemaphore(WRITE_WORKERS + PIPELINE_QUEUE_SIZE)
+    wall_start = time.perf_counter()
+
+    def run_write(result):
+        start = time.perf_counter()
+        try:
+            write(result)
+        except Exception as e:
+            print(f"❌ Write stage error: {e}")
+        finally:
+            write_stats.add(busy=time.perf_counter() - start, items=1)
+            write_slots.release()
+
+    def compute_loop(executor):
+        while True:
+            item = compute_queue.get()
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                result = compute(item) if compute else item
+            except Exception as e:
+                print(f"❌ Compute stage error: {e}")
+                result = None
+            compute_stats.add(busy=time.perf_counter() - start, items=1)
+            if result is None:
+                continue
+
+            # Backpressure: wait for a free write slot
+            start = time.perf_counter()
+            write_slots.acquire()
+            compute_stats.add(blocked=time.perf_counter() - start)
+            executor.submit(run_write, result)
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS, thread_name_prefix="supabase-write") as executor:
+        compute_thread = threading.Thread(target=compute_loop, args=(executor,), name="compute", daemon=True)
+        compute_thread.start()
+
+        # A failing fetch still lets compute/write finish what was already fetched, then re-raises
+        try:
+            iterator = iter(items)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                fetch_stats.add(busy=time.perf_counter() - start, items=1)
+                if item is not None:
+                    _timed_put(compute_queue, item, fetch_stats)
+        finally:
+            _timed_put(compute_queue, _DONE, fetch_stats)
+            compute_thread.join()
+
+    wall = time.perf_counter() - wall_start
+    print(
+        f"⏱️ {label}: wall {wall:.2f}s | {fetch_stats} | {compute_stats} | "
+        f"{write_stats} ({WRITE_WORKERS} threads) | "
+        f"backpressure: fetch waited {fetch_stats.blocked:.2f}s, compute waited {compute_stats.blocked:.2f}s"
+    )
+    return {
+        "wall": wall,
+        "fetch": fetch_stats.busy,
+        "compute": compute_stats.busy,
+        "write": write_stats.busy,
+        "fetch_blocked": fetch_stats.blocked,
+        "compute_blocked": compute_stats.blocked,
+    }
@@ -0,0 +1,64 @@
+"""
+OHLC Resampling - derive higher timeframes from M1 bars
+
+Features:
+- Works directly on the NumPy structured array returned by copy_rates_*
+- Buckets on the bar open time, which is broker server time, so D1 and H4
+  boundaries match the terminal's own bars
+- diff_bars() compares derived bars against native MT5 bars (verify mode)
+"""
+
+import numpy as np
+
+TIMEFRAME_SECONDS = {
+    'M1': 60,
+    'M5': 300,
+    'M15': 900,
+    'H1': 3600,
+    'H4': 14400,
+    'D1': 86400,
+}
+
+COMPARED_FIELDS = ('open', 'high', 'low', 'close', 'tick_volume')
+
+
+def resample_rates(rates, seconds: int):
+    """
+    Aggregate bars into `seconds`-long buckets.
+    Open of the first bar, close of the last one, high/low extremes and
+    summed volumes; the result has the same dtype as the input.
+    """
+    if seconds == 60 or len(rates) == 0:
+        return rates
+
+    buckets = rates['time'] // seconds * seconds
+    first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    last = np.r_[first[1:], len(rates)] - 1
+
+    bars = np.zeros(len(first), dtype=rates.dtype)
+    bars['time'] = buckets[first]
+    bars['open'] = rates['open'][first]
+    bars['close'] = rates['close'][last]
+    bars['high'] = np.maximum.reduceat(rates['high'], first)
+    bars['low'] = np.minimum.reduceat(rates['low'], first)
+    bars['tick_volume'] = np.add.reduceat(rates['tick_volume'], first)
+    if 'real_volume' in rates.dtype.names:
+        bars['real_volume'] = np.add.reduceat(rates['real_volume'], first)
+    if 'spread' in rates.dtype.names:
+        bars['spread'] = np.minimum.reduceat(rates['spread'], first)
+    return bars
+
+
+def diff_bars(derived, native) -> dict:
+    """
+    Compare derived bars with native ones on their common open times.
+    Returns {field: mismatching bar count}, plus bars missing on either side.
+    """
+    common, d_idx, n_idx = np.intersect1d(derived['time'], native['time'], return_indices=True)
+    diff = {
+        field: int(np.count_nonzero(derived[field][d_idx] != native[field][n_idx]))
+        for field in COMPARED_FIELDS
+    }
+    diff['only_derived'] = len(derived) - len(common)
+    diff['only_native'] = len(native) - len(common)
+    return {key: count for key, count in diff.items() if count}
@@ -0,0 +1,157 @@
+"""
+Retention Scheduler - throttled, chunked deletes of expired rows
+
+Features:
+- Runs on its own cadence (RETENTION_INTERVAL_MINUTES), not every sync cycle
+- Deletes in bounded time-range chunks, oldest first, so a backlog after an
+  outage never turns into one huge statement
+- Per-run time budget; when it runs out, the next sync cycle continues
+  where this run stopped instead of waiting for the next interval
+- Progress (cleaned-up-to time, rows removed, time spent) is kept in a
+  state file and reported after every run
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from postgrest.types import CountMethod, ReturnMethod
+from core import load_env
+from sync_state import STATE_DIR
+
+# Load environment variables
+load_env()
+
+# Configuration
+RETENTION_INTERVAL_MINUTES = int(os.getenv("RETENTION_INTERVAL_MINUTES", "60"))  # Minutes between two runs
+RETENTION_CHUNK_HOURS = float(os.getenv("RETENTION_CHUNK_HOURS", "1"))  # Time range deleted per request
+RETENTION_BUDGET_SECONDS = float(os.getenv("RETENTION_BUDGET_SECONDS", "20"))  # Max time spent per run
+
+
+class RetentionJob:
+    """
+    Rows of `table` whose `column` is older than `days` (optionally filtered by eq()).
+    not_after: optional callable returning a time rows must also be older than
+    (e.g. how far a rollup got); a None result skips the job.
+    """
+
+    def __init__(self, name: str, table: str, column: str, days: int, filters: dict = None,
+                 chunk_hours: float = None, not_after=None):
+        self.name = name
+        self.table = table
+        self.column = column
+        self.days = days
+        self.filters = filters or {}
+        self.chunk = timedelta(hours=chunk_hours or RETENTION_CHUNK_HOURS)
+        self.not_after = not_after
+
+    def cutoff(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.days)
+        if self.not_after is None:
+            return cutoff
+        limit = self.not_after()
+        return min(cutoff, limit) if limit is not None else None
+
+    def filtered(self, builder):
+        for column, value in self.filters.items():
+            builder = builder.eq(column, value)
+        return builder
+
+
+class RetentionScheduler:
+    """Runs a set of retention jobs, at most every RETENTION_INTERVAL_MINUTES"""
+
+    def __init__(self, supabase, name: str, jobs: list):
+        self.supabase = supabase
+        self.name = name
+        self.jobs = jobs
+        self.state_path = os.path.join(STATE_DIR, f"retention_{name}.json")
+        self.state = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"last_run": 0, "jobs": {}}
+        except Exception as e:
+            print(f"⚠️ Could not load retention state ({e}), starting fresh")
+            return {"last_run": 0, "jobs": {}}
+
+    def _save(self):
+        os.makedirs(STATE_DIR, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=1)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            print(f"❌ Error saving retention state: {e}")
+
+    def due(self) -> bool:
+        return time.time() - self.state["last_run"] >= RETENTION_INTERVAL_MINUTES * 60
+
+    def _oldest(self, job: RetentionJob):
+        """Time of the oldest row of the job (None if the table part is empty)"""
+        response = job.filtered(self.supabase.table(job.table).select(job.column)) \
+            .order(job.column) \
+            .limit(1) \
+            .execute()
+        if not response.data:
+            return None
+        return datetime.fromisoformat(response.data[0][job.column].replace('Z', '+00:00'))
+
+    def _delete_range(self, job: RetentionJob, start: datetime, end: datetime) -> int:
+        response = job.filtered(self.supabase.table(job.table).delete(count=CountMethod.exact, returning=ReturnMethod.minimal)) \
+            .gte(job.column, start.isoformat()) \
+            .lt(job.column, end.isoformat()) \
+            .execute()
+        return response.count or 0
+
+    def run(self, force: bool = False) -> dict:
+        """Run the jobs if due. Returns {job name: rows removed}."""
+        if not force and not self.due():
+            return {}
+
+        run_start = time.time()
+        deadline = run_start + RETENTION_BUDGET_SECONDS
+        removed = {}
+        budget_hit = False
+        for job in self.jobs:
+            progress = self.state["jobs"].setdefault(job.name, {"done_until": None, "rows_removed": 0, "seconds": 0.0})
+            job_start = time.time()
+            cutoff = job.cutoff()
+            if cutoff is None:
+                continue
+            rows, chunks = 0, 0
+            try:
+                # Start at the oldest row, so rows that re-appear behind the
+                # progress mark (e.g. a candle backfill) are still removed
+                start = self._oldest(job)
+                while start is not None and start < cutoff and time.time() < deadline:
+                    end = min(start + job.chunk, cutoff)
+                    rows += self._delete_range(job, start, end)
+                    chunks += 1
+                    progress["done_until"] = end.isoformat()
+                    start = end
+                if start is None or start >= cutoff:
+                    progress["done_until"] = cutoff.isoformat()
+                else:
+                    budget_hit = True
+            except Exception as e:
+                print(f"❌ Retention {job.name}: {e}")
+
+            elapsed = time.time() - job_start
+            progress["rows_removed"] += rows
+            progress["seconds"] = round(progress["seconds"] + elapsed, 3)
+            removed[job.name] = rows
+            if chunks:
+                behind = f", budget used up, resumes at {progress['done_until']}" if budget_hit else ""
+                print(f"🗑️ Retention {job.name}: removed {rows} rows older than {cutoff.strftime('%Y-%m-%d %H:%M')} in {chunks} chunks ({elapsed:.2f}s{behind})")
+
+        if not budget_hit:
+            self.state["last_run"] = time.time()
+        self._save()
+        total = sum(removed.values())
+        print(f"🗑️ Retention ({self.name}): {total} rows removed in {time.time() - run_start:.2f}s")
+        return removed
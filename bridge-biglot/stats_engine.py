@@ -0,0 +1,436 @@
+"""
+Stats Engine - leaderboard statistics from closed positions
+
+Features:
+- StatsAccumulator: running totals over closed positions, fed in close-time order
+- Serializable, so it can be kept in the account sync state between cycles
+- compute_stats(): full recompute from scratch (reference for verification)
+- Position: compact slotted record per position; exit deals are reduced to
+  volume and price*volume sums instead of being kept
+- aggregate_positions(): folds deals into Positions; a cycle re-folds and
+  feeds only the positions touched since the last one
+"""
+
+import os
+from datetime import datetime
+from core import load_env
+
+# Load environment variables
+load_env()
+
+# Configuration
+STATS_ENGINE = os.getenv("STATS_ENGINE", "incremental")  # 'incremental', 'vectorized' or 'loop' (full recompute every cycle)
+STATS_VERIFY = os.getenv("STATS_VERIFY", "0") == "1"  # Compare incremental stats against a full recompute
+SERVER_TIME_OFFSET = 10800  # MT5 server time is GMT+3
+
+# MT5 deal constants (fixed values of the MetaTrader5 API)
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_TYPE_BUY = 0
+
+# Session windows by open hour (UTC); they overlap on purpose
+SESSIONS = {
+    'asian': (0, 8),
+    'london': (7, 16),
+    'newyork': (12, 21),
+}
+
+
+def format_duration(seconds):
+    m, s = divmod(seconds, 60)
+    h, m = divmod(m, 60)
+    d, h = divmod(h, 24)
+    if d > 0: return f"{int(d)}d {int(h)}h"
+    if h > 0: return f"{int(h)}h {int(m)}m"
+    return f"{int(m)}m {int(s)}s"
+
+
+class Position:
+    """
+    One position aggregated from its deals (aggregate_positions).
+    Shared by the stats, the trades rows and the lot totals, and kept in the
+    local store between cycles.
+    """
+
+    __slots__ = (
+        'symbol', 'type', 'lot', 'volume_out', 'exit_value', 'open_time', 'close_time',
+        'open_price', 'close_price', 'profit', 'sl', 'tp',
+    )
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.type = 'UNKNOWN'
+        self.lot = 0
+        self.volume_out = 0
+        self.exit_value = 0  # Sum of price * volume over the exit deals
+        self.open_time = 0
+        self.close_time = 0
+        self.open_price = 0
+        self.close_price = 0
+        self.profit = 0
+        self.sl = 0
+        self.tp = 0
+
+    @classmethod
+    def from_fields(cls, values) -> "Position":
+        """Position from its field values (in __slots__ order, as stored)"""
+        pos = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            setattr(pos, name, value)
+        return pos
+
+    def fields(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def add_exit(self, deal):
+        self.close_time = deal.time
+        self.close_price = deal.price
+        self.profit += deal.profit
+        self.volume_out += deal.volume
+        self.exit_value += deal.price * deal.volume
+
+
+def aggregate_positions(deals, sltp: dict, positions: dict = None) -> dict:
+    """
+    Fold deals (in execution order) into Position records.
+
+    Every position that appears in deals is rebuilt from those deals alone,
+    so pass all deals of a position. Positions are added to / replaced in
+    `positions` when given (others are left as they are) and returned.
+
+    Args:
+        deals: Deal records (sync_state)
+        sltp: position_id -> (sl, tp) resolved from the history orders
+        positions: position_id -> Position to update, or None for a new dict
+    """
+    folded = {}
+    for deal in deals:
+        pos = folded.get(deal.position_id)
+        if pos is None:
+            pos = folded[deal.position_id] = Position(deal.symbol)
+
+        if deal.entry == DEAL_ENTRY_IN:
+            pos.open_time = deal.time
+            pos.open_price = deal.price
+            pos.lot += deal.volume
+
+            # SL/TP from the deal, or as resolved from the orders
+            sl, tp = deal.sl, deal.tp
+            if (sl == 0.0 or tp == 0.0) and deal.order > 0:
+                sl, tp = sltp.get(deal.position_id, (sl, tp))
+            pos.sl = sl
+            pos.tp = tp
+            pos.type = 'BUY' if deal.type == DEAL_TYPE_BUY else 'SELL'
+
+        elif deal.entry == DEAL_ENTRY_OUT:
+            # Exit deals are reduced to sums (no deal objects kept per position)
+            pos.add_exit(deal)
+
+    if positions is None:
+        return folded
+    positions.update(folded)
+    return positions
+
+
+def position_points(pos: Position, point: float) -> float:
+    """Points of a position, weighted by the volume of each exit deal"""
+    move = pos.exit_value - pos.open_price * pos.volume_out
+    if pos.type != 'BUY':
+        move = -move
+    return move / point / pos.lot
+
+
+class StatsAccumulator:
+    """
+    Running trade statistics.
+
+    Positions must be added in close-time order; add() is O(1) so a cycle
+    only pays for the positions that closed since the last one.
+    """
+
+    def __init__(self):
+        self.total_trades = 0
+        self.total_profit = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0
+        self.gross_loss = 0
+        self.best_trade = None
+        self.worst_trade = None
+        self.buy_trades = 0
+        self.buy_wins = 0
+        self.sell_trades = 0
+        self.sell_wins = 0
+        self.total_points = 0
+
+        # Balance curve for Max DD
+        self.current_profit_curve = 0
+        self.peak_profit = None
+        self.max_drawdown_val = 0
+
+        self.sessions = {name: {'profit': 0, 'wins': 0, 'total': 0} for name in SESSIONS}
+
+        self.total_duration = 0
+        self.duration_count = 0
+        self.win_duration = 0
+        self.win_duration_count = 0
+        self.loss_duration = 0
+        self.loss_duration_count = 0
+
+        self.current_consecutive_wins = 0
+        self.current_consecutive_losses = 0
+        self.max_consecutive_wins = 0
+        self.max_consecutive_losses = 0
+
+        self.symbol_counts = {}  # symbol -> deal count (insertion order breaks ties)
+        self.position_ids = set()  # Counted positions, stored apart from to_dict (sync_state)
+        self.new_position_ids = []  # Counted since the last save
+        self.replace_position_ids = True  # Stored ids are stale (new or rebuilt accumulator)
+        self.last_close_time = None
+        self.last_position_id = None  # Breaks close-time ties (see closed_positions)
+
+    def add_symbols(self, symbols):
+        for sym in symbols:
+            if sym:
+                self.symbol_counts[sym] = self.symbol_counts.get(sym, 0) + 1
+
+    def add(self, pid, pos: Position, points: float = 0):
+        """Absorb one fully closed position"""
+        profit = pos.profit
+
+        self.total_trades += 1
+        self.total_profit += profit
+
+        if profit > 0:
+            self.wins += 1
+            self.gross_profit += profit
+        elif profit < 0:
+            self.losses += 1
+            self.gross_loss += abs(profit)
+
+        if self.best_trade is None or profit > self.best_trade: self.best_trade = profit
+        if self.worst_trade is None or profit < self.worst_trade: self.worst_trade = profit
+
+        if pos.type == 'BUY':
+            self.buy_trades += 1
+            if profit > 0: self.buy_wins += 1
+        elif pos.type == 'SELL':
+            self.sell_trades += 1
+            if profit > 0: self.sell_wins += 1
+
+        self.total_points += points
+
+        # DD Calculation
+        self.current_profit_curve += profit
+        if self.peak_profit is None or self.current_profit_curve > self.peak_profit:
+            self.peak_profit = self.current_profit_curve
+        dd = self.peak_profit - self.current_profit_curve
+        if dd > self.max_drawdown_val: self.max_drawdown_val = dd
+
+        # Session Stats (server time GMT+3 -> UTC)
+        open_hour = datetime.utcfromtimestamp(pos.open_time - SERVER_TIME_OFFSET).hour
+        for name, (start, end) in SESSIONS.items():
+            if start <= open_hour < end:
+                self.sessions[name]['profit'] += profit
+                self.sessions[name]['total'] += 1
+                if profit > 0: self.sessions[name]['wins'] += 1
+
+        # Duration Stats
+        duration = pos.close_time - pos.open_time
+        if duration >= 0:
+            self.total_duration += duration
+            self.duration_count += 1
+            if profit > 0:
+                self.win_duration += duration
+                self.win_duration_count += 1
+            elif profit < 0:
+                self.loss_duration += duration
+                self.loss_duration_count += 1
+
+        # Consecutive Stats (break-even trades do not break a streak)
+        if profit > 0:
+            self.current_consecutive_wins += 1
+            self.current_consecutive_losses = 0
+            if self.current_consecutive_wins > self.max_consecutive_wins: self.max_consecutive_wins = self.current_consecutive_wins
+        elif profit < 0:
+            self.current_consecutive_losses += 1
+            self.current_consecutive_wins = 0
+            if self.current_consecutive_losses > self.max_consecutive_losses: self.max_consecutive_losses = self.current_consecutive_losses
+
+        self.position_ids.add(pid)
+        self.new_position_ids.append(pid)
+        self.last_close_time = pos.close_time
+        self.last_position_id = pid
+
+    def stats(self, balance: float) -> dict:
+        """Stats fields of the daily_stats row"""
+        win_rate = (self.wins / self.total_trades * 100) if self.total_trades > 0 else 0
+        win_rate_buy = (self.buy_wins / self.buy_trades * 100) if self.buy_trades > 0 else 0
+        win_rate_sell = (self.sell_wins / self.sell_trades * 100) if self.sell_trades > 0 else 0
+
+        gross_profit, gross_loss = self.gross_profit, self.gross_loss
+        profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else (gross_profit if gross_profit > 0 else 0)
+
+        # Max DD %
+        start_balance = balance - self.total_profit
+        peak_balance = start_balance + self.peak_profit if self.peak_profit is not None else 0
+        max_dd_percent = (self.max_drawdown_val / peak_balance * 100) if peak_balance > 0 else 0
+
+        # Avg Win / Loss
+        avg_win = (gross_profit / self.wins) if self.wins > 0 else 0
+        avg_loss = -(gross_loss / self.losses) if self.losses > 0 else 0
+        rr_ratio = abs(avg_win / avg_loss) if avg_loss != 0 else 0
+
+        # Holding Time Strings
+        avg_holding_time_str = format_duration(self.total_duration / self.duration_count) if self.duration_count > 0 else "0m"
+        avg_holding_time_win_str = format_duration(self.win_duration / self.win_duration_count) if self.win_duration_count > 0 else "0m"
+        avg_holding_time_loss_str = format_duration(self.loss_duration / self.loss_duration_count) if self.loss_duration_count > 0 else "0m"
+
+        # Trading Style
+        avg_holding_minutes = (self.total_duration / self.duration_count / 60) if self.duration_count > 0 else 0
+        if self.duration_count == 0: trading_style = "Unknown"
+        elif avg_holding_minutes < 30: trading_style = "Scalping"
+        elif avg_holding_minutes < 1440: trading_style = "Intraday"
+        else: trading_style = "Swing"
+
+        # Favorite Pair (first symbol seen wins a tie, like Counter.most_common)
+        favorite_pair = "-"
+        best_count = 0
+        for sym, count in self.symbol_counts.items():
+            if count > best_count:
+                favorite_pair, best_count = sym, count
+
+        def session_win_rate(name):
+            s = self.sessions[name]
+            return round((s['wins'] / s['total'] * 100), 2) if s['total'] > 0 else 0
+
+        return {
+            "profit": self.total_profit,
+            "points": int(self.total_points),
+            "win_rate": win_rate,
+            "total_trades": self.total_trades,
+            "profit_factor": round(profit_factor, 2),
+            "rr_ratio": round(rr_ratio, 2),
+            "max_drawdown": round(max_dd_percent, 2),
+            "avg_win": round(avg_win, 2),
+            "avg_loss": round(avg_loss, 2),
+            "trading_style": trading_style,
+            "favorite_pair": favorite_pair,
+            "avg_holding_time": avg_holding_time_str,
+            "best_trade": float(self.best_trade) if self.best_trade is not None else 0,
+            "worst_trade": float(self.worst_trade) if self.worst_trade is not None else 0,
+            "win_rate_buy": round(win_rate_buy, 2),
+            "win_rate_sell": round(win_rate_sell, 2),
+            "avg_holding_time_win": avg_holding_time_win_str,
+            "avg_holding_time_loss": avg_holding_time_loss_str,
+            "max_consecutive_wins": self.max_consecutive_wins,
+            "max_consecutive_losses": self.max_consecutive_losses,
+            "session_asian_profit": round(self.sessions['asian']['profit'], 2),
+            "session_london_profit": round(self.sessions['london']['profit'], 2),
+            "session_newyork_profit": round(self.sessions['newyork']['profit'], 2),
+            "session_asian_win_rate": session_win_rate('asian'),
+            "session_london_win_rate": session_win_rate('london'),
+            "session_newyork_win_rate": session_win_rate('newyork'),
+        }
+
+    def to_dict(self) -> dict:
+        """Scalar aggregates only: the counted position ids are saved incrementally by the caller"""
+        return {key: value for key, value in self.__dict__.items() if key not in _POSITION_ID_FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict, position_ids=()) -> "StatsAccumulator":
+        acc = cls()
+        for key, value in data.items():
+            if hasattr(acc, key) and key not in _POSITION_ID_FIELDS:
+                setattr(acc, key, value)
+        acc.position_ids = set(position_ids)
+        acc.replace_position_ids = False
+        return acc
+
+
+_POSITION_ID_FIELDS = ('position_ids', 'new_position_ids', 'replace_position_ids')
+
+
+def closed_positions(positions: dict, open_pids, pids=None) -> list:
+    """
+    Fully closed position ids (not open any more and some volume out) in
+    close-time order, ties by position id. Only the given pids are
+    considered when pids is not None.
+    """
+    if pids is not None:
+        pids = [pid for pid in pids if pid in positions]
+    closed = [pid for pid in (positions if pids is None else pids)
+              if pid not in open_pids and positions[pid].volume_out > 0]
+    closed.sort(key=lambda pid: (positions[pid].close_time, pid))
+    return closed
+
+
+def compute_stats(positions: dict, closed_pids: list, symbols: list, balance: float, get_point) -> dict:
+    """
+    Full recompute over every closed position.
+
+    Args:
+        positions: position_id -> Position (aggregate_positions)
+        closed_pids: fully closed position ids (closed_positions)
+        symbols: symbol of every deal (for the favorite pair)
+        balance: current account balance
+        get_point: callable symbol -> point size (0 if unknown)
+    """
+    acc = StatsAccumulator()
+    acc.add_symbols(symbols)
+    for pid in closed_pids:
+        pos = positions[pid]
+        acc.add(pid, pos, _points_for(pos, get_point))
+    return acc.stats(balance)
+
+
+def update_accumulator(acc: StatsAccumulator, positions: dict, open_pids, touched, new_deals: list,
+                       all_deals, get_point, rebuild: bool = False) -> bool:
+    """
+    Feed the positions closed since the last cycle into the accumulator.
+
+    Only the touched positions (new deals, new SL/TP, open status changed)
+    are looked at. Falls back to a rebuild from every position when something
+    arrives out of order (a position closing before the last absorbed one,
+    or a late deal on a position that was already counted).
+
+    Args:
+        touched: position ids that may have changed since the last cycle
+        new_deals: deals added since the last cycle
+        all_deals: callable returning every deal (symbol counts of a rebuild)
+
+    Returns True if the accumulator changed.
+    """
+    fresh = [pid for pid in closed_positions(positions, open_pids, touched) if pid not in acc.position_ids]
+    if not rebuild:
+        if any(deal.position_id in acc.position_ids for deal in new_deals):
+            rebuild = True
+        elif fresh and acc.last_close_time is not None:
+            first = (positions[fresh[0]].close_time, fresh[0])
+            rebuild = first < (acc.last_close_time, acc.last_position_id or 0)
+
+    if rebuild:
+        acc.__init__()
+        acc.add_symbols(deal.symbol for deal in all_deals())
+        fresh = closed_positions(positions, open_pids)
+    else:
+        acc.add_symbols(deal.symbol for deal in new_deals)
+
+    for pid in fresh:
+        pos = positions[pid]
+        acc.add(pid, pos, _points_for(pos, get_point))
+
+    return rebuild or bool(fresh) or bool(new_deals)
+
+
+def _points_for(pos: Position, get_point) -> float:
+    if pos.open_price > 0 and pos.symbol:
+        point = get_point(pos.symbol)
+        if point > 0:
+            return position_points(pos, point)
+    return 0
+
+
+def diff_stats(expected: dict, actual: dict) -> list:
+    """Keys whose values differ between two stats dicts"""
+    return [key for key in expected if expected[key] != actual.get(key)]
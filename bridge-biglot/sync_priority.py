@@ -0,0 +1,92 @@
+"""
+Sync Priority - activity-based sync rates per account
+
+Features:
+- Active accounts (open positions, floating P/L, a new deal, or a deal in
+  the last IDLE_AFTER_MINUTES) are synced every cycle
+- Idle accounts back off exponentially: 2, 4, 8... sync intervals between
+  syncs, capped at MAX_STALENESS_MINUTES (guaranteed maximum staleness)
+- Any sign of activity resets the backoff; accounts that were never synced
+  (or failed) are always due, and so is every account on its first cycle
+  of a new UTC day (so the new day's daily_stats row gets written)
+- The account info of the last sync is kept: backed-off accounts are flat
+  (equity = balance), so it still serves their equity snapshots
+- Signals come from the regular fetch (positions_get, account info, new
+  deals), so deciding costs no extra MT5 or Supabase calls
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from core import load_env
+from stats_engine import SERVER_TIME_OFFSET
+
+# Load environment variables
+load_env()
+
+# Configuration
+PRIORITY_SCHEDULING = os.getenv("PRIORITY_SCHEDULING", "1") == "1"  # 0 = sync every account every cycle
+IDLE_AFTER_MINUTES = float(os.getenv("IDLE_AFTER_MINUTES", "60"))  # No positions and no deal for this long = idle
+MAX_STALENESS_MINUTES = float(os.getenv("MAX_STALENESS_MINUTES", "30"))  # Idle accounts are still synced at least this often
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class SyncPriority:
+    """Next due time per participant, from the activity seen at its last sync"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.accounts = {}  # participant id -> {"next_due", "idle_streak", "active", "day", "account"}
+
+    def is_active(self, activity: dict, account_info, now: float = None) -> bool:
+        now = now or time.time()
+        if activity.get('open_positions') or activity.get('new_deals'):
+            return True
+        if account_info is not None and round(account_info.equity - account_info.balance, 2) != 0:
+            return True
+        last_deal = activity.get('last_deal_time')  # Server time
+        return last_deal is not None and now - (last_deal - SERVER_TIME_OFFSET) < IDLE_AFTER_MINUTES * 60
+
+    def record(self, participant_id: str, activity: dict, account_info):
+        """Schedule the next sync of a participant that was just synced"""
+        if activity is None:
+            return  # Unknown: stays due
+        now = time.time()
+        entry = self.accounts.setdefault(participant_id, {"next_due": 0.0, "idle_streak": 0, "active": True})
+        entry["active"] = self.is_active(activity, account_info, now)
+        entry["day"] = _utc_day()
+        entry["account"] = account_info
+        if entry["active"]:
+            entry["idle_streak"] = 0
+            entry["next_due"] = now
+        else:
+            entry["idle_streak"] += 1
+            delay = min(self.interval * 2 ** entry["idle_streak"], MAX_STALENESS_MINUTES * 60)
+            entry["next_due"] = now + delay
+
+    def due(self, participants: list) -> list:
+        """Participants to sync this cycle (all of them if priority scheduling is off)"""
+        if not PRIORITY_SCHEDULING:
+            return participants
+        # Half an interval of slack, so a due time a moment after the cycle start is not pushed a whole cycle
+        horizon = time.time() + self.interval / 2
+        today = _utc_day()
+        due, active, backed_off = [], 0, 0
+        for participant in participants:
+            entry = self.accounts.get(participant['id'])
+            if entry is None or entry["next_due"] <= horizon or entry["day"] != today:
+                due.append(participant)
+                active += bool(entry and entry["active"])
+            else:
+                backed_off += 1
+        if backed_off:
+            print(f"🎯 Sync priorities: {len(due)} due ({active} active), {backed_off} idle accounts backed off")
+        return due
+
+    def last_account(self, participant_id: str):
+        """Account info of the participant's last sync (None if never synced)"""
+        entry = self.accounts.get(participant_id)
+        return entry["account"] if entry else None
@@ -0,0 +1,411 @@
+"""
+Per-account Sync State - local deal/position store (SQLite)
+
+Features:
+- Every deal pulled from MT5 is appended to an on-disk SQLite database
+  (STATE_DB, WAL mode) holding raw deals, resolved closed positions and
+  per-account sync state, so a restart is warm: no full history re-pull
+- Resolved positions (open and closed) are loaded back with the state, so
+  a cycle only re-aggregates the positions its new deals touch
+- Tracks a watermark (time/ticket of the newest processed deal)
+- Lets sync_participant fetch only deals after the watermark,
+  minus a small overlap window so late deals are not missed
+- Stores the account's StatsAccumulator so stats survive restarts: scalar
+  aggregates as JSON, counted position ids as rows added only for the
+  positions counted since the last save
+- Caches resolved SL/TP per position and symbol points, so the terminal
+  is asked only once
+- Keeps the last account info and open positions, so stats can be
+  recomputed from the store without the terminal (main.py --recompute)
+- Saves write only what changed since the last save (new deals, touched
+  positions, new SL/TP and points)
+- Also holds the row hashes of the last Supabase writes and the last
+  reconcile of every participant (write_cache)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
+from core import load_env
+from stats_engine import StatsAccumulator, Position
+
+# Load environment variables
+load_env()
+
+# Configuration
+STATE_DIR = os.getenv("STATE_DIR", "state")  # Local folder for the sync state
+STATE_DB = os.getenv("STATE_DB", os.path.join(STATE_DIR, "bridge.db"))  # SQLite deal/position store
+DEAL_OVERLAP_SECONDS = int(os.getenv("DEAL_OVERLAP_SECONDS", "3600"))  # Re-fetch 1 hour before the watermark
+SYNC_MODE = os.getenv("SYNC_MODE", "incremental")  # 'incremental' or 'full' (full history every cycle)
+HISTORY_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Only the deal fields the bridge actually uses are kept
+DEAL_FIELDS = (
+    'ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'position_id',
+    'volume', 'price', 'profit', 'commission', 'swap', 'symbol', 'sl', 'tp'
+)
+Deal = namedtuple('Deal', DEAL_FIELDS)
+
+# Resolved position columns (stats_engine.Position fields)
+POSITION_FIELDS = Position.__slots__
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    watermark_time INTEGER,
+    watermark_ticket INTEGER,
+    stats TEXT,
+    account TEXT,
+    open_positions TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS deals (
+    account_id TEXT NOT NULL,
+    {", ".join(f'"{f}"' for f in DEAL_FIELDS)},
+    PRIMARY KEY (account_id, ticket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS deals_by_time ON deals (account_id, time_msc, ticket);
+CREATE INDEX IF NOT EXISTS deals_by_position ON deals (account_id, position_id);
+CREATE TABLE IF NOT EXISTS positions (
+    account_id TEXT NOT NULL,
+    position_id INTEGER NOT NULL,
+    {", ".join(POSITION_FIELDS)},
+    PRIMARY KEY (account_id, position_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counted_positions (
+    account_id TEXT NOT NULL,
+    position_id INTEGER NOT NULL,
+    PRIMARY KEY (account_id, position_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sltp (
+    account_id TEXT NOT NULL,
+    position_id INTEGER NOT NULL,
+    sl REAL,
+    tp REAL,
+    PRIMARY KEY (account_id, position_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS points (
+    account_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    point REAL,
+    PRIMARY KEY (account_id, symbol)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS write_hashes (
+    table_name TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (table_name, row_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS reconciled (
+    participant_id TEXT PRIMARY KEY,
+    time REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# account_id -> state dict (kept in memory between cycles)
+_states = {}
+
+# One connection per process, shared by the pipeline threads
+_db_lock = threading.RLock()
+_db = None
+_db_pid = None
+
+
+class _TrackedDict(dict):
+    """dict that remembers the keys set since the last save"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.dirty = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.dirty.add(key)
+
+
+def _connect() -> sqlite3.Connection:
+    """Open (once per process) the store in WAL mode and create the schema"""
+    global _db, _db_pid
+    if _db is None or _db_pid != os.getpid():
+        directory = os.path.dirname(STATE_DB)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _db = sqlite3.connect(STATE_DB, timeout=30, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: durable across process crashes
+        _db.executescript(_SCHEMA)
+        _db_pid = os.getpid()
+    return _db
+
+
+@contextlib.contextmanager
+def transaction():
+    """The store's connection for one transaction (other threads wait)"""
+    with _db_lock:
+        db = _connect()
+        with db:
+            yield db
+
+
+def _new_state() -> dict:
+    return {
+        "watermark_time": None,
+        "watermark_ticket": None,
+        "deals": {},  # ticket -> Deal
+        "stats": StatsAccumulator(),  # None when it must be rebuilt from the positions
+        "sltp": _TrackedDict(),  # position_id -> (sl, tp) resolved from history orders
+        "points": _TrackedDict(),  # symbol -> point size
+        "columns": {},  # deal and position arrays of the vectorized engine (memory only)
+        "account": None,  # Last account info {balance, equity, margin_level}
+        "open_pids": [],  # Open position ids at the last sync
+        "positions": {},  # position_id -> Position, None when it must be rebuilt from the deals
+        "pending_deals": [],  # Deals not written to the store yet
+        "pending_positions": set(),  # position ids whose Position is not written yet
+        "rewrite": False,  # Replace the account's deals/positions on the next save (full resync)
+        "rewrite_positions": False,  # Replace the account's positions on the next save
+    }
+
+
+def to_deal(mt5_deal) -> Deal:
+    """Convert an MT5 TradeDeal into the compact Deal record"""
+    return Deal(
+        ticket=int(mt5_deal.ticket),
+        order=int(getattr(mt5_deal, 'order', 0)),
+        time=int(mt5_deal.time),
+        time_msc=int(getattr(mt5_deal, 'time_msc', mt5_deal.time * 1000)),
+        type=int(mt5_deal.type),
+        entry=int(mt5_deal.entry),
+        position_id=int(mt5_deal.position_id),
+        volume=float(mt5_deal.volume),
+        price=float(mt5_deal.price),
+        profit=float(mt5_deal.profit),
+        commission=float(getattr(mt5_deal, 'commission', 0.0)),
+        swap=float(getattr(mt5_deal, 'swap', 0.0)),
+        symbol=mt5_deal.symbol or "",
+        sl=float(getattr(mt5_deal, 'sl', 0.0)),
+        tp=float(getattr(mt5_deal, 'tp', 0.0)),
+    )
+
+
+def _read_state(account_id: str):
+    """State of an account from the store, or None if it has never been saved"""
+    with _db_lock:
+        db = _connect()
+        row = db.execute(
+            "SELECT watermark_time, watermark_ticket, stats, account, open_positions FROM accounts WHERE account_id = ?",
+            (account_id,)).fetchone()
+        if row is None:
+            return None
+        state = _new_state()
+        state["watermark_time"], state["watermark_ticket"] = row[0], row[1]
+        stats = json.loads(row[2]) if row[2] else None
+        if stats is None or 'position_ids' in stats:  # Ids still in the JSON (older store): rebuilt once
+            state["stats"] = None
+        else:
+            state["stats"] = StatsAccumulator.from_dict(stats, [r[0] for r in db.execute(
+                "SELECT position_id FROM counted_positions WHERE account_id = ?", (account_id,))])
+        state["account"] = json.loads(row[3]) if row[3] else None
+        state["open_pids"] = json.loads(row[4]) if row[4] else []
+        columns = ", ".join(f'"{f}"' for f in DEAL_FIELDS)
+        state["deals"] = {r[0]: Deal(*r) for r in db.execute(
+            f"SELECT {columns} FROM deals WHERE account_id = ? ORDER BY time_msc, ticket", (account_id,))}
+        state["sltp"] = _TrackedDict({r[0]: (r[1], r[2]) for r in db.execute(
+            "SELECT position_id, sl, tp FROM sltp WHERE account_id = ?", (account_id,))})
+        state["points"] = _TrackedDict({r[0]: r[1] for r in db.execute(
+            "SELECT symbol, point FROM points WHERE account_id = ?", (account_id,))})
+        state["positions"] = {r[0]: Position.from_fields(r[1:]) for r in db.execute(
+            f"SELECT position_id, {', '.join(POSITION_FIELDS)} FROM positions WHERE account_id = ?", (account_id,))}
+    if state["deals"] and not state["positions"]:
+        state["positions"] = None  # Not stored (vectorized engine): rebuilt from the deals when needed
+    return state
+
+
+def load_account_state(account_id) -> dict:
+    """
+    Return the sync state for an account.
+    Loaded from the store the first time, then served from memory.
+    """
+    account_id = str(account_id)
+    if account_id in _states:
+        return _states[account_id]
+
+    try:
+        state = _read_state(account_id)
+    except Exception as e:
+        print(f"⚠️ Could not read sync state for {account_id}, starting fresh: {e}")
+        state = None
+
+    _states[account_id] = state or _new_state()
+    return _states[account_id]
+
+
+def stored_accounts() -> list:
+    """Account ids that have a saved state"""
+    with _db_lock:
+        return [row[0] for row in _connect().execute("SELECT account_id FROM accounts")]
+
+
+def record_account(state: dict, account, open_pids) -> set:
+    """
+    Remember the account info and open positions of this sync (used to
+    recompute without the terminal). Returns the position ids that were
+    opened or closed since the last sync.
+    """
+    state["account"] = {"balance": account.balance, "equity": account.equity, "margin_level": account.margin_level}
+    changed = set(open_pids).symmetric_difference(state["open_pids"])
+    state["open_pids"] = sorted(open_pids)
+    return changed
+
+
+def stage_positions(state: dict, pids=None) -> bool:
+    """
+    Queue resolved positions (state["positions"]) for the next save: the
+    given position ids, or all of them (replacing the stored ones) when
+    pids is None. Returns True if anything was queued.
+    """
+    if pids is None:
+        state["rewrite_positions"] = True
+        state["pending_positions"] = set(state["positions"] or ())
+        return True
+    state["pending_positions"].update(pids)
+    return bool(pids)
+
+
+def get_position_deals(account_id, state: dict, pids) -> list:
+    """Deals of some positions in execution order (from the store plus the ones not saved yet)"""
+    pids = set(pids)
+    if not pids:
+        return []
+    if state["rewrite"]:
+        # The stored deals are about to be replaced
+        deals = {d.ticket: d for d in state["deals"].values() if d.position_id in pids}
+    else:
+        columns = ", ".join(f'"{f}"' for f in DEAL_FIELDS)
+        ordered = sorted(pids)
+        deals = {}
+        with _db_lock:
+            db = _connect()
+            for i in range(0, len(ordered), 500):
+                chunk = ordered[i:i + 500]
+                deals.update((r[0], Deal(*r)) for r in db.execute(
+                    f"SELECT {columns} FROM deals WHERE account_id = ? AND position_id IN ({', '.join('?' for _ in chunk)})",
+                    (str(account_id), *chunk)))
+        deals.update((d.ticket, d) for d in state["pending_deals"] if d.position_id in pids)
+    return sorted(deals.values(), key=lambda d: (d.time_msc, d.ticket))
+
+
+def save_account_state(account_id, state: dict):
+    """Persist what changed since the last save (one transaction)"""
+    account_id = str(account_id)
+    deal_columns = ", ".join(f'"{f}"' for f in DEAL_FIELDS)
+    deal_params = ", ".join("?" for _ in DEAL_FIELDS)
+    position_params = ", ".join("?" for _ in POSITION_FIELDS)
+    positions = state["positions"] or {}
+    try:
+        with _db_lock:
+            db = _connect()
+            with db:
+                if state["rewrite"]:
+                    for table in ('deals', 'positions', 'sltp', 'points'):
+                        db.execute(f"DELETE FROM {table} WHERE account_id = ?", (account_id,))
+                    state["sltp"].dirty = set(state["sltp"])
+                    state["points"].dirty = set(state["points"])
+                elif state["rewrite_positions"]:
+                    db.execute("DELETE FROM positions WHERE account_id = ?", (account_id,))
+                db.executemany(
+                    f"INSERT OR REPLACE INTO deals (account_id, {deal_columns}) VALUES (?, {deal_params})",
+                    [(account_id, *deal) for deal in state["pending_deals"]])
+                db.executemany(
+                    f"INSERT OR REPLACE INTO positions (account_id, position_id, {', '.join(POSITION_FIELDS)}) "
+                    f"VALUES (?, ?, {position_params})",
+                    [(account_id, pid, *positions[pid].fields()) for pid in state["pending_positions"] if pid in positions])
+                stats = state["stats"]
+                if stats is None or stats.replace_position_ids:
+                    db.execute("DELETE FROM counted_positions WHERE account_id = ?", (account_id,))
+                if stats is not None:
+                    db.executemany(
+                        "INSERT OR IGNORE INTO counted_positions (account_id, position_id) VALUES (?, ?)",
+                        [(account_id, pid) for pid in stats.new_position_ids])
+                db.executemany(
+                    "INSERT OR REPLACE INTO sltp (account_id, position_id, sl, tp) VALUES (?, ?, ?, ?)",
+                    [(account_id, pid, *state["sltp"][pid]) for pid in state["sltp"].dirty if pid in state["sltp"]])
+                db.executemany(
+                    "INSERT OR REPLACE INTO points (account_id, symbol, point) VALUES (?, ?, ?)",
+                    [(account_id, sym, state["points"][sym]) for sym in state["points"].dirty if sym in state["points"]])
+                db.execute(
+                    "INSERT OR REPLACE INTO accounts (account_id, watermark_time, watermark_ticket, stats, account, "
+                    "open_positions, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (account_id, state["watermark_time"], state["watermark_ticket"],
+                     json.dumps(stats.to_dict(), separators=(',', ':')) if stats is not None else None,
+                     json.dumps(state["account"]) if state["account"] else None,
+                     json.dumps(state["open_pids"]), time.time()))
+        if stats is not None:
+            stats.new_position_ids = []
+            stats.replace_position_ids = False
+        state["pending_deals"] = []
+        state["pending_positions"] = set()
+        state["sltp"].dirty = set()
+        state["points"].dirty = set()
+        state["rewrite"] = False
+        state["rewrite_positions"] = False
+    except Exception as e:
+        print(f"❌ Error saving sync state for {account_id}: {e}")
+
+
+def get_fetch_start(state: dict, full: bool = False) -> datetime:
+    """
+    Start of the history window to request from MT5.
+    Full resync (or no watermark yet) starts from HISTORY_START.
+    """
+    if full or SYNC_MODE == 'full' or state["watermark_time"] is None:
+        return HISTORY_START
+
+    start = datetime.fromtimestamp(state["watermark_time"], tz=timezone.utc) - timedelta(seconds=DEAL_OVERLAP_SECONDS)
+    return max(start, HISTORY_START)
+
+
+def merge_deals(state: dict, history_deals, full: bool = False) -> list:
+    """
+    Merge freshly fetched MT5 deals into the cached history.
+
+    On a full resync the cache is replaced by the fetched deals.
+    Returns the list of deals that were not known before.
+    """
+    full = full or SYNC_MODE == 'full'
+    known = state["deals"]
+    if full:
+        state["deals"] = {}
+        state["watermark_time"] = None
+        state["watermark_ticket"] = None
+
+    new_deals = []
+    for mt5_deal in history_deals:
+        deal = to_deal(mt5_deal)
+        if deal.ticket not in known:
+            new_deals.append(deal)
+        state["deals"][deal.ticket] = deal
+
+    # Only new deals are appended to the store, unless the history was replaced
+    if full:
+        state["rewrite"] = True
+        state["pending_deals"] = list(state["deals"].values())
+    else:
+        state["pending_deals"].extend(new_deals)
+
+    # Advance the watermark to the newest deal we have seen
+    for deal in (state["deals"].values() if full else new_deals):
+        if state["watermark_time"] is None or (deal.time, deal.ticket) > (state["watermark_time"], state["watermark_ticket"]):
+            state["watermark_time"] = deal.time
+            state["watermark_ticket"] = deal.ticket
+
+    return new_deals
+
+
+def get_deals(state: dict) -> list:
+    """All cached deals of the account in execution order"""
+    return sorted(state["deals"].values(), key=lambda d: (d.time_msc, d.ticket))
@@ -0,0 +1,246 @@
+"""
+Test oracle: the stats loop of the original sync_participant, kept as it was
+before the StatsAccumulator (two passes over the whole deal history).
+
+Only the MT5 / Supabase calls are swapped for arguments: get_point instead
+of mt5.symbol_info, the balance instead of account_info. Not used by the bridge.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_TYPE_BUY = 0
+
+
+def baseline_stats(history_deals, open_pids, balance: float, get_point) -> dict:
+    gross_profit = 0
+    gross_loss = 0
+    symbols = []
+
+    total_profit = 0
+    wins = 0
+    losses = 0
+    total_trades = 0
+    total_points = 0
+    best_trade = -float('inf')
+    worst_trade = float('inf')
+
+    # Long/Short Stats
+    buy_trades = 0
+    buy_wins = 0
+    sell_trades = 0
+    sell_wins = 0
+
+    # For Max DD calculation (Balance based)
+    peak_profit = -float('inf')
+    current_profit_curve = 0
+    max_drawdown_val = 0
+
+    positions = {}  # position_id -> {details}
+
+    # 1. First Pass: Aggregate all deals by position_id
+    for deal in history_deals:
+        if deal.symbol:
+            symbols.append(deal.symbol)
+
+        pid = deal.position_id
+        if pid not in positions:
+            positions[pid] = {
+                'open_time': 0,
+                'close_time': 0,
+                'profit': 0,
+                'symbol': deal.symbol,
+                'type': 'UNKNOWN',
+                'lot': 0,
+                'volume_out': 0,
+                'open_price': 0,
+                'close_price': 0,
+                'deals_out': []
+            }
+
+        if deal.entry == DEAL_ENTRY_IN:
+            positions[pid]['open_time'] = deal.time
+            positions[pid]['open_price'] = deal.price
+            positions[pid]['lot'] += deal.volume
+            positions[pid]['type'] = 'BUY' if (deal.type == DEAL_TYPE_BUY or deal.type == 0) else 'SELL'
+
+        elif deal.entry == DEAL_ENTRY_OUT:
+            positions[pid]['close_time'] = deal.time
+            positions[pid]['close_price'] = deal.price
+            positions[pid]['profit'] += deal.profit
+            positions[pid]['volume_out'] += deal.volume
+            positions[pid]['deals_out'].append(deal)
+
+    # 2. Second Pass: Filter and calculate stats only for FULLY CLOSED trades
+    closed_pids = sorted(
+        [pid for pid, pos in positions.items() if pid not in open_pids and pos['volume_out'] > 0],
+        key=lambda x: positions[x]['close_time']
+    )
+
+    session_stats = {
+        'asian': {'profit': 0, 'wins': 0, 'total': 0},
+        'london': {'profit': 0, 'wins': 0, 'total': 0},
+        'newyork': {'profit': 0, 'wins': 0, 'total': 0}
+    }
+
+    total_duration = 0
+    duration_count = 0
+    win_duration = 0
+    win_duration_count = 0
+    loss_duration = 0
+    loss_duration_count = 0
+
+    for pid in closed_pids:
+        pos = positions[pid]
+
+        total_trades += 1
+        total_profit += pos['profit']
+
+        if pos['profit'] > 0:
+            wins += 1
+            gross_profit += pos['profit']
+        elif pos['profit'] < 0:
+            losses += 1
+            gross_loss += abs(pos['profit'])
+
+        if pos['profit'] > best_trade: best_trade = pos['profit']
+        if pos['profit'] < worst_trade: worst_trade = pos['profit']
+
+        if pos['type'] == 'BUY':
+            buy_trades += 1
+            if pos['profit'] > 0: buy_wins += 1
+        elif pos['type'] == 'SELL':
+            sell_trades += 1
+            if pos['profit'] > 0: sell_wins += 1
+
+        # Points (Weighted by volume)
+        if pos['open_price'] > 0:
+            sym = pos['symbol']
+            if sym:
+                point = get_point(sym)
+                if point > 0:
+                    pos_points = 0
+                    for d_out in pos['deals_out']:
+                        p_diff = (d_out.price - pos['open_price']) if pos['type'] == 'BUY' else (pos['open_price'] - d_out.price)
+                        pos_points += (p_diff / point) * (d_out.volume / pos['lot'])
+                    total_points += pos_points
+
+        # DD Calculation
+        current_profit_curve += pos['profit']
+        if current_profit_curve > peak_profit: peak_profit = current_profit_curve
+        dd = peak_profit - current_profit_curve
+        if dd > max_drawdown_val: max_drawdown_val = dd
+
+        # Session Stats (server time GMT+3 to UTC)
+        open_hour = datetime.utcfromtimestamp(pos['open_time'] - 10800).hour
+        is_win = pos['profit'] > 0
+        if 0 <= open_hour < 8:
+            session_stats['asian']['profit'] += pos['profit']
+            session_stats['asian']['total'] += 1
+            if is_win: session_stats['asian']['wins'] += 1
+        if 7 <= open_hour < 16:
+            session_stats['london']['profit'] += pos['profit']
+            session_stats['london']['total'] += 1
+            if is_win: session_stats['london']['wins'] += 1
+        if 12 <= open_hour < 21:
+            session_stats['newyork']['profit'] += pos['profit']
+            session_stats['newyork']['total'] += 1
+            if is_win: session_stats['newyork']['wins'] += 1
+
+        # Duration Stats
+        duration = pos['close_time'] - pos['open_time']
+        if duration >= 0:
+            total_duration += duration
+            duration_count += 1
+            if pos['profit'] > 0:
+                win_duration += duration
+                win_duration_count += 1
+            elif pos['profit'] < 0:
+                loss_duration += duration
+                loss_duration_count += 1
+
+    # Calculate Consecutive Stats
+    max_consecutive_wins = 0
+    max_consecutive_losses = 0
+    current_consecutive_wins = 0
+    current_consecutive_losses = 0
+    for pid in closed_pids:
+        if positions[pid]['profit'] > 0:
+            current_consecutive_wins += 1
+            current_consecutive_losses = 0
+            if current_consecutive_wins > max_consecutive_wins: max_consecutive_wins = current_consecutive_wins
+        elif positions[pid]['profit'] < 0:
+            current_consecutive_losses += 1
+            current_consecutive_wins = 0
+            if current_consecutive_losses > max_consecutive_losses: max_consecutive_losses = current_consecutive_losses
+
+    # Calculate aggregates
+    win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
+    win_rate_buy = (buy_wins / buy_trades * 100) if buy_trades > 0 else 0
+    win_rate_sell = (sell_wins / sell_trades * 100) if sell_trades > 0 else 0
+
+    profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else (gross_profit if gross_profit > 0 else 0)
+
+    # Max DD %
+    start_balance = balance - total_profit
+    peak_balance = start_balance + peak_profit
+    max_dd_percent = (max_drawdown_val / peak_balance * 100) if peak_balance > 0 else 0
+
+    # Avg Win / Loss
+    avg_win = (gross_profit / wins) if wins > 0 else 0
+    avg_loss = -(gross_loss / losses) if losses > 0 else 0
+    rr_ratio = abs(avg_win / avg_loss) if avg_loss != 0 else 0
+
+    # Holding Time Strings
+    def format_duration(seconds):
+        m, s = divmod(seconds, 60)
+        h, m = divmod(m, 60)
+        d, h = divmod(h, 24)
+        if d > 0: return f"{int(d)}d {int(h)}h"
+        if h > 0: return f"{int(h)}h {int(m)}m"
+        return f"{int(m)}m {int(s)}s"
+
+    avg_holding_time_str = format_duration(total_duration / duration_count) if duration_count > 0 else "0m"
+    avg_holding_time_win_str = format_duration(win_duration / win_duration_count) if win_duration_count > 0 else "0m"
+    avg_holding_time_loss_str = format_duration(loss_duration / loss_duration_count) if loss_duration_count > 0 else "0m"
+
+    # Trading Style
+    avg_holding_minutes = (total_duration / duration_count / 60) if duration_count > 0 else 0
+    if duration_count == 0: trading_style = "Unknown"
+    elif avg_holding_minutes < 30: trading_style = "Scalping"
+    elif avg_holding_minutes < 1440: trading_style = "Intraday"
+    else: trading_style = "Swing"
+
+    # Favorite Pair
+    favorite_pair = Counter(symbols).most_common(1)[0][0] if symbols else "-"
+
+    return {
+        "profit": total_profit,
+        "points": int(total_points),
+        "win_rate": win_rate,
+        "total_trades": total_trades,
+        "profit_factor": round(profit_factor, 2),
+        "rr_ratio": round(rr_ratio, 2),
+        "max_drawdown": round(max_dd_percent, 2),
+        "avg_win": round(avg_win, 2),
+        "avg_loss": round(avg_loss, 2),
+        "trading_style": trading_style,
+        "favorite_pair": favorite_pair,
+        "avg_holding_time": avg_holding_time_str,
+        "best_trade": float(best_trade) if best_trade != -float('inf') else 0,
+        "worst_trade": float(worst_trade) if worst_trade != float('inf') else 0,
+        "win_rate_buy": round(win_rate_buy, 2),
+        "win_rate_sell": round(win_rate_sell, 2),
+        "avg_holding_time_win": avg_holding_time_win_str,
+        "avg_holding_time_loss": avg_holding_time_loss_str,
+        "max_consecutive_wins": max_consecutive_wins,
+        "max_consecutive_losses": max_consecutive_losses,
+        "session_asian_profit": round(session_stats['asian']['profit'], 2),
+        "session_london_profit": round(session_stats['london']['profit'], 2),
+        "session_newyork_profit": round(session_stats['newyork']['profit'], 2),
+        "session_asian_win_rate": round((session_stats['asian']['wins'] / session_stats['asian']['total'] * 100), 2) if session_stats['asian']['total'] > 0 else 0,
+        "session_london_win_rate": round((session_stats['london']['wins'] / session_stats['london']['total'] * 100), 2) if session_stats['london']['total'] > 0 else 0,
+        "session_newyork_win_rate": round((session_stats['newyork']['wins'] / session_stats['newyork']['total'] * 100), 2) if session_stats['newyork']['total'] > 0 else 0,
+    }
@@ -0,0 +1,66 @@
+"""
+Test setup: the bridge modules run against the fake terminal (fake_mt5)
+and the in-process PostgREST stand-in (fake_supabase), with a throwaway
+sync state and no Telegram.
+"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+BRIDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BRIDGE_DIR)
+
+from fake_supabase import FakeSupabase  # noqa: E402
+
+fake_supabase = FakeSupabase().start()
+
+# Set before any bridge module is imported (they read the environment at import time)
+os.environ.update({
+    "MT5_MODULE": "fake_mt5",
+    "STATE_DIR": tempfile.mkdtemp(prefix="bridge-tests-"),
+    "SUPABASE_URL": fake_supabase.url,
+    "SUPABASE_KEY": "test",
+    "TELEGRAM_BOT_TOKEN": "",
+    "METRICS_LOG": "0",
+})
+os.environ.pop("STATE_DB", None)
+
+
+@pytest.fixture
+def supabase_db():
+    """Tables of the fake Supabase, emptied after the test"""
+    yield fake_supabase.db
+    fake_supabase.db.clear()
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Server time of the fake terminal, set by the test: clock(t)"""
+    import fake_mt5
+    now = [0]
+    monkeypatch.setattr(fake_mt5, "_now", lambda: now[0])
+
+    def set_time(server_time: int):
+        now[0] = server_time
+    return set_time
+
+
+@pytest.fixture
+def worker_pool(monkeypatch):
+    """Factory for a started WorkerPool on fake terminals (small histories), stopped after the test"""
+    monkeypatch.setenv("FAKE_MT5_POSITIONS", "20")
+    pools = []
+
+    def start(workers: int = 2, crash_login=None):
+        if crash_login is not None:
+            monkeypatch.setenv("FAKE_MT5_CRASH_LOGIN", str(crash_login))
+        from worker_pool import WorkerPool
+        pool = WorkerPool([f"fake-terminal-{i}" for i in range(workers)])
+        pool.start()
+        pools.append(pool)
+        return pool
+    yield start
+    for pool in pools:
+        pool.stop()
@@ -0,0 +1,86 @@
+"""Deal builders and an in-memory account that syncs like compute_participant"""
+
+import fake_mt5
+from sync_state import Deal, to_deal
+from stats_engine import (
+    DEAL_ENTRY_IN,
+    DEAL_ENTRY_OUT,
+    StatsAccumulator,
+    aggregate_positions,
+    closed_positions,
+    compute_stats,
+    update_accumulator,
+)
+
+DAY = 86400
+START = 20300 * DAY + 3600  # Server time, one hour after a midnight
+
+
+def make_deal(ticket, pid, entry, time, volume=1.0, price=1.0, profit=0.0, type=0,
+              symbol='EURUSD', order=0, sl=0.0, tp=0.0) -> Deal:
+    return Deal(ticket=ticket, order=order, time=time, time_msc=time * 1000, type=type, entry=entry,
+                position_id=pid, volume=volume, price=price, profit=profit, commission=0.0, swap=0.0,
+                symbol=symbol, sl=sl, tp=tp)
+
+
+def open_deal(ticket, pid, time, **kwargs) -> Deal:
+    return make_deal(ticket, pid, DEAL_ENTRY_IN, time, **kwargs)
+
+
+def close_deal(ticket, pid, time, **kwargs) -> Deal:
+    return make_deal(ticket, pid, DEAL_ENTRY_OUT, time, **kwargs)
+
+
+def get_point(symbol: str) -> float:
+    return fake_mt5.SYMBOLS.get(symbol, 0.00001 if symbol else 0)
+
+
+def fake_cycles(clock, login: int, steps: int, step_seconds: int, start: int = START):
+    """(new deals, open position ids) of consecutive syncs of a fake account"""
+    seen = set()
+    for i in range(steps):
+        clock(start + i * step_seconds)
+        deals, _, open_positions = fake_mt5._history(login)
+        new_deals = [to_deal(d) for d in deals if d.ticket not in seen]
+        seen.update(d.ticket for d in new_deals)
+        yield new_deals, {p.ticket for p in open_positions}
+
+
+class Account:
+    """Positions and accumulator kept across cycles, touched positions only (as in main.compute_participant)"""
+
+    def __init__(self):
+        self.deals = {}
+        self.positions = {}
+        self.open_pids = set()
+        self.sltp = {}
+        self.acc = StatsAccumulator()
+
+    def all_deals(self) -> list:
+        return sorted(self.deals.values(), key=lambda d: (d.time_msc, d.ticket))
+
+    def sync(self, new_deals, open_pids=(), balance: float = 10000.0) -> bool:
+        open_pids = set(open_pids)
+        self.deals.update((d.ticket, d) for d in new_deals)
+        refold = {d.position_id for d in new_deals}
+        aggregate_positions([d for d in self.all_deals() if d.position_id in refold], self.sltp, self.positions)
+        touched = refold | (open_pids ^ self.open_pids)
+        self.open_pids = open_pids
+        return update_accumulator(self.acc, self.positions, open_pids, touched, new_deals, self.all_deals, get_point)
+
+    def stats(self, balance: float = 10000.0) -> dict:
+        return self.acc.stats(balance)
+
+    def expected(self, balance: float = 10000.0) -> dict:
+        """Full recompute from scratch over every deal"""
+        deals = self.all_deals()
+        positions = aggregate_positions(deals, self.sltp)
+        closed = closed_positions(positions, self.open_pids)
+        return compute_stats(positions, closed, [d.symbol for d in deals], balance, get_point)
+
+
+def participants(count: int, first_login: int = 7001) -> list:
+    """Participants rows with credentials (fake_mt5 accepts any login)"""
+    return [{'id': f"p{login}", 'nickname': f"trader{login}", 'account_id': login,
+             'investor_password': 'x', 'server': 'Fake-Server'}
+            for login in range(first_login, first_login + count)]
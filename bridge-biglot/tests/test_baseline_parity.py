@@ -0,0 +1,25 @@
+"""Stats fed cycle by cycle must match the original loop of sync_participant (tests/baseline_stats.py)"""
+
+import json
+import pytest
+from stats_engine import StatsAccumulator
+from baseline_stats import baseline_stats
+from helpers import Account, fake_cycles, get_point
+
+
+def _assert_matches_baseline(stats: dict, expected: dict):
+    # Position points sum price * volume per exit (Position.exit_value) instead of
+    # one term per exit deal: float rounding may move the int() down by one
+    assert abs(stats.pop('points') - expected.pop('points')) <= 1
+    assert stats == expected
+
+
+@pytest.mark.parametrize("login", [1001, 1003, 1004])
+def test_accumulator_matches_the_baseline_loop(fake_clock, login):
+    account = Account()
+    for new_deals, open_pids in fake_cycles(fake_clock, login, steps=40, step_seconds=1800):
+        account.sync(new_deals, open_pids)
+        # Saved and loaded back every cycle, as by sync_state
+        account.acc = StatsAccumulator.from_dict(json.loads(json.dumps(account.acc.to_dict())), account.acc.position_ids)
+        _assert_matches_baseline(account.stats(8000.0), baseline_stats(account.all_deals(), open_pids, 8000.0, get_point))
+    assert account.stats()['total_trades'] > 300
@@ -0,0 +1,56 @@
+"""The fetch deadline stops a cycle in time and carries the rest over, in serial and pool mode"""
+
+import time
+from cycle_scheduler import CycleScheduler
+from pipeline import run_pipeline
+from helpers import participants
+
+
+def _scheduler() -> CycleScheduler:
+    scheduler = CycleScheduler(interval=3600)
+    scheduler.start_cycle()
+    return scheduler
+
+
+def _assert_carried_over(scheduler, everyone, synced):
+    assert 0 < len(synced) < len(everyone)
+    assert scheduler.synced == len(synced)
+    assert scheduler.carry == [p['id'] for p in everyone if p['id'] not in synced]
+    # Next cycle: the carried-over participants come first
+    scheduler.start_cycle()
+    assert [p['id'] for p in scheduler.order(everyone)][:len(scheduler.carry)] == scheduler.carry
+
+
+def test_serial_cycle_stops_at_the_deadline():
+    scheduler = _scheduler()
+    everyone = participants(8)
+    synced = []
+
+    def fetch(participant):
+        synced.append(participant['id'])
+        if len(synced) == 3:
+            scheduler.deadline = time.monotonic()  # The fetch budget runs out here
+        return participant
+
+    run_pipeline((fetch(p) for p in scheduler.take(everyone)), None, lambda result: None)
+    assert len(synced) == 3
+    _assert_carried_over(scheduler, everyone, synced)
+
+
+def test_pool_takes_participants_only_as_workers_free_up(worker_pool):
+    pool = worker_pool(workers=2)
+    scheduler = _scheduler()
+    everyone = participants(12)
+    synced = []
+    for participant, result in pool.run_cycle(scheduler.take(everyone)):
+        assert result is not None
+        synced.append(participant['id'])
+        if len(synced) == 1:
+            scheduler.deadline = time.monotonic()
+    # Only what was in flight (one task per worker, plus a bounded look-ahead) finished
+    assert len(synced) <= 4
+    _assert_carried_over(scheduler, everyone, synced)
+
+    scheduler.deadline = None
+    resumed = [p['id'] for p, result in pool.run_cycle(scheduler.take(everyone))]
+    assert sorted(resumed) == sorted(p['id'] for p in everyone)
@@ -0,0 +1,43 @@
+"""Hourly/daily rollups: snapshots written after their hour was rolled up still land in their bar"""
+
+from datetime import datetime, timedelta, timezone
+from core import get_supabase_client
+from equity_rollup import EquityRollup
+
+DAY_START = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+def _snapshots(participant_id, hour, equities):
+    start = DAY_START + timedelta(hours=hour)
+    return [{"participant_id": participant_id, "timestamp": (start + timedelta(minutes=5 * i)).isoformat(),
+             "balance": 1000.0, "equity": equity, "floating_pl": equity - 1000.0, "margin_level": None}
+            for i, equity in enumerate(equities)]
+
+
+def _bar(db, participant_id, tier, hours=0):
+    bucket = (DAY_START + timedelta(hours=hours)).isoformat()
+    return next(r for r in db.tables['equity_rollups']
+                if (r['participant_id'], r['tier'], r['bucket']) == (participant_id, tier, bucket))
+
+
+def test_late_snapshots_are_rolled_up_into_their_bar(supabase_db):
+    rollup = EquityRollup(get_supabase_client())
+    supabase_db.seed('equity_snapshots', _snapshots('a', 10, [1000, 1010]) + _snapshots('b', 10, [900]))
+    rollup.roll_up_hours(DAY_START + timedelta(hours=11))
+    assert _bar(supabase_db, 'b', '1h', 10)['samples'] == 1
+
+    # b's 10:55 snapshot is written after the 10:00 bars were rolled up
+    supabase_db.seed('equity_snapshots', _snapshots('a', 11, [1020]) + _snapshots('b', 10, [0] * 11 + [950])[-1:])
+    rollup.roll_up_hours(DAY_START + timedelta(hours=12))
+    bar = _bar(supabase_db, 'b', '1h', 10)
+    assert (bar['samples'], bar['equity_close'], bar['equity_high']) == (2, 950.0, 950.0)
+    assert _bar(supabase_db, 'a', '1h', 11)['samples'] == 1
+
+    # Daily bars follow the re-aggregated hours
+    rollup.hourly_until = DAY_START + timedelta(days=1)
+    rollup.roll_up_days()
+    supabase_db.seed('equity_snapshots', _snapshots('b', 11, [990]))
+    rollup.roll_up_hours(DAY_START + timedelta(days=1))
+    rollup.roll_up_days()
+    assert _bar(supabase_db, 'b', '1d')['samples'] == 3
+    assert _bar(supabase_db, 'b', '1d')['equity_close'] == 990.0
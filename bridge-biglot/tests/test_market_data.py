@@ -0,0 +1,83 @@
+"""Candle sync against the fake terminal: gaps longer than one copy window are filled in whole"""
+
+import numpy as np
+import fake_mt5
+import market_data_service as mds
+
+
+def test_gap_longer_than_the_window_is_paged_in_whole(monkeypatch):
+    tf = fake_mt5.TIMEFRAME_M5
+    history = fake_mt5.copy_rates_from_pos('XAUUSD', tf, 0, 3000)
+    watermark = int(history[0]['time'])
+    monkeypatch.setitem(mds._watermarks, ('XAUUSD', 'M5'), watermark)
+
+    rates = mds.copy_new_rates('XAUUSD', 'XAUUSD', 'M5', tf, count=400)
+    assert rates[0]['time'] == watermark
+    assert len(rates) >= len(history)
+    assert np.all(np.diff(rates['time']) > 0)  # No bar twice across the page edges
+    expected = fake_mt5.copy_rates_range('XAUUSD', tf, mds._server_datetime(watermark), mds._server_datetime(int(rates[-1]['time'])))
+    assert np.array_equal(rates['time'], expected['time'])
+
+
+def test_missing_watermark_bar_falls_back_to_the_window(monkeypatch):
+    tf = fake_mt5.TIMEFRAME_H1
+    copy_range = mds.mt5.copy_rates_range
+    history_start = int(fake_mt5.copy_rates_from_pos('XAUUSD', tf, 0, 1000)[0]['time'])
+    # The terminal only keeps the last 1000 bars; the watermark is older than that
+    monkeypatch.setattr(mds.mt5, "copy_rates_range",
+                        lambda *args: (lambda bars: bars[bars['time'] >= history_start])(copy_range(*args)))
+    monkeypatch.setitem(mds._watermarks, ('XAUUSD', 'H1'), history_start - 30 * 86400)
+    rates = mds.copy_new_rates('XAUUSD', 'XAUUSD', 'H1', tf, count=200)
+    assert len(rates) == 200
+
+
+def test_ticks_arriving_while_seeding_are_not_counted_twice(fake_clock, monkeypatch):
+    from helpers import START
+    clock = [START + 1]
+    fake_clock(clock[0])
+    copy_rates = mds.mt5.copy_rates_from_pos
+
+    def slow_copy(*args):
+        # Ticks keep arriving while the bars of each timeframe are read
+        clock[0] += 5
+        fake_clock(clock[0])
+        return copy_rates(*args)
+    monkeypatch.setattr(mds.mt5, "copy_rates_from_pos", slow_copy)
+
+    streamer = mds.TickStreamer()
+    streamer.seed(['XAUUSD'])
+    _, live = streamer.bars['XAUUSD']
+    assert streamer.poll() == 0  # Every tick so far is already in the seeded bars
+
+    fake_clock(clock[0] + 30)
+    assert streamer.poll() > 0
+    terminal_bar = copy_rates('XAUUSD', fake_mt5.TIMEFRAME_M1, 0, 1)[-1]
+    assert tuple(live.forming['M1'][:5]) == tuple(terminal_bar[['time', 'open', 'high', 'low', 'close']].tolist())
+
+
+class _RpcClient:
+    """Stands in for the Supabase client: answers traded_symbols, fails on any table read"""
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return type('Call', (), {'execute': lambda _: type('Response', (), {'data': [{'symbol': s} for s in self.symbols]})()})()
+
+    def table(self, name):
+        raise AssertionError(f"{name} should not be paged for symbols")
+
+
+def test_market_symbols_come_from_one_distinct_query(monkeypatch):
+    client = _RpcClient(['EURUSD', 'XAUUSD.s', 'EURUSD', '-', None])
+    monkeypatch.setattr(mds, "supabase", client)
+    monkeypatch.setattr(mds, "MARKET_SYMBOLS_AUTO", True)
+    monkeypatch.setitem(mds._symbols, "refreshed", 0.0)
+    monkeypatch.setitem(mds._symbols, "list", list(mds.MARKET_SYMBOLS))
+
+    assert mds.get_market_symbols() == ['XAUUSD', 'EURUSD']
+    assert [name for name, _ in client.calls] == ['traded_symbols']
+    mds.get_market_symbols()  # Cached until the next refresh
+    assert len(client.calls) == 1
@@ -0,0 +1,38 @@
+"""Orders placed before the sync window are found with a few ranged queries, not one per order"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+import main
+
+WINDOW_START = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def ranges(monkeypatch):
+    """Orders 1, 2 (3 and 5 days before the window) and 3 (placed a year earlier); records the queried ranges"""
+    setup = {1: WINDOW_START - timedelta(days=3), 2: WINDOW_START - timedelta(days=5),
+             3: WINDOW_START - timedelta(days=365)}
+    queried = []
+
+    def get_orders_by_ticket(from_date, to_date):
+        queried.append((from_date, to_date))
+        return {t: SimpleNamespace(ticket=t, sl=1.0, tp=2.0) for t, at in setup.items() if from_date <= at <= to_date}
+    monkeypatch.setattr(main, "get_orders_by_ticket", get_orders_by_ticket)
+    return queried
+
+
+def test_one_query_covers_every_missing_order(ranges):
+    assert sorted(main.get_orders_before({1, 2}, WINDOW_START)) == [1, 2]
+    assert ranges == [(WINDOW_START - timedelta(days=7), WINDOW_START)]
+
+
+def test_reaches_back_to_the_history_start_only_while_orders_are_missing(ranges):
+    assert sorted(main.get_orders_before({1, 3, 99}, WINDOW_START)) == [1, 3]
+    assert [start for start, _ in ranges] == [WINDOW_START - timedelta(days=7), WINDOW_START - timedelta(days=90),
+                                             main.HISTORY_START]
+
+
+def test_nothing_before_the_history_start(ranges):
+    assert main.get_orders_before({1}, main.HISTORY_START) == {}
+    assert ranges == []
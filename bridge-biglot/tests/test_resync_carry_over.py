@@ -0,0 +1,83 @@
+"""A full resync or reconcile reaches every participant, also the ones carried past the fetch deadline"""
+
+import time
+import pytest
+import main
+from cycle_scheduler import CycleScheduler
+from sync_priority import SyncPriority
+from helpers import participants
+
+
+@pytest.fixture
+def bridge(supabase_db, monkeypatch):
+    """main with fresh per-run state; fetches are recorded and the deadline passes after the second one"""
+    supabase_db.seed('participants', participants(6, first_login=9000))
+    monkeypatch.setattr(main, "cycle_scheduler", CycleScheduler(interval=3600))
+    monkeypatch.setattr(main, "sync_priority", SyncPriority(interval=3600))
+    for name in ("pending_resync", "pending_resend", "written_participants"):
+        monkeypatch.setattr(main, name, set())
+    fetches = []
+    fetch = main.fetch_participant
+
+    def recorded_fetch(participant, full_resync=False, resend_rows=False):
+        fetches.append((participant['account_id'], full_resync, resend_rows))
+        if len(fetches) == 2:
+            main.cycle_scheduler.deadline = time.monotonic()
+        return fetch(participant, full_resync=full_resync, resend_rows=resend_rows)
+    monkeypatch.setattr(main, "fetch_participant", recorded_fetch)
+    return fetches
+
+
+def _cycle(full_resync=False):
+    main.cycle_scheduler.start_cycle()
+    main.run_cycle(full_resync=full_resync)
+    main.cycle_scheduler.end_cycle()
+
+
+def test_full_resync_survives_the_carry_over(bridge):
+    _cycle(full_resync=True)
+    assert bridge == [(9000, True, True), (9001, True, True)]
+    assert main.cycle_scheduler.carry
+
+    _cycle()
+    # Carried over first and still owed the resync; the ones already done sync normally
+    assert bridge[2:] == [(login, True, True) for login in range(9002, 9006)] + [(9000, False, False), (9001, False, False)]
+    assert main.pending_resync == set()
+
+    bridge.clear()
+    _cycle()
+    assert all(not full and not resend for _, full, resend in bridge)
+
+
+def test_failed_fetch_keeps_the_resync_owed(bridge, monkeypatch):
+    fetch = main.fetch_participant
+    monkeypatch.setattr(main, "fetch_participant",
+                        lambda p, *args: None if p['account_id'] == 9000 else fetch(p, *args))
+    _cycle(full_resync=True)
+    assert main.pending_resync == {'p9000', 'p9003', 'p9004', 'p9005'}  # 9001 and 9002 were synced
+    _cycle()
+    assert main.pending_resync == {'p9000'}
+
+
+def test_reconcile_is_per_participant_and_survives_the_carry_over(bridge, supabase_db):
+    cache = main.get_write_cache()
+    _cycle()  # Rows and hashes of everyone (fetched in two cycles)
+    _cycle()
+    bridge.clear()
+    cache.mark_reconciled([f"p{login}" for login in range(9000, 9006)], time.time() - 10 ** 9)
+    supabase_db.clear()  # Drift: Supabase lost every row
+    supabase_db.seed('participants', participants(6, first_login=9000))
+
+    main.cycle_scheduler.start_cycle()
+    main.run_cycle()
+    main.cycle_scheduler.end_cycle()
+    main.cycle_scheduler.deadline = None
+    # Two re-sent before the deadline; the others are still due, their hashes untouched
+    assert cache.reconcile_due([f"p{login}" for login in range(9000, 9006)]) == {'p9002', 'p9003', 'p9004', 'p9005'}
+    _cycle()
+    assert cache.reconcile_due([f"p{login}" for login in range(9000, 9006)]) == set()
+    assert [(login, resend) for login, _, resend in bridge] == (
+        [(9000, True), (9001, True)] + [(login, True) for login in range(9002, 9006)] + [(9000, False), (9001, False)])
+    resent = {row['participant_id'] for row in supabase_db.tables['daily_stats']}
+    assert resent == {f"p{login}" for login in range(9000, 9006)}
+    assert {row['participant_id'] for row in supabase_db.tables['trades']} == resent
@@ -0,0 +1,83 @@
+"""StatsAccumulator fed cycle by cycle must match compute_stats over the full history"""
+
+import json
+from stats_engine import StatsAccumulator, Position, aggregate_positions, position_points
+from helpers import Account, fake_cycles, open_deal, close_deal, get_point
+
+
+def test_matches_full_recompute_every_cycle(fake_clock):
+    account = Account()
+    for new_deals, open_pids in fake_cycles(fake_clock, 1001, steps=40, step_seconds=1800):
+        account.sync(new_deals, open_pids)
+        assert account.stats() == account.expected()
+    assert account.stats()['total_trades'] > 400
+
+
+def test_round_trip_through_the_stored_dict(fake_clock):
+    account = Account()
+    for i, (new_deals, open_pids) in enumerate(fake_cycles(fake_clock, 1002, steps=20, step_seconds=1800)):
+        account.sync(new_deals, open_pids)
+        # As saved to and loaded from the sync state every cycle
+        data = json.loads(json.dumps(account.acc.to_dict()))
+        assert 'position_ids' not in data
+        restored = StatsAccumulator.from_dict(data, account.acc.position_ids)
+        assert restored.stats(5000.0) == account.acc.stats(5000.0)
+        account.acc = restored
+        assert account.stats() == account.expected()
+
+
+def test_partial_close_counts_once_when_fully_closed():
+    account = Account()
+    account.sync([open_deal(1, 10, 1000, volume=1.0, price=1.1000)], open_pids={10})
+    account.sync([close_deal(2, 10, 2000, volume=0.4, price=1.1010, profit=4.0)], open_pids={10})
+    assert account.stats()['total_trades'] == 0
+
+    account.sync([close_deal(3, 10, 3000, volume=0.6, price=1.1020, profit=12.0)], open_pids=set())
+    stats = account.stats()
+    assert stats['total_trades'] == 1
+    assert stats['profit'] == 16.0
+    assert stats['points'] == int(position_points(account.positions[10], get_point('EURUSD')))
+    assert stats == account.expected()
+
+
+def test_position_closing_before_the_last_counted_one_rebuilds():
+    account = Account()
+    account.sync([open_deal(1, 10, 1000), close_deal(2, 10, 5000, profit=-30.0)])
+    account.sync([open_deal(3, 11, 6000), close_deal(4, 11, 7000, profit=50.0)])
+    # Arrives late, but closed before position 11: drawdown and streaks depend on the order
+    account.sync([open_deal(5, 12, 2000), close_deal(6, 12, 3000, profit=-20.0)])
+    stats = account.stats()
+    assert stats['total_trades'] == 3
+    assert stats['max_consecutive_losses'] == 2
+    assert stats == account.expected()
+
+
+def test_late_deal_on_a_counted_position_rebuilds():
+    account = Account()
+    account.sync([open_deal(1, 10, 1000, volume=1.0), close_deal(2, 10, 2000, volume=0.5, profit=10.0)])
+    account.sync([open_deal(3, 11, 3000), close_deal(4, 11, 4000, profit=-5.0)])
+    assert account.stats()['total_trades'] == 2
+
+    account.sync([close_deal(5, 10, 2500, volume=0.5, profit=7.0)])
+    stats = account.stats()
+    assert stats['total_trades'] == 2
+    assert stats['best_trade'] == 17.0
+    assert stats == account.expected()
+
+
+def test_close_time_ties_follow_the_position_id():
+    account = Account()
+    account.sync([open_deal(1, 20, 1000), close_deal(2, 20, 5000, profit=10.0)])
+    account.sync([open_deal(3, 19, 1500), close_deal(4, 19, 5000, profit=-10.0)])
+    assert account.stats() == account.expected()
+
+
+def test_refolding_a_position_replaces_it():
+    deals = [open_deal(1, 10, 1000, volume=1.0, price=2.0), close_deal(2, 10, 2000, volume=1.0, price=2.5, profit=5.0)]
+    positions = aggregate_positions(deals[:1], {})
+    other = positions[99] = Position('GBPUSD')
+    aggregate_positions(deals, {}, positions)
+    assert positions[99] is other
+    pos = positions[10]
+    assert (pos.lot, pos.volume_out, pos.exit_value, pos.profit) == (1.0, 1.0, 2.5, 5.0)
+    assert Position.from_fields(pos.fields()).fields() == pos.fields()
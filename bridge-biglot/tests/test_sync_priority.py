@@ -0,0 +1,51 @@
+"""Backed-off accounts still get equity snapshots and their first sync of a new UTC day"""
+
+from types import SimpleNamespace
+import sync_priority
+from sync_priority import SyncPriority
+from helpers import participants
+
+IDLE = {"open_positions": 0, "new_deals": 0, "last_deal_time": None}
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, table, rows, on_conflict=None):
+        self.rows += [(table, row) for row in (rows if isinstance(rows, list) else [rows])]
+
+
+def _flat(balance):
+    return SimpleNamespace(balance=balance, equity=balance, margin_level=0.0)
+
+
+def test_idle_account_backs_off_until_the_next_utc_day(monkeypatch):
+    day = ["2026-03-01"]
+    monkeypatch.setattr(sync_priority, "_utc_day", lambda: day[0])
+    priority = SyncPriority(interval=60)
+    idle, active = participants(2)
+    priority.record(idle['id'], IDLE, _flat(5000.0))
+    priority.record(active['id'], {**IDLE, "open_positions": 1}, _flat(5000.0))
+    assert priority.due([idle, active]) == [active]
+    assert priority.last_account(idle['id']).balance == 5000.0
+
+    day[0] = "2026-03-02"
+    assert priority.due([idle, active]) == [idle, active]
+
+
+def test_backed_off_accounts_get_snapshots(monkeypatch):
+    import main
+    from equity_service import SnapshotScheduler, snapshot_bucket
+    monkeypatch.setattr(main, "sync_priority", SyncPriority(interval=60))
+    monkeypatch.setattr(main, "snapshot_scheduler", SnapshotScheduler())
+    idle, never_synced = participants(2, first_login=7101)
+    main.sync_priority.record(idle['id'], IDLE, _flat(4200.0))
+    assert main.sync_priority.due([idle, never_synced]) == [never_synced]
+
+    main.snapshot_scheduler.bucket = snapshot_bucket()
+    writer = RecordingWriter()
+    main.queue_backed_off_snapshots([idle, never_synced], writer)
+    assert [(table, row['participant_id'], row['equity']) for table, row in writer.rows] == [
+        ('equity_snapshots', idle['id'], 4200.0)]
+    assert idle['id'] in main.snapshot_scheduler.pending
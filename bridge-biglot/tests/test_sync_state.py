@@ -0,0 +1,77 @@
+"""Local store: positions and accumulator survive a reload, deals are found per position"""
+
+from types import SimpleNamespace
+import sync_state
+from sync_state import load_account_state, save_account_state, stage_positions, get_position_deals, merge_deals
+from stats_engine import aggregate_positions
+from helpers import Account, open_deal, close_deal
+
+
+def _reload(account_id):
+    sync_state._states.pop(str(account_id), None)
+    return load_account_state(account_id)
+
+
+def test_positions_and_stats_survive_a_reload():
+    state = load_account_state(5001)
+    deals = [open_deal(1, 10, 1000, price=1.5), close_deal(2, 10, 2000, price=1.6, profit=10.0), open_deal(3, 11, 3000)]
+    merge_deals(state, deals)
+    state['positions'] = aggregate_positions(deals, state['sltp'])
+    stage_positions(state)
+    account = Account()
+    account.sync(deals, open_pids={11})
+    state['stats'] = account.acc
+    save_account_state(5001, state)
+
+    loaded = _reload(5001)
+    assert {pid: pos.fields() for pid, pos in loaded['positions'].items()} == \
+           {pid: pos.fields() for pid, pos in state['positions'].items()}
+    assert loaded['stats'].stats(100.0) == account.acc.stats(100.0)
+
+
+def test_position_deals_come_from_the_store_and_the_unsaved_ones():
+    state = load_account_state(5002)
+    merge_deals(state, [open_deal(1, 10, 1000), open_deal(2, 11, 1100)])
+    state['positions'] = aggregate_positions(sync_state.get_deals(state), state['sltp'])
+    stage_positions(state)
+    save_account_state(5002, state)
+
+    state = _reload(5002)
+    merge_deals(state, [close_deal(3, 10, 1200)])
+    assert [d.ticket for d in get_position_deals(5002, state, {10})] == [1, 3]
+    assert [d.ticket for d in get_position_deals(5002, state, {11, 12})] == [2]
+
+
+def test_record_account_returns_opened_and_closed_positions():
+    state = load_account_state(5003)
+    account = SimpleNamespace(balance=1.0, equity=1.0, margin_level=0.0)
+    assert sync_state.record_account(state, account, {1, 2}) == {1, 2}
+    assert sync_state.record_account(state, account, {2, 3}) == {1, 3}
+    assert sync_state.record_account(state, account, {2, 3}) == set()
+
+
+def test_counted_position_ids_are_saved_incrementally():
+    state = load_account_state(5004)
+    account = Account()
+    account.sync([open_deal(1, 10, 1000), close_deal(2, 10, 2000, profit=1.0)])
+    state['stats'] = account.acc
+    save_account_state(5004, state)
+    assert 'position_ids' not in sync_state._connect().execute(
+        "SELECT stats FROM accounts WHERE account_id = '5004'").fetchone()[0]
+
+    loaded = _reload(5004)
+    assert loaded['stats'].position_ids == {10}
+    account.acc = loaded['stats']
+    account.sync([open_deal(3, 11, 3000), close_deal(4, 11, 4000, profit=2.0)])
+    assert loaded['stats'].new_position_ids == [11]  # Only the new id is written
+    save_account_state(5004, loaded)
+    assert _reload(5004)['stats'].position_ids == {10, 11}
+    assert _reload(5004)['stats'].stats(100.0) == account.expected(100.0)
+
+
+def test_ids_stored_in_the_json_rebuild_the_accumulator():
+    state = load_account_state(5005)
+    save_account_state(5005, state)
+    with sync_state.transaction() as db:
+        db.execute("UPDATE accounts SET stats = ? WHERE account_id = '5005'", ('{"total_trades":1,"position_ids":[10]}',))
+    assert _reload(5005)['stats'] is None
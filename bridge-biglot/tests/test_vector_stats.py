@@ -0,0 +1,81 @@
+"""The vectorized engine must give the same stats, trades rows and lots as the Position loop"""
+
+from stats_engine import aggregate_positions, closed_positions
+from equity_service import calculate_total_lots
+from vector_stats import (
+    get_deal_arrays,
+    get_position_arrays,
+    closed_position_index,
+    compute_stats_vectorized,
+    positions_from_arrays,
+    total_lots_vectorized,
+)
+from helpers import Account, fake_cycles, open_deal, close_deal, get_point
+
+
+def _vectorized(account: Account, new_deals, cache: dict, sltp: dict = None):
+    d = get_deal_arrays(new_deals, account.all_deals, cache=cache, total=len(account.deals))
+    p = get_position_arrays(d, cache=cache)
+    stats = compute_stats_vectorized(d, p, closed_position_index(p, account.open_pids), 10000.0, get_point)
+    rows = positions_from_arrays(d, p, closed_position_index(p, account.open_pids), sltp or {})
+    return stats, rows, total_lots_vectorized(p)
+
+
+def _assert_same_as_loop(account: Account, stats, rows, lots, sltp: dict = None):
+    positions = aggregate_positions(account.all_deals(), sltp or {})
+    closed = closed_positions(positions, account.open_pids)
+    assert stats == account.expected()
+    assert list(rows) == closed
+    assert {pid: pos.fields() for pid, pos in rows.items()} == {pid: positions[pid].fields() for pid in closed}
+    assert lots == calculate_total_lots(positions)
+
+
+def test_same_output_as_the_loop_every_cycle(fake_clock):
+    account = Account()
+    cache = {}
+    for new_deals, open_pids in fake_cycles(fake_clock, 2001, steps=40, step_seconds=1800):
+        account.sync(new_deals, open_pids)
+        _assert_same_as_loop(account, *_vectorized(account, new_deals, cache))
+    assert len(cache['arrays']['ticket']) == len(account.deals)
+
+
+def test_late_deal_rebuilds_the_arrays():
+    account = Account()
+    cache = {}
+    first = [open_deal(1, 10, 1000, symbol='XAUUSD', price=2000.0), close_deal(2, 10, 5000, symbol='XAUUSD', price=2001.0, profit=10.0)]
+    account.sync(first)
+    _vectorized(account, first, cache)
+    arrays = cache['arrays']
+
+    late = [open_deal(3, 11, 2000, price=1.1), close_deal(4, 11, 3000, price=1.2, profit=-4.0)]
+    account.sync(late)
+    result = _vectorized(account, late, cache)
+    assert cache['arrays'] is not arrays
+    assert list(cache['arrays']['ticket']) == [1, 3, 4, 2]
+    _assert_same_as_loop(account, *result)
+
+
+def test_partial_closes_and_resolved_sltp():
+    account = Account()
+    sltp = {10: (1.05, 1.25)}
+    deals = [
+        open_deal(1, 10, 1000, volume=1.0, price=1.1, order=7),
+        close_deal(2, 10, 2000, volume=0.3, price=1.15, profit=15.0),
+        close_deal(3, 10, 3000, volume=0.7, price=1.05, profit=-35.0),
+        open_deal(4, 11, 3500, volume=0.5, price=1.2, type=1, sl=1.3, tp=1.1, order=8),
+        close_deal(5, 11, 3600, volume=0.2, price=1.19, type=0, profit=2.0),
+    ]
+    account.sltp = sltp
+    account.sync(deals, open_pids={11})
+    stats, rows, lots = _vectorized(account, deals, {}, sltp)
+    assert (rows[10].sl, rows[10].tp) == (1.05, 1.25)
+    assert 11 not in rows
+    assert lots == 1.5
+    _assert_same_as_loop(account, stats, rows, lots, sltp)
+
+
+def test_no_deals():
+    account = Account()
+    stats, rows, lots = _vectorized(account, [], {})
+    assert rows == {} and lots == 0
+    assert stats == account.expected()
@@ -0,0 +1,67 @@
+"""WorkerPool on fake terminals: stable sharding, crash reassignment, clean shutdown"""
+
+from worker_pool import shard_for
+from helpers import participants
+
+
+def test_rendezvous_moves_only_the_lost_workers_accounts():
+    accounts = range(1000, 1400)
+    before = {a: shard_for(a, [0, 1, 2, 3]) for a in accounts}
+    assert before == {a: shard_for(a, [3, 2, 1, 0]) for a in accounts}  # Order of the workers does not matter
+    assert len(set(before.values())) == 4
+
+    after = {a: shard_for(a, [0, 1, 3]) for a in accounts}
+    moved = {a for a in accounts if after[a] != before[a]}
+    assert moved == {a for a in accounts if before[a] == 2}
+
+
+def test_every_participant_is_synced(worker_pool):
+    pool = worker_pool(workers=2)
+    everyone = participants(6)
+    for _ in range(2):
+        results = dict((p['id'], result) for p, result in pool.run_cycle(everyone))
+        assert sorted(results) == sorted(p['id'] for p in everyone)
+        assert all(result is not None for result in results.values())
+        assert all(result['participant']['id'] == pid and result['trade_stats'] for pid, result in results.items())
+
+
+def test_crashing_account_is_reassigned_then_skipped(worker_pool):
+    everyone = participants(8)
+    crash = everyone[3]
+    pool = worker_pool(workers=3, crash_login=crash['account_id'])
+    results = dict((p['id'], result) for p, result in pool.run_cycle(everyone))
+    assert sorted(results) == sorted(p['id'] for p in everyone)
+    # The account took down its owner and then the next worker; everyone else was synced
+    assert results.pop(crash['id']) is None
+    assert all(result is not None for result in results.values())
+    assert len(pool.alive_workers()) == 1
+
+    # Dead workers are restarted at the start of the next cycle
+    healthy = [p for p in everyone if p is not crash]
+    results = dict((p['id'], result) for p, result in pool.run_cycle(healthy))
+    assert all(result is not None for result in results.values())
+    assert len(pool.alive_workers()) == 3
+
+
+def test_stop_shuts_the_workers_down_cleanly(worker_pool):
+    pool = worker_pool(workers=2)
+    assert len(list(pool.run_cycle(participants(2)))) == 2
+    pool.stop()
+    assert all(not proc.is_alive() and proc.exitcode == 0 for proc, _ in pool.workers.values())
+
+
+def test_worker_timings_reach_the_parent_registry(worker_pool):
+    import metrics
+    metrics.end_cycle()
+    pool = worker_pool(workers=2)
+    everyone = participants(3, first_login=7101)  # Not synced by the other tests: cumulative series start at 0
+    assert len(list(pool.run_cycle(everyone))) == 3
+
+    line = metrics.end_cycle()
+    assert line['phases']['mt5_login']['count'] == 3
+    assert line['phases']['stats_compute']['count'] == 3
+    slowest = {entry['participant']: entry['phases'] for entry in line['slowest_participants']}
+    assert set(slowest) == {p['nickname'] for p in everyone}
+    assert all('mt5_history_deals_get' in phases for phases in slowest.values())
+    assert f'bridge_participant_phase_seconds_count{{participant="{everyone[0]["nickname"]}",phase="mt5_login"}} 1' \
+        in metrics.registry.render()
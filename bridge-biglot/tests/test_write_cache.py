@@ -0,0 +1,90 @@
+"""Row hashes live in the local store: unchanged rows are skipped, across restarts too"""
+
+import time
+from batch_writer import BatchWriter
+from write_cache import WriteCache, row_hash
+
+
+class _Table:
+    def __init__(self, client, name):
+        self.client, self.name = client, name
+
+    def upsert(self, rows, on_conflict):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        if any(row.get('fail') for row in self.rows):
+            raise RuntimeError("rejected")
+        self.client.written.extend((self.name, row['position_id']) for row in self.rows)
+
+
+class RecordingClient:
+    """Stands in for the Supabase client: records the upserted (table, position_id)"""
+
+    def __init__(self):
+        self.written = []
+
+    def table(self, name):
+        return _Table(self, name)
+
+
+def _trade(pid, profit, **extra):
+    return {"participant_id": "p1", "position_id": pid, "profit": profit, **extra}
+
+
+def test_hashes_are_saved_incrementally_and_survive_a_restart():
+    cache = WriteCache()
+    cache.forget('p1')
+    cache.commit('trades', ('p1', 1), 'a')
+    assert cache.is_unchanged('trades', ('p1', 1), 'a')
+    assert not WriteCache().is_unchanged('trades', ('p1', 1), 'a')  # Not saved yet
+
+    cache.save()
+    assert cache.pending == {}
+    restarted = WriteCache()
+    assert restarted.is_unchanged('trades', ('p1', 1), 'a')
+    assert not restarted.is_unchanged('trades', ('p1', 1), 'b')
+
+
+def test_forget_drops_only_that_participants_hashes():
+    cache = WriteCache()
+    cache.commit('daily_stats', ('p1', '2026-01-01'), 'a')
+    cache.commit('trades', ('p1', 7), 'b')
+    cache.commit('trades', ('p10', 7), 'c')  # Same prefix, other participant
+    cache.save()
+    cache.commit('trades', ('p1', 8), 'd')  # Not saved yet
+    cache.forget('p1')
+    restarted = WriteCache()
+    assert not restarted.is_unchanged('daily_stats', ('p1', '2026-01-01'), 'a')
+    assert not restarted.is_unchanged('trades', ('p1', 7), 'b')
+    assert not cache.is_unchanged('trades', ('p1', 8), 'd')
+    assert restarted.is_unchanged('trades', ('p10', 7), 'c')
+
+
+def test_reconcile_is_due_per_participant():
+    cache = WriteCache()
+    assert cache.reconcile_due(['r1', 'r2']) == set()  # First seen: interval starts now
+    cache.mark_reconciled(['r1'], time.time() - 10 ** 9)
+    assert cache.reconcile_due(['r1', 'r2']) == {'r1'}
+    assert WriteCache().reconcile_due(['r1', 'r2']) == {'r1'}  # Kept across restarts
+    cache.mark_reconciled(['r1'])
+    assert WriteCache().reconcile_due(['r1', 'r2']) == set()
+
+
+def test_batch_writer_skips_unchanged_rows_and_retries_failed_ones():
+    cache = WriteCache()
+    cache.forget('p1')
+    client = RecordingClient()
+    writer = BatchWriter(client, cache=cache)
+    writer.add('trades', [_trade(1, 5.0), _trade(2, -1.0), _trade(3, 2.0, fail=True)], on_conflict='participant_id,position_id')
+    report = writer.flush()
+    assert sorted(client.written) == [('trades', 1), ('trades', 2)]
+    assert [row['position_id'] for row in report['trades']['failed']] == [3]
+
+    client.written.clear()
+    writer = BatchWriter(client, cache=WriteCache())
+    writer.add('trades', [_trade(1, 5.0), _trade(2, -3.0), _trade(3, 2.0)], on_conflict='participant_id,position_id')
+    writer.flush()
+    assert sorted(client.written) == [('trades', 2), ('trades', 3)]
+    assert WriteCache().is_unchanged('trades', ('p1', 2), row_hash(_trade(2, -3.0)))
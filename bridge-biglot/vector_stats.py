@@ -0,0 +1,288 @@
+"""
+Vectorized Stats Engine - NumPy/pandas version of the stats calculation
+
+Features:
+- Deals kept as columnar arrays between cycles; a cycle only appends its
+  new deals (rebuilt when a deal lands before the last one), and the
+  per-position arrays are reused while no deal arrived
+- Per-position aggregation with grouped sums (np.bincount): stats, trades
+  rows and total lots come straight from the arrays, no Position loop
+- Cumulative-max drawdown, session masks and run-length streaks
+- Same stats fields as stats_engine.compute_stats (sums are taken in the
+  same order, so floats match the loop bit for bit)
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from stats_engine import (
+    StatsAccumulator,
+    Position,
+    SERVER_TIME_OFFSET,
+    SESSIONS,
+    DEAL_ENTRY_IN,
+    DEAL_ENTRY_OUT,
+    DEAL_TYPE_BUY
+)
+from sync_state import DEAL_FIELDS
+
+
+def _sequential_sum(values: np.ndarray) -> float:
+    """Left-to-right sum (np.sum uses pairwise summation, the loop does not)"""
+    return float(np.cumsum(values)[-1]) if len(values) else 0
+
+
+def _last_index(codes: np.ndarray, index: np.ndarray, size: int) -> np.ndarray:
+    """Index of the last row per group code (-1 if the group has no rows)"""
+    last = np.full(size, -1, dtype=np.int64)
+    if len(codes):
+        uniq, first_in_reversed = np.unique(codes[::-1], return_index=True)
+        last[uniq] = index[::-1][first_in_reversed]
+    return last
+
+
+def _max_run(signs: np.ndarray, value: int) -> int:
+    """Longest run of `value` in an array of +1/-1"""
+    if not len(signs):
+        return 0
+    starts = np.flatnonzero(np.r_[True, signs[1:] != signs[:-1]])
+    lengths = np.diff(np.r_[starts, len(signs)])
+    runs = lengths[signs[starts] == value]
+    return int(runs.max()) if len(runs) else 0
+
+
+def load_deal_arrays(deals: list, symbol_codes: dict = None) -> dict:
+    """
+    Columnar arrays of the deal fields the stats, rows and lots need.
+    Symbols are also numbered in first-seen order (symbol_codes: symbol -> code,
+    extended in place, so arrays appended later share the numbering).
+    """
+    symbol_codes = {} if symbol_codes is None else symbol_codes
+    columns = dict(zip(DEAL_FIELDS, zip(*deals))) if deals else {field: () for field in DEAL_FIELDS}
+    arrays = {field: np.asarray(columns[field], dtype=np.int64)
+              for field in ('ticket', 'time_msc', 'order', 'position_id', 'entry', 'type', 'time')}
+    arrays.update({field: np.asarray(columns[field], dtype=np.float64)
+                   for field in ('price', 'volume', 'profit', 'sl', 'tp')})
+    arrays['symbol'] = np.asarray(columns['symbol'], dtype=object)
+    arrays['symbol_code'] = np.fromiter((symbol_codes.setdefault(sym, len(symbol_codes)) for sym in columns['symbol']),
+                                        dtype=np.int64, count=len(columns['symbol']))
+    arrays['symbols'] = np.asarray(list(symbol_codes), dtype=object)  # code -> symbol
+    return arrays
+
+
+def get_deal_arrays(new_deals: list, all_deals, cache: dict = None, total: int = None) -> dict:
+    """
+    Columnar arrays of every deal in execution order, kept in cache between cycles.
+
+    Only the new deals are converted and appended when they all come after
+    the last cached one; anything else rebuilds the arrays from all_deals().
+
+    Args:
+        new_deals: deals added since the last call
+        all_deals: callable returning every deal in execution order
+        cache: dict kept between cycles (None = always rebuild)
+        total: number of deals the arrays must hold (the cache is rebuilt when out of step)
+    """
+    arrays = cache.get('arrays') if cache is not None else None
+    symbol_codes = cache.setdefault('symbol_codes', {}) if cache is not None else {}
+    if arrays is not None:
+        new_deals = sorted(new_deals, key=lambda d: (d.time_msc, d.ticket))
+        n = len(arrays['ticket'])
+        in_step = total is None or n + len(new_deals) == total
+        after = not new_deals or not n or (new_deals[0].time_msc, new_deals[0].ticket) > (arrays['time_msc'][-1], arrays['ticket'][-1])
+        if in_step and after:
+            if new_deals:
+                tail = load_deal_arrays(new_deals, symbol_codes)
+                arrays = {key: tail[key] if key == 'symbols' else np.concatenate([arrays[key], tail[key]]) for key in arrays}
+        else:
+            arrays = None
+    if arrays is None:
+        symbol_codes.clear()
+        arrays = load_deal_arrays(all_deals(), symbol_codes)
+
+    if cache is not None:
+        cache['arrays'] = arrays
+    return arrays
+
+
+def aggregate_position_arrays(d: dict) -> dict:
+    """
+    Per-position columns from deal arrays (stats_engine.aggregate_positions
+    without the loop): positions in first-seen order, the Position fields
+    plus the index of the last entry deal and the deal -> position codes.
+    """
+    n = len(d['position_id'])
+    row = np.arange(n)
+    codes, pos_ids = pd.factorize(d['position_id'])
+    npos = len(pos_ids)
+    # Codes are numbered in first-seen order: a position starts where the running max grows
+    running = np.maximum.accumulate(codes)
+    first_row = np.flatnonzero(np.r_[True, running[1:] > running[:-1]]) if n else row
+
+    is_in = d['entry'] == DEAL_ENTRY_IN
+    is_out = d['entry'] == DEAL_ENTRY_OUT
+    last_in = _last_index(codes[is_in], row[is_in], npos)
+    last_out = _last_index(codes[is_out], row[is_out], npos)
+    has_in = last_in >= 0
+    has_out = last_out >= 0
+    out_codes = codes[is_out]
+
+    return {
+        'codes': codes,
+        'position_id': np.asarray(pos_ids, dtype=np.int64),
+        'symbol_code': d['symbol_code'][first_row],
+        'last_in': last_in,
+        'has_in': has_in,
+        'is_buy': has_in & (d['type'][last_in] == DEAL_TYPE_BUY),
+        'lot': np.bincount(codes[is_in], weights=d['volume'][is_in], minlength=npos),
+        'volume_out': np.bincount(out_codes, weights=d['volume'][is_out], minlength=npos),
+        'exit_value': np.bincount(out_codes, weights=d['price'][is_out] * d['volume'][is_out], minlength=npos),
+        'open_time': np.where(has_in, d['time'][last_in], 0),
+        'close_time': np.where(has_out, d['time'][last_out], 0),
+        'open_price': np.where(has_in, d['price'][last_in], 0.0),
+        'close_price': np.where(has_out, d['price'][last_out], 0.0),
+        'profit': np.bincount(out_codes, weights=d['profit'][is_out], minlength=npos),
+    }
+
+
+def get_position_arrays(d: dict, cache: dict = None) -> dict:
+    """aggregate_position_arrays(d), reused from cache while the deal arrays are unchanged"""
+    if cache is not None and cache.get('positions_of') is d:
+        return cache['positions']
+    p = aggregate_position_arrays(d)
+    if cache is not None:
+        cache['positions_of'], cache['positions'] = d, p
+    return p
+
+
+def closed_position_index(p: dict, open_pids, pids=None) -> np.ndarray:
+    """
+    Indices of the fully closed positions in close-time order, ties by
+    position id (stats_engine.closed_positions). Only the given pids are
+    considered when pids is not None.
+    """
+    closed = (p['volume_out'] > 0) & ~np.isin(p['position_id'], np.fromiter(open_pids, dtype=np.int64, count=len(open_pids)))
+    if pids is not None:
+        closed &= np.isin(p['position_id'], np.fromiter(pids, dtype=np.int64, count=len(pids)))
+    index = np.flatnonzero(closed)
+    return index[np.lexsort((p['position_id'][index], p['close_time'][index]))]
+
+
+def positions_from_arrays(d: dict, p: dict, index: np.ndarray, sltp: dict) -> dict:
+    """Position records of the positions at the given indices (for their trades rows)"""
+    columns = {name: p[name][index].tolist() for name in Position.__slots__ if name in p}
+    columns['symbol'] = d['symbols'][p['symbol_code'][index]].tolist()
+    last_in = p['last_in'][index].tolist()
+    is_buy = p['is_buy'][index].tolist()
+    pids = p['position_id'][index].tolist()
+    positions = {}
+    for k, pid in enumerate(pids):
+        pos = Position(columns['symbol'][k])
+        for name in ('lot', 'volume_out', 'exit_value', 'open_time', 'close_time', 'open_price', 'close_price', 'profit'):
+            setattr(pos, name, columns[name][k])
+        j = last_in[k]
+        if j >= 0:
+            pos.type = 'BUY' if is_buy[k] else 'SELL'
+            # SL/TP from the deal, or as resolved from the orders
+            sl, tp = float(d['sl'][j]), float(d['tp'][j])
+            if (sl == 0.0 or tp == 0.0) and d['order'][j] > 0:
+                sl, tp = sltp.get(pid, (sl, tp))
+            pos.sl, pos.tp = sl, tp
+        positions[pid] = pos
+    return positions
+
+
+def total_lots_vectorized(p: dict) -> float:
+    """equity_service.calculate_total_lots over the position arrays"""
+    lot = p['lot']
+    return round(math.fsum(lot[lot > 0].tolist()), 2)
+
+
+def compute_stats_vectorized(d: dict, p: dict, order: np.ndarray, balance: float, get_point) -> dict:
+    """
+    Stats fields of the daily_stats row, computed over deal and position arrays.
+
+    Args:
+        d: deal arrays (get_deal_arrays)
+        p: position arrays (aggregate_position_arrays)
+        order: indices of the fully closed positions (closed_position_index)
+        balance: current account balance
+        get_point: callable symbol -> point size (0 if unknown)
+    """
+    acc = StatsAccumulator()
+
+    # Favorite pair: deal count per symbol, first seen (lowest code) wins a tie
+    names = d['symbols']
+    if len(names):
+        counts = np.bincount(d['symbol_code'], minlength=len(names))
+        counts[names == ""] = 0
+        best = int(np.argmax(counts))
+        if counts[best] > 0:
+            acc.symbol_counts = {names[best]: int(counts[best])}
+    if not len(order):
+        return acc.stats(balance)
+
+    p_profit = p['profit'][order]
+    is_buy = p['is_buy'][order]
+    is_sell = p['has_in'][order] & ~is_buy
+    open_time = p['open_time'][order]
+    close_time = p['close_time'][order]
+    win, loss = p_profit > 0, p_profit < 0
+
+    # Points: volume-weighted over the exit deals (stats_engine.position_points)
+    open_price = p['open_price'][order]
+    point_by_code = np.array([get_point(sym) if sym else 0 for sym in names], dtype=np.float64)
+    point = np.where(open_price > 0, point_by_code[p['symbol_code'][order]], 0.0)
+    scored = point > 0
+    move = p['exit_value'][order] - open_price * p['volume_out'][order]
+    move = np.where(is_buy, move, -move)
+    points = np.zeros(len(order))
+    points[scored] = move[scored] / point[scored] / p['lot'][order][scored]
+
+    acc.total_trades = len(order)
+    acc.total_profit = _sequential_sum(p_profit)
+    acc.wins = int(win.sum())
+    acc.losses = int(loss.sum())
+    acc.gross_profit = _sequential_sum(p_profit[win])
+    acc.gross_loss = _sequential_sum(-p_profit[loss])
+    acc.best_trade = float(p_profit.max())
+    acc.worst_trade = float(p_profit.min())
+    acc.buy_trades = int(is_buy.sum())
+    acc.buy_wins = int((is_buy & win).sum())
+    acc.sell_trades = int(is_sell.sum())
+    acc.sell_wins = int((is_sell & win).sum())
+    acc.total_points = _sequential_sum(points)
+
+    # Balance-curve drawdown
+    curve = np.cumsum(p_profit)
+    peak = np.maximum.accumulate(curve)
+    acc.current_profit_curve = float(curve[-1])
+    acc.peak_profit = float(peak[-1])
+    acc.max_drawdown_val = max(0, float((peak - curve).max()))
+
+    # Sessions by open hour (server time -> UTC)
+    open_hour = ((open_time - SERVER_TIME_OFFSET) // 3600) % 24
+    for name, (start, end) in SESSIONS.items():
+        mask = (open_hour >= start) & (open_hour < end)
+        acc.sessions[name] = {
+            'profit': _sequential_sum(p_profit[mask]),
+            'wins': int((mask & win).sum()),
+            'total': int(mask.sum()),
+        }
+
+    # Durations
+    duration = close_time - open_time
+    valid = duration >= 0
+    acc.total_duration = int(duration[valid].sum())
+    acc.duration_count = int(valid.sum())
+    acc.win_duration = int(duration[valid & win].sum())
+    acc.win_duration_count = int((valid & win).sum())
+    acc.loss_duration = int(duration[valid & loss].sum())
+    acc.loss_duration_count = int((valid & loss).sum())
+
+    # Consecutive streaks (break-even trades are skipped, not a reset)
+    signs = np.sign(p_profit[p_profit != 0]).astype(np.int8)
+    acc.max_consecutive_wins = _max_run(signs, 1)
+    acc.max_consecutive_losses = _max_run(signs, -1)
+
+    return acc.stats(balance)
@@ -0,0 +1,214 @@
+"""
+Worker Pool - sync participants in parallel across several MT5 terminals
+
+Features:
+- One worker process per terminal install (MT5 allows one login per terminal)
+- Participants sharded by rendezvous hashing on account_id: an account stays
+  on the same worker, and only a dead worker's accounts move elsewhere
+- Workers fetch and compute (main.fetch_participant / compute_participant);
+  results come back to the parent, which does all Supabase writes
+- Each result carries the worker's timings for that participant (MT5 calls,
+  stats compute), merged into the parent's metrics registry
+- Participants are dispatched as workers free up (one task per worker), so
+  the cycle's fetch deadline and carry-over apply in supervisor mode too
+- Dead or stuck workers have their shard reassigned and are restarted on
+  the next cycle
+"""
+
+import os
+import time
+import queue
+import hashlib
+import multiprocessing as mp
+import metrics
+from core import load_env
+
+# Load environment variables
+load_env()
+
+# Configuration
+MT5_PATHS = [p.strip() for p in os.getenv("MT5_PATHS", "").split(";") if p.strip()]  # One terminal per worker
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "120"))  # Seconds without a result before a busy worker is killed
+
+
+def _worker_main(worker_id: int, mt5_path: str, tasks, results):
+    """Worker process: own MT5 terminal, fetch + compute participants from the task queue"""
+    # Imported here so every process gets its own MT5 session
+    import main
+    from core import mt5, init_mt5
+
+    if not init_mt5(mt5_path):
+        print(f"❌ Worker {worker_id}: MT5 initialize failed for {mt5_path}")
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        participant, full_resync, resend_rows = task
+        with metrics.capture() as timings:
+            try:
+                fetched = main.fetch_participant(participant, full_resync=full_resync, resend_rows=resend_rows)
+                result = main.compute_participant(fetched) if fetched else None
+            except Exception as e:
+                print(f"❌ Worker {worker_id}: error syncing {participant['nickname']}: {e}")
+                result = None
+        results.put((worker_id, participant['id'], result, timings))
+
+    mt5.shutdown()
+
+
+def shard_for(account_id, worker_ids) -> int:
+    """Worker that owns an account (highest hash wins among the given workers)"""
+    return max(worker_ids, key=lambda w: hashlib.md5(f"{w}:{account_id}".encode()).hexdigest())
+
+
+class WorkerPool:
+    """Supervisor for the MT5 worker processes"""
+
+    def __init__(self, mt5_paths: list):
+        self.mt5_paths = mt5_paths
+        self.ctx = mp.get_context('spawn')
+        self.results = self.ctx.Queue()
+        self.workers = {}  # worker_id -> (process, task queue)
+
+    def start(self):
+        for worker_id in range(len(self.mt5_paths)):
+            self._spawn(worker_id)
+
+    def stop(self):
+        for proc, tasks in self.workers.values():
+            if proc.is_alive():
+                tasks.put(None)
+        for proc, _ in self.workers.values():
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+
+    def _spawn(self, worker_id: int):
+        tasks = self.ctx.Queue()
+        proc = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.mt5_paths[worker_id], tasks, self.results),
+            name=f"mt5-worker-{worker_id}",
+            daemon=True
+        )
+        proc.start()
+        self.workers[worker_id] = (proc, tasks)
+
+    def alive_workers(self) -> list:
+        return [w for w, (proc, _) in self.workers.items() if proc.is_alive()]
+
+    def _restart_dead_workers(self):
+        for worker_id, (proc, _) in list(self.workers.items()):
+            if not proc.is_alive():
+                print(f"♻️ Restarting MT5 worker {worker_id} (exit code {proc.exitcode})")
+                self._spawn(worker_id)
+
+    def _dispatch(self, participant, options, pending, worker_ids):
+        worker_id = shard_for(participant['account_id'], worker_ids)
+        self.workers[worker_id][1].put((participant, *options(participant)))
+        pending[participant['id']] = (participant, worker_id)
+        return worker_id
+
+    def run_cycle(self, participants, options=None):
+        """
+        Sync participants on the workers. options: participant ->
+        (full_resync, resend_rows) as for main.fetch_participant (default: neither).
+        Yields (participant, result) as results arrive; result is None on failure.
+
+        participants is consumed lazily: the next one is only taken when a
+        worker is free to run it (one task per worker), so a deadline checked
+        by the iterator (CycleScheduler.take) stops dispatching in time and
+        leaves the rest for the next cycle.
+        """
+        options = options or (lambda participant: (False, False))
+        self._restart_dead_workers()
+        worker_ids = self.alive_workers()
+        if not worker_ids:
+            print("❌ No MT5 workers available")
+            return
+
+        source = iter(participants)
+        backlog = []  # Taken from the source, waiting for their (busy) worker, in order
+        pending = {}  # participant id -> (participant, worker_id)
+        last_progress = {w: time.time() for w in worker_ids}
+
+        def fill():
+            # Keep every worker busy with one task, taking participants only as needed
+            nonlocal source
+            while True:
+                busy = {w for _, w in pending.values()}
+                for participant in list(backlog):
+                    if shard_for(participant['account_id'], worker_ids) not in busy:
+                        backlog.remove(participant)
+                        busy.add(self._dispatch(participant, options, pending, worker_ids))
+                        last_progress[pending[participant['id']][1]] = time.time()
+                idle = len(worker_ids) - len(busy)
+                # Bounded look-ahead: a slow worker does not pull the whole list into its backlog
+                if not idle or source is None or len(backlog) >= len(worker_ids):
+                    return
+                participant = next(source, None)
+                if participant is None:
+                    source = None
+                    return
+                backlog.append(participant)
+
+        fill()
+        last_check = time.time()
+        crashes = {}  # participant id -> workers lost while it was pending
+        while pending:
+            try:
+                worker_id, participant_id, result, timings = self.results.get(timeout=1)
+                last_progress[worker_id] = time.time()
+                metrics.merge(timings)
+                entry = pending.pop(participant_id, None)
+                if entry is not None and entry[1] == worker_id:
+                    fill()
+                    yield entry[0], result
+                elif entry is not None:
+                    # Late result from a worker we gave up on; the new owner will answer
+                    pending[participant_id] = entry
+            except queue.Empty:
+                pass
+
+            # Health check at most once a second
+            if time.time() - last_check < 1:
+                continue
+            last_check = time.time()
+
+            # Kill workers that stopped making progress
+            busy = {w for _, w in pending.values()}
+            for w in busy:
+                proc = self.workers[w][0]
+                if proc.is_alive() and time.time() - last_progress.get(w, 0) > WORKER_TIMEOUT:
+                    print(f"⏱️ MT5 worker {w} made no progress for {WORKER_TIMEOUT}s, terminating")
+                    proc.terminate()
+                    proc.join(timeout=5)
+
+            # Reassign the shard of dead workers
+            dead = {w for w in busy if not self.workers[w][0].is_alive()}
+            if not dead:
+                continue
+            worker_ids = [w for w in worker_ids if w not in dead]
+            orphans = [p for p, w in pending.values() if w in dead]
+            for participant in orphans:
+                pending.pop(participant['id'])
+            if not worker_ids:
+                print(f"❌ All MT5 workers are down, {len(orphans) + len(backlog)} participants not synced this cycle")
+                for participant in orphans + backlog:
+                    yield participant, None
+                return
+            print(f"⚠️ MT5 worker(s) {sorted(dead)} died, reassigning {len(orphans)} participants")
+            retry = []
+            for participant in orphans:
+                # An account that took down two workers is skipped for this cycle
+                crashes[participant['id']] = crashes.get(participant['id'], 0) + 1
+                if crashes[participant['id']] >= 2:
+                    print(f"⚠️ Skipping {participant['nickname']} this cycle (worker crashed twice)")
+                    yield participant, None
+                    continue
+                retry.append(participant)
+            # Orphans go ahead of the participants still waiting
+            backlog[:0] = retry
+            fill()
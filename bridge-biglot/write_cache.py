@@ -0,0 +1,123 @@
+"""
+Write Cache - skip upserts of rows that did not change
+
+Features:
+- Content hash of every trades / daily_stats row last written, keyed by
+  its conflict key ((participant_id, position_id) and (participant_id, date))
+- Kept in the local SQLite store (sync_state), so a restart does not
+  re-send the whole trade history; hashes are looked up per row, only for
+  the rows a cycle actually produces
+- Hashes are committed only after the row was written successfully, and
+  saved incrementally (just the ones committed since the last save)
+- Periodic reconcile per participant (its hashes forgotten, every row of it
+  re-sent) to repair drift; the time of each participant's last reconcile
+  is stored, so participants not reached in a cycle stay due
+"""
+
+import os
+import json
+import time
+import hashlib
+from core import load_env
+from sync_state import transaction
+
+# Load environment variables
+load_env()
+
+# Configuration
+CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "1") == "1"  # 0 = upsert every row every cycle
+RECONCILE_INTERVAL_HOURS = float(os.getenv("RECONCILE_INTERVAL_HOURS", "24"))  # Full re-send of a participant's rows (0 = never)
+TRACKED_TABLES = ('trades', 'daily_stats')  # equity_snapshots rows are new every time
+
+
+def row_hash(row: dict) -> str:
+    return hashlib.md5(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class WriteCache:
+    """Conflict key -> content hash of the last row written"""
+
+    def __init__(self):
+        self.pending = {}  # (table, row key) -> hash committed but not saved yet
+        self.reconciled = {}  # participant id -> time of its last reconcile
+        self._load()
+
+    def _load(self):
+        try:
+            with transaction() as db:
+                self.reconciled = dict(db.execute("SELECT participant_id, time FROM reconciled").fetchall())
+        except Exception as e:
+            print(f"⚠️ Could not read the write cache state: {e}")
+
+    @staticmethod
+    def row_key(key: tuple) -> str:
+        return "|".join(map(str, key))
+
+    def is_tracked(self, table: str) -> bool:
+        return CHANGE_DETECTION and table in TRACKED_TABLES
+
+    def is_unchanged(self, table: str, key: tuple, digest: str) -> bool:
+        row_key = self.row_key(key)
+        stored = self.pending.get((table, row_key))
+        if stored is None:
+            try:
+                with transaction() as db:
+                    row = db.execute("SELECT hash FROM write_hashes WHERE table_name = ? AND row_key = ?",
+                                     (table, row_key)).fetchone()
+            except Exception as e:
+                print(f"⚠️ Write cache lookup failed, re-sending the row: {e}")
+                return False
+            stored = row[0] if row else None
+        return stored == digest
+
+    def commit(self, table: str, key: tuple, digest: str):
+        """Remember a row as written (call only after the upsert succeeded)"""
+        self.pending[(table, self.row_key(key))] = digest
+
+    def save(self):
+        """Persist the hashes committed since the last save (one transaction)"""
+        if not self.pending:
+            return
+        try:
+            with transaction() as db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO write_hashes (table_name, row_key, hash) VALUES (?, ?, ?)",
+                    [(table, row_key, digest) for (table, row_key), digest in self.pending.items()])
+            self.pending = {}
+        except Exception as e:
+            print(f"❌ Error saving write cache: {e}")
+
+    def reconcile_due(self, participant_ids) -> set:
+        """
+        Participants whose rows are due for a full re-send. One seen for the
+        first time starts its interval now (its first sync sends every row anyway).
+        """
+        if RECONCILE_INTERVAL_HOURS <= 0:
+            return set()
+        now = time.time()
+        new = [pid for pid in participant_ids if pid not in self.reconciled]
+        if new:
+            self.mark_reconciled(new, now)
+        return {pid for pid in participant_ids if now - self.reconciled[pid] >= RECONCILE_INTERVAL_HOURS * 3600}
+
+    def forget(self, participant_id: str):
+        """Drop a participant's hashes before its rows are re-sent, so none is skipped as unchanged"""
+        prefix = self.row_key((participant_id,)) + "|"
+        self.pending = {key: digest for key, digest in self.pending.items() if not key[1].startswith(prefix)}
+        try:
+            with transaction() as db:
+                # Row keys of the participant sort between "<id>|" and "<id>}" ("}" follows "|")
+                db.execute("DELETE FROM write_hashes WHERE row_key >= ? AND row_key < ?", (prefix, prefix[:-1] + "}"))
+        except Exception as e:
+            print(f"❌ Error clearing write cache of {participant_id}: {e}")
+
+    def mark_reconciled(self, participant_ids, when: float = None):
+        """Record that every row of these participants was re-sent"""
+        when = when or time.time()
+        self.reconciled.update((pid, when) for pid in participant_ids)
+        try:
+            with transaction() as db:
+                db.executemany("INSERT OR REPLACE INTO reconciled (participant_id, time) VALUES (?, ?)",
+                               [(pid, when) for pid in participant_ids])
+        except Exception as e:
+            print(f"❌ Error saving reconcile times: {e}")
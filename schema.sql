@@ -81,11 +81,40 @@ create table public.market_data (
   primary key (symbol, timeframe, time)
 );
 
+-- 5. Equity Rollups (hourly / daily bars of equity_snapshots, kept after snapshot retention)
+create table public.equity_rollups (
+  participant_id uuid references public.participants(id) on delete cascade not null,
+  tier text not null, -- '1h' or '1d'
+  bucket timestamp with time zone not null,
+  equity_open numeric not null,
+  equity_high numeric not null,
+  equity_low numeric not null,
+  equity_close numeric not null,
+  balance numeric not null,
+  min_margin_level numeric,
+  samples integer not null,
+  primary key (participant_id, tier, bucket)
+);
+create index equity_rollups_tier_bucket_idx on public.equity_rollups (tier, bucket);
+
+-- 6. Traded Symbols (distinct symbols for the market data service, one call instead of paging trades)
+create index trades_close_time_idx on public.trades (close_time);
+
+create or replace function public.traded_symbols(since timestamp with time zone, since_day date)
+returns table (symbol text)
+language sql stable
+as $$
+  select t.symbol from public.trades t where t.close_time >= since
+  union
+  select d.favorite_pair from public.daily_stats d where d.date >= since_day and d.favorite_pair is not null;
+$$;
+
 -- Row Level Security (RLS)
 alter table public.participants enable row level security;
 alter table public.daily_stats enable row level security;
 alter table public.trades enable row level security;
 alter table public.market_data enable row level security;
+alter table public.equity_rollups enable row level security;
 
 -- Policies (Public Read, Admin Write)
 -- Note: 'service_role' key bypasses RLS, so we just need to ensure public can read.
@@ -100,3 +129,6 @@ create policy "Allow public read access on trades"
 
 create policy "Allow public read access on market_data"
   on public.market_data for select using (true);
+
+create policy "Allow public read access on equity_rollups"
+  on public.equity_rollups for select using (true);
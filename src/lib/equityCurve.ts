@@ -0,0 +1,195 @@
+import type { SupabaseClient } from '@supabase/supabase-js';
+
+export type EquityPoint = {
+    time: number;
+    balance: number;
+    equity: number;
+    floatingPL: number;
+};
+
+export type DownsampleMethod = 'lttb' | 'minmax';
+
+export type EquityPage = {
+    points: { timestamp: string; balance: number; equity: number; floating_pl: number; margin_level: number }[];
+    nextCursor: string | null;
+};
+
+const HOUR = 60 * 60 * 1000;
+const DAY = 24 * HOUR;
+const PAGE_SIZE = 1000; // PostgREST max-rows
+
+// Resolution by age, in line with the chart timeframes: daily bars up to a year back,
+// hourly bars for the last month, raw 5-minute snapshots for the last day
+const ROLLUP_LAYERS = [
+    { tier: '1d', span: 365 * DAY, step: DAY },
+    { tier: '1h', span: 30 * DAY, step: HOUR }
+];
+const RAW_SPAN = DAY;
+
+// Points per tier sent to the chart: a day of raw snapshots, a month of hourly bars
+// and a year of daily bars fit as is, a raw backlog (rollups lagging behind) is thinned
+export const CHART_POINTS = 1000;
+
+// Indices of `target` points chosen by Largest-Triangle-Three-Buckets (first and last kept)
+function lttb(x: number[], y: number[], target: number): number[] {
+    const n = x.length;
+    if (target >= n) return x.map((_, i) => i);
+    if (target < 3) return [0, n - 1];
+
+    // Bucket edges over the inner points (first and last are kept as is)
+    const edges = Array.from({ length: target - 1 }, (_, i) => Math.floor(1 + (i * (n - 2)) / (target - 2)));
+    const selected = [0];
+    let a = 0;
+    for (let i = 0; i < target - 2; i++) {
+        const [start, end] = [edges[i], edges[i + 1]];
+        let cx = x[n - 1];
+        let cy = y[n - 1];
+        if (i + 2 < edges.length) {
+            const [nextStart, nextEnd] = [edges[i + 1], edges[i + 2]];
+            cx = cy = 0;
+            for (let j = nextStart; j < nextEnd; j++) {
+                cx += x[j];
+                cy += y[j];
+            }
+            cx /= nextEnd - nextStart;
+            cy /= nextEnd - nextStart;
+        }
+        // Twice the triangle area (a, candidate, next bucket average)
+        let best = start;
+        let bestArea = -1;
+        for (let j = start; j < end; j++) {
+            const area = Math.abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]));
+            if (area > bestArea) {
+                best = j;
+                bestArea = area;
+            }
+        }
+        a = best;
+        selected.push(a);
+    }
+    selected.push(n - 1);
+    return selected;
+}
+
+// Indices of the lowest and highest point per bucket (at most `target` points), keeps every peak and drawdown
+function minMax(y: number[], target: number): number[] {
+    const n = y.length;
+    if (target >= n) return y.map((_, i) => i);
+    if (target <= 3) return [0, n - 1]; // No room for a min and a max next to the endpoints
+
+    const buckets = Math.floor((target - 2) / 2);
+    const lows = new Array<number>(buckets).fill(-1);
+    const highs = new Array<number>(buckets).fill(-1);
+    for (let i = 1; i < n - 1; i++) {
+        const b = Math.min(Math.floor(((i - 1) * buckets) / (n - 2)), buckets - 1);
+        if (lows[b] < 0 || y[i] < y[lows[b]]) lows[b] = i;
+        if (highs[b] < 0 || y[i] >= y[highs[b]]) highs[b] = i;
+    }
+    const picked = new Set([0, n - 1, ...lows, ...highs].filter((i) => i >= 0));
+    return [...picked].sort((p, q) => p - q);
+}
+
+/** At most `target` points of a time-ordered curve, picked on equity */
+export function downsampleCurve(curve: EquityPoint[], target: number, method: DownsampleMethod = 'lttb'): EquityPoint[] {
+    if (curve.length <= target) return curve;
+    const equity = curve.map((p) => p.equity);
+    const picked = method === 'minmax' ? minMax(equity, target) : lttb(curve.map((p) => p.time), equity, target);
+    return picked.map((i) => curve[i]);
+}
+
+// Every row of an ordered select, page by page
+async function selectAll(buildQuery: () => any): Promise<any[]> {
+    const rows: any[] = [];
+    for (let offset = 0; ; offset += PAGE_SIZE) {
+        const { data, error } = await buildQuery().range(offset, offset + PAGE_SIZE - 1);
+        if (error) throw error;
+        rows.push(...(data ?? []));
+        if (!data || data.length < PAGE_SIZE) return rows;
+    }
+}
+
+/**
+ * Equity curve of a participant from the equity_rollups tiers (see bridge-biglot/equity_rollup.py).
+ * Each tier starts where the coarser one ended, so the part not rolled up yet
+ * comes from the next finer tier and finally from the raw equity_snapshots.
+ * Each tier is downsampled to at most `points` points.
+ */
+export async function fetchEquityCurve(
+    supabase: SupabaseClient,
+    participantId: string,
+    points: number = CHART_POINTS,
+    method: DownsampleMethod = 'lttb'
+): Promise<EquityPoint[]> {
+    const now = Date.now();
+    let since = now - ROLLUP_LAYERS[0].span;
+    const curve: EquityPoint[] = [];
+
+    try {
+        for (const [i, layer] of ROLLUP_LAYERS.entries()) {
+            const until = now - (ROLLUP_LAYERS[i + 1]?.span ?? RAW_SPAN);
+            if (since >= until) continue;
+
+            const rows = await selectAll(() => supabase
+                .from('equity_rollups')
+                .select('bucket, balance, equity_close')
+                .eq('participant_id', participantId)
+                .eq('tier', layer.tier)
+                .gte('bucket', new Date(since).toISOString())
+                .lt('bucket', new Date(until).toISOString())
+                .order('bucket', { ascending: true }));
+
+            const bars = rows.map((r) => ({
+                time: new Date(r.bucket).getTime() / 1000,
+                balance: r.balance,
+                equity: r.equity_close,
+                floatingPL: Math.round((r.equity_close - r.balance) * 100) / 100
+            }));
+            curve.push(...downsampleCurve(bars, points, method));
+            if (rows.length > 0) since = new Date(rows[rows.length - 1].bucket).getTime() + layer.step;
+        }
+
+        const snapshots = await selectAll(() => supabase
+            .from('equity_snapshots')
+            .select('timestamp, balance, equity, floating_pl')
+            .eq('participant_id', participantId)
+            .gte('timestamp', new Date(since).toISOString())
+            .order('timestamp', { ascending: true }));
+
+        const raw = snapshots.map((s) => ({
+            time: new Date(s.timestamp).getTime() / 1000,
+            balance: s.balance,
+            equity: s.equity,
+            floatingPL: s.floating_pl || 0
+        }));
+        curve.push(...downsampleCurve(raw, points, method));
+    } catch (e) {
+        console.error(`Equity curve fetch error for ID ${participantId}:`, e);
+    }
+    return curve;
+}
+
+/**
+ * Full-resolution equity snapshots, one page at a time (exports).
+ * Keyset pagination on timestamp: pass nextCursor back for the following page,
+ * it is null on the last one. Deep pages cost the same as the first and new
+ * snapshots never shift earlier pages.
+ */
+export async function fetchEquityPage(
+    supabase: SupabaseClient,
+    participantId: string,
+    cursor: string | null = null,
+    limit: number = PAGE_SIZE,
+    since: string | null = null
+): Promise<EquityPage> {
+    let query = supabase
+        .from('equity_snapshots')
+        .select('timestamp, balance, equity, floating_pl, margin_level')
+        .eq('participant_id', participantId);
+    if (cursor) query = query.gt('timestamp', cursor);
+    else if (since) query = query.gte('timestamp', since);
+
+    const { data, error } = await query.order('timestamp', { ascending: true }).limit(limit);
+    if (error) throw error;
+    const points = data ?? [];
+    return { points, nextCursor: points.length === limit ? points[points.length - 1].timestamp : null };
+}
@@ -0,0 +1,19 @@
+import { json } from '@sveltejs/kit';
+import { supabase } from '$lib/supabase';
+import { CHART_POINTS, fetchEquityCurve, type DownsampleMethod } from '$lib/equityCurve';
+import type { RequestHandler } from './$types';
+
+// Chart-sized equity curve: ?points=500&method=lttb|minmax
+export const GET: RequestHandler = async ({ params, url }) => {
+    const points = Number(url.searchParams.get('points') || CHART_POINTS);
+    const method = (url.searchParams.get('method') || 'lttb') as DownsampleMethod;
+
+    if (!Number.isInteger(points) || points < 2 || !['lttb', 'minmax'].includes(method)) {
+        return json({ error: 'Invalid parameters: points must be an integer >= 2, method lttb or minmax' }, { status: 400 });
+    }
+    if (!supabase) {
+        return json({ error: 'Supabase client not initialized' }, { status: 503 });
+    }
+
+    return json(await fetchEquityCurve(supabase, params.id, points, method));
+};
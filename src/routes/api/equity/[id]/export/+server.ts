@@ -0,0 +1,25 @@
+import { json } from '@sveltejs/kit';
+import { supabase } from '$lib/supabase';
+import { fetchEquityPage } from '$lib/equityCurve';
+import type { RequestHandler } from './$types';
+
+// Full-resolution equity snapshots page by page: ?since=<ISO>&limit=1000, then ?cursor=<nextCursor>
+export const GET: RequestHandler = async ({ params, url }) => {
+    const cursor = url.searchParams.get('cursor');
+    const since = url.searchParams.get('since');
+    const limit = Number(url.searchParams.get('limit') || 1000);
+
+    if (!Number.isInteger(limit) || limit < 1 || limit > 1000) {
+        return json({ error: 'Invalid parameter: limit must be an integer from 1 to 1000' }, { status: 400 });
+    }
+    if (!supabase) {
+        return json({ error: 'Supabase client not initialized' }, { status: 503 });
+    }
+
+    try {
+        return json(await fetchEquityPage(supabase, params.id, cursor, limit, since));
+    } catch (e) {
+        console.error(`Equity export error for ID ${params.id}:`, e);
+        return json({ error: 'Internal server error' }, { status: 500 });
+    }
+};
@@ -1,6 +1,7 @@
 import { supabase } from '$lib/supabase';
 import { error } from '@sveltejs/kit';
 import { leaderboardData } from '$lib/mock/leaderboard';
+import { fetchEquityCurve } from '$lib/equityCurve';
 import type { PageServerLoad } from './$types';
 
 export const load: PageServerLoad = async ({ params }) => {
@@ -55,19 +56,8 @@ export const load: PageServerLoad = async ({ params }) => {
 
             if (eError) console.error(`Equity curve fetch error for ID ${id}:`, eError);
 
-            // Fetch detailed equity snapshots (MyFxBook-style)
-            const thirtyDaysAgo = new Date();
-            thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
-
-            const { data: equitySnapshots, error: esError } = await supabase
-                .from('equity_snapshots')
-                .select('timestamp, balance, equity, floating_pl')
-                .eq('participant_id', id)
-                .gte('timestamp', thirtyDaysAgo.toISOString())
-                .order('timestamp', { ascending: false })
-                .limit(5000);
-
-            if (esError) console.error(`Equity snapshots fetch error for ID ${id}:`, esError);
+            // Fetch detailed equity curve (MyFxBook-style): rollup tiers, raw snapshots for the last day
+            const equitySnapshots = await fetchEquityCurve(supabase, id);
 
             // Fetch ALL trades for Trading Calendar (calculate daily profit from trade history)
             const { data: allTrades, error: atError } = await supabase
@@ -165,12 +155,7 @@ export const load: PageServerLoad = async ({ params }) => {
                     })) || [],
                     dailyHistory: dailyStatsFromTrades,
                     // MyFxBook-style detailed equity curve
-                    equitySnapshots: equitySnapshots?.map((s: any) => ({
-                        time: new Date(s.timestamp).getTime() / 1000,
-                        balance: s.balance,
-                        equity: s.equity,
-                        floatingPL: s.floating_pl || 0
-                    })).reverse() || []
+                    equitySnapshots
                 },
                 rank: await (async () => {
                     if (!stats) return 0;